@@ -24,3 +24,11 @@ class PipelineCreateException(Exception):
 class PipelineNotInitializedException(Exception):
     def __str__(self):
         return repr("Pipeline is not initialized.")
+
+
+class ModelBlendException(Exception):
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+    def __str__(self):
+        return repr(f"Failed to blend models: {self.message}")
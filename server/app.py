@@ -21,8 +21,10 @@ from settings import ServerSettings
 
 settings = ServerSettings()
 
-voice_changer_manager = VoiceChangerManager(settings)
+voice_changer_manager = VoiceChangerManager.get_instance(settings)
 fastapi = MMVC_Rest.get_instance(voice_changer_manager, settings.model_dir, settings.allowed_origins, settings.port)
+# Weights and the model are loaded once the server is listening, progress is reported by /readyz and /info
+fastapi.add_event_handler("startup", voice_changer_manager.begin_startup)
 socketio = MMVC_SocketIOApp.get_instance(fastapi, voice_changer_manager, settings.allowed_origins, settings.port)
 
 # NOTE: Bundled executable overrides excepthook to pause on exception during startup.
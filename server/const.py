@@ -71,6 +71,12 @@ RVCSampleMode: TypeAlias = Literal[
     "",
 ]
 
+PrebuiltArtifact: TypeAlias = Literal[
+    "onnx",  # ONNX export of PyTorch models
+    "onnxFp16",  # FP16 conversion of the ONNX model
+    "indexVectors",  # Reconstructed index vectors, memory-mapped when loaded
+]
+
 def get_edition():
     if not os.path.exists(EDITION_FILE):
         return '-'
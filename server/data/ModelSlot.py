@@ -45,6 +45,8 @@ class RVCModelSlot(ModelSlot):
     speakers: dict = field(default_factory=lambda: {0: "target"})
 
     version: str = "v2"
+    # Prebuilt artifact -> file name in the slot directory
+    artifacts: dict = field(default_factory=lambda: {})
 
 
 ModelSlots: TypeAlias = Union[
@@ -60,6 +62,10 @@ def loadSlotInfo(model_dir: str, slotIndex: int) -> ModelSlots:
         return ModelSlot()
     with open(jsonFile, encoding="utf-8") as f:
         jsonDict = json.load(f)
+    return slotInfoFromDict(jsonDict)
+
+
+def slotInfoFromDict(jsonDict: dict) -> ModelSlots:
     slotInfoKey = list(ModelSlot.__annotations__.keys())
     slotInfo = ModelSlot(**{k: v for k, v in jsonDict.items() if k in slotInfoKey})
     if slotInfo.voiceChangerType == "RVC":
@@ -0,0 +1,10 @@
+import json
+from dataclasses import asdict
+
+
+class RawJSON(str):
+    """Already serialized JSON value, embedded into responses as is (see restapi.mods.JsonResponse)."""
+
+
+def dataclassesToRawJSON(items: list) -> RawJSON:
+    return RawJSON(json.dumps([asdict(item) for item in items], ensure_ascii=False, separators=(",", ":")))
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import json
 
@@ -5,79 +6,143 @@ from downloader.HttpClient import HttpClient
 from tqdm import tqdm
 from threading import Lock
 from xxhash import xxh128
-from utils.hasher import compute_hash
 from const import ASSETS_FILE
 from Exceptions import DownloadVerificationException
 
 import logging
 logger = logging.getLogger(__name__)
 
+# Files are fetched in segments of this size with parallel HTTP Range requests
+SEGMENT_SIZE = 16 * 1024 * 1024
+# Connections open at the same time, across all downloads
+MAX_CONNECTIONS = 8
+CHUNK_SIZE = 1024 * 1024
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+# Progress of an incomplete download, kept next to the file
+STATE_SUFFIX = '.dlstate'
+
 lock = Lock()
 
+# saveTo -> {"hash", "size", "mtime_ns"} of completed files.
+# Files that match their entry are trusted without reading them again.
 if os.path.exists(ASSETS_FILE):
     with open(ASSETS_FILE, encoding='utf-8') as f:
         files = json.load(f)
 else:
     files = {}
 
+_connections: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+
+def _get_connections() -> asyncio.Semaphore:
+    # Semaphores are bound to an event loop, and downloads run in more than one loop
+    global _connections
+    loop = asyncio.get_running_loop()
+    if _connections is None or _connections[0] is not loop:
+        _connections = (loop, asyncio.Semaphore(MAX_CONNECTIONS))
+    return _connections[1]
+
 
 async def download(params: dict):
-    s = await HttpClient.get_client()
+    """
+    Downloads params["url"] to params["saveTo"], verifying it against
+    params["hash"] (xxh128) if given.
 
+    Files are split into segments that are fetched in parallel. Each segment
+    is hashed while it is received, and completed segments are recorded in a
+    state file, so an interrupted download resumes without reading or
+    fetching them again. The whole-file hash cannot be combined from the
+    segments, so a finished download is read once to verify it; segments
+    that no longer match their recorded hash are fetched again.
+    """
     url = params["url"]
     saveTo = params["saveTo"]
+    expected_hash = params.get('hash')
+
+    if _is_complete(saveTo, expected_hash):
+        return
 
     dirname = os.path.dirname(saveTo)
     if dirname:
         os.makedirs(dirname, exist_ok=True)
 
-    try:
-        offset = os.stat(saveTo).st_size
-    except:
-        offset = None
-
-    expected_hash = params.get('hash')
-    hasher = xxh128()
-    if offset is not None:
-        with open(saveTo, 'rb') as f:
-            hash = compute_hash(f, hasher)
-        # If hash was provided with the file - verify against provided hash
-        if expected_hash is not None:
-            if hash == expected_hash:
-                logger.info(f'Verified {saveTo}')
-                return
-        # If hash was not provided - verify against local cache
-        elif saveTo in files:
-            fhash = files[saveTo]
-            if hash == fhash:
-                logger.info(f'Verified {saveTo}')
-                return
-    else:
-        hash = None
+    state_file = saveTo + STATE_SUFFIX
+    # File without manifest entry (f.e., from an older version). Verify it once.
+    unverified = os.path.exists(saveTo) and not os.path.exists(state_file)
+    entry = files.get(saveTo)
+    known_hash = expected_hash if expected_hash is not None else entry if isinstance(entry, str) else None
+    if unverified and known_hash is not None:
+        hash = await asyncio.to_thread(_hash_file, saveTo)
+        if hash == known_hash:
+            logger.info(f'Verified {saveTo}')
+            write_file_entry(saveTo, hash)
+            return
 
+    s = await HttpClient.get_client()
     res = await s.head(url, allow_redirects=True)
     res.raise_for_status()
-    content_length = int(res.headers.get("content-length"))
-    if offset is not None and offset == content_length:
-        if expected_hash is not None and hash != expected_hash:
+    size = int(res.headers.get("content-length"))
+    accept_ranges = res.headers.get("Accept-Ranges") == 'bytes'
+    etag = res.headers.get("ETag")
+
+    if unverified and known_hash is None and os.stat(saveTo).st_size == size:
+        write_file_entry(saveTo, None)
+        return
+
+    state = _load_state(state_file, url, size, etag) if accept_ranges else None
+    if state is None:
+        state = {
+            "url": url,
+            "size": size,
+            "etag": etag,
+            # Without byte ranges the file can only be fetched at once
+            "segmentSize": SEGMENT_SIZE if accept_ranges else max(size, 1),
+            "done": {},
+        }
+        # The file may be linked from other slots, so it is replaced instead of being overwritten
+        if os.path.lexists(saveTo):
+            os.remove(saveTo)
+        with open(saveTo, 'wb') as f:
+            f.truncate(size)
+        _save_state(state_file, state)
+
+    hash = None
+    for attempt in range(2):
+        await _download_segments(s, url, saveTo, state, state_file, accept_ranges)
+        if expected_hash is None:
+            break
+        hash = await asyncio.to_thread(_hash_file, saveTo)
+        if hash == expected_hash:
+            break
+        corrupted = await asyncio.to_thread(_find_corrupted_segments, saveTo, state)
+        if attempt > 0 or not corrupted:
+            # Remote file differs from the expected one, start over next time
+            os.remove(state_file)
+            os.remove(saveTo)
             raise DownloadVerificationException(saveTo, hash, expected_hash)
-        # Hash will not be written here if file is absent or incomplete
-        write_file_entry(saveTo, hash)
+        logger.warning(f'{len(corrupted)} segments of {saveTo} are corrupted, downloading them again.')
+        for index in corrupted:
+            del state["done"][index]
+        _save_state(state_file, state)
+
+    os.remove(state_file)
+    write_file_entry(saveTo, hash)
+
+
+async def _download_segments(s, url: str, saveTo: str, state: dict, state_file: str, ranged: bool):
+    size = state["size"]
+    segment_size = state["segmentSize"]
+    segments = [
+        (str(index), start, min(start + segment_size, size))
+        for index, start in enumerate(range(0, size, segment_size))
+    ]
+    pending = [segment for segment in segments if segment[0] not in state["done"]]
+    if not pending:
         return
-    accept_ranges = res.headers.get("Accept-Ranges")
-    # If file is incomplete and web-server supports byte ranges - resume the download
-    # In case file size somehow exceeds reported content-length - redownload the file completely
-    resume_download = offset is not None and accept_ranges is not None and accept_ranges == 'bytes' and offset < content_length
-    if resume_download:
-        res = await s.get(url, headers={ 'Range': f'bytes={offset}-' }, allow_redirects=True)
-    else:
-        # Reset hasher to avoid potential mixing with discarded data
-        hasher.reset()
-        res = await s.get(url, allow_redirects=True)
-    res.raise_for_status()
-    content_length = int(res.headers.get("content-length"))
+
     progress_bar = tqdm(
-        total=content_length,
+        total=size,
+        initial=size - sum(end - start for _, start, end in pending),
         leave=False,
         unit="B",
         unit_scale=True,
@@ -85,24 +150,109 @@ async def download(params: dict):
         desc=os.path.basename(saveTo),
     )
 
-    # Append to file if resume, overwrite otherwise
-    with progress_bar, open(saveTo, "ab" if resume_download else "wb") as f:
-        async for chunk in res.content.iter_chunked(1024 * 1024): # 1MB
-            progress_bar.update(len(chunk))
-            f.write(chunk)
-            # Reusing the same hasher instance defined above
-            hasher.update(chunk)
+    async def fetch(index: str, start: int, end: int):
+        state["done"][index] = await _download_segment(s, url, saveTo, start, end, ranged, progress_bar)
+        # Segments complete on the event loop thread, so the state is written by one at a time
+        _save_state(state_file, state)
+
+    with progress_bar:
+        tasks = [asyncio.ensure_future(fetch(*segment)) for segment in pending]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
+async def _download_segment(s, url: str, saveTo: str, start: int, end: int, ranged: bool, progress_bar: tqdm) -> str:
+    hasher = xxh128()
+    async with _get_connections():
+        headers = {'Range': f'bytes={start}-{end - 1}'} if ranged else {}
+        async with s.get(url, headers=headers, allow_redirects=True) as res:
+            res.raise_for_status()
+            if ranged and res.status != 206:
+                raise RuntimeError(f'Range request for {saveTo} returned status {res.status}')
+            with open(saveTo, 'r+b') as f:
+                f.seek(start)
+                async for chunk in res.content.iter_chunked(CHUNK_SIZE):
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    progress_bar.update(len(chunk))
+                if f.tell() != end:
+                    raise RuntimeError(f'Incomplete segment {start}-{end} of {saveTo}')
+    return hasher.hexdigest()
+
+
+def _is_complete(saveTo: str, expected_hash: str | None) -> bool:
+    entry = files.get(saveTo)
+    if not isinstance(entry, dict):
+        return False
+    try:
+        st = os.stat(saveTo)
+    except FileNotFoundError:
+        return False
+    if st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+        return False
+    return expected_hash is None or entry["hash"] == expected_hash
+
+
+def _hash_file(path: str) -> str:
+    # Files are hashed concurrently in worker threads, so every call needs its own buffer
+    hasher = xxh128()
+    buf = memoryview(bytearray(HASH_BUFFER_SIZE))
+    with open(path, 'rb') as f:
+        while bytes_read := f.readinto(buf):
+            hasher.update(buf[:bytes_read])
+    return hasher.hexdigest()
+
+
+def _find_corrupted_segments(saveTo: str, state: dict) -> list[str]:
+    corrupted = []
+    segment_size = state["segmentSize"]
+    with open(saveTo, 'rb') as f:
+        for index, hash in state["done"].items():
+            f.seek(int(index) * segment_size)
+            if xxh128(f.read(segment_size)).hexdigest() != hash:
+                corrupted.append(index)
+    return corrupted
+
+
+def _load_state(state_file: str, url: str, size: int, etag: str | None) -> dict | None:
+    try:
+        with open(state_file, encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    # Resume only if the remote file is still the same one
+    if state.get("url") != url or state.get("size") != size or state.get("etag") != etag:
+        return None
+    try:
+        if os.stat(state_file[:-len(STATE_SUFFIX)]).st_size != size:
+            return None
+    except FileNotFoundError:
+        return None
+    return state
+
+
+def _save_state(state_file: str, state: dict):
+    tmp_file = f'{state_file}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
 
-    # Get final hash (local chunks + remote chunks)
-    hash = hasher.hexdigest()
-    if expected_hash is not None and hash != expected_hash:
-        raise DownloadVerificationException(saveTo, hash, expected_hash)
+def refresh_file_entry(saveTo: str):
+    """Updates the entry of a completed file that was replaced by an identical one."""
+    entry = files.get(saveTo)
+    if isinstance(entry, dict):
+        write_file_entry(saveTo, entry["hash"])
 
-    if expected_hash is not None:
-        write_file_entry(saveTo, hash)
 
-def write_file_entry(saveTo: str, hash: str):
+def write_file_entry(saveTo: str, hash: str | None):
     global lock, files
-    files[saveTo] = hash
+    st = os.stat(saveTo)
+    files[saveTo] = {"hash": hash, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
     with lock, open(ASSETS_FILE, 'w', encoding='utf-8') as f:
         json.dump(files, f)
@@ -1,15 +1,18 @@
 import json
 import os
 import asyncio
+import threading
 from typing import Any, Tuple
 
 from const import RVCSampleMode, getSampleJsonAndModelIds
 from data.ModelSample import ModelSamples, generateModelSample
 from data.ModelSlot import ModelSlot, RVCModelSlot
+from data.RawJSON import RawJSON, dataclassesToRawJSON
 import logging
 from voice_changer.ModelSlotManager import ModelSlotManager
 from voice_changer.RVC.RVCModelSlotGenerator import RVCModelSlotGenerator
-from downloader.Downloader import download
+from downloader.Downloader import download, refresh_file_entry
+from voice_changer.common.BlobStore import BlobStore
 
 logger = logging.getLogger(__name__)
 
@@ -32,10 +35,66 @@ async def downloadSample(mode: RVCSampleMode, modelId: str, model_dir: str, slot
 
 
 def getSampleInfos(mode: RVCSampleMode):
-    sampleJsonUrls, _sampleModels = getSampleJsonAndModelIds(mode)
-    sampleJsons = _generateSampleJsons(sampleJsonUrls)
-    samples = _generateSampleList(sampleJsons)
-    return samples
+    return SampleCatalog.get_instance(mode).get_samples()
+
+
+def getSampleInfosJson(mode: RVCSampleMode) -> RawJSON:
+    return SampleCatalog.get_instance(mode).get_samples_json()
+
+
+class SampleCatalog:
+    """
+    Parsed sample list of a sample mode, together with its serialized form
+    for /info. The sample JSON files are only parsed again when their
+    modification time or size changes (f.e., after they are downloaded).
+    """
+    _instances: dict[RVCSampleMode, "SampleCatalog"] = {}
+
+    @classmethod
+    def get_instance(cls, mode: RVCSampleMode):
+        if mode not in cls._instances:
+            cls._instances[mode] = cls(mode)
+        return cls._instances[mode]
+
+    def __init__(self, mode: RVCSampleMode):
+        sampleJsonUrls, _sampleModels = getSampleJsonAndModelIds(mode)
+        self.sampleJsons = _generateSampleJsons(sampleJsonUrls)
+        self.fingerprint: tuple | None = None
+        self.samples: list[ModelSamples] = []
+        self.samplesJson = RawJSON("[]")
+        self.lock = threading.Lock()
+
+    def _fingerprint(self):
+        res = []
+        for file in self.sampleJsons:
+            try:
+                st = os.stat(file)
+                res.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                res.append(None)
+        return tuple(res)
+
+    def _refresh(self):
+        fingerprint = self._fingerprint()
+        with self.lock:
+            if fingerprint == self.fingerprint:
+                return
+            try:
+                samples = _generateSampleList([file for file, fp in zip(self.sampleJsons, fingerprint) if fp is not None])
+            except Exception as e:
+                logger.exception(e)
+                return
+            self.samples = samples
+            self.samplesJson = dataclassesToRawJSON(samples)
+            self.fingerprint = fingerprint
+
+    def get_samples(self) -> list[ModelSamples]:
+        self._refresh()
+        return self.samples
+
+    def get_samples_json(self) -> RawJSON:
+        self._refresh()
+        return self.samplesJson
 
 
 async def _downloadSampleJsons(sampleJsonUrls: list[str]):
@@ -153,6 +212,12 @@ async def _downloadSamples(samples: list[ModelSamples], sampleModelIds: list[Tup
         tasks.append(asyncio.ensure_future(download(file)))
     await asyncio.gather(*tasks)
 
+    # Samples with the same files (f.e., a shared index) store them once
+    store = BlobStore.get_instance(model_dir)
+    for param in downloadParams:
+        if await asyncio.to_thread(store.add, param["saveTo"]):
+            refresh_file_entry(param["saveTo"])
+
     # メタデータ作成
     logger.info("Generating metadata...")
     for targetSlotIndex in slotIndex:
@@ -1,4 +1,5 @@
 import asyncio
+from typing import Callable
 
 from downloader.Downloader import download
 import logging
@@ -7,7 +8,7 @@ from Exceptions import PretrainDownloadException
 
 logger = logging.getLogger(__name__)
 
-async def downloadWeight(params: ServerSettings):
+async def downloadWeight(params: ServerSettings, on_progress: Callable[[int, int], None] | None = None):
     logger.info('Loading weights.')
     file_params = [
         # {
@@ -75,9 +76,21 @@ async def downloadWeight(params: ServerSettings):
             "hash": param['hash'],
         })
 
+    done = 0
+
+    async def download_file(file: dict):
+        nonlocal done
+        await download(file)
+        done += 1
+        if on_progress is not None:
+            on_progress(done, len(files_to_download))
+
+    if on_progress is not None:
+        on_progress(0, len(files_to_download))
+
     tasks: list[asyncio.Task] = []
     for file in files_to_download:
-        tasks.append(asyncio.ensure_future(download(file)))
+        tasks.append(asyncio.ensure_future(download_file(file)))
     fail = False
     for i, res in enumerate(await asyncio.gather(*tasks, return_exceptions=True)):
         if isinstance(res, Exception):
@@ -9,8 +9,11 @@ from typing import Callable, Optional, Sequence
 from voice_changer.VoiceChangerManager import VoiceChangerManager
 
 from restapi.MMVC_Rest_Hello import MMVC_Rest_Hello
+from restapi.MMVC_Rest_Health import MMVC_Rest_Health
 from restapi.MMVC_Rest_VoiceChanger import MMVC_Rest_VoiceChanger
 from restapi.MMVC_Rest_Fileuploader import MMVC_Rest_Fileuploader
+from restapi.MMVC_Rest_Metrics import MMVC_Rest_Metrics
+from restapi.MMVC_Rest_Profiler import MMVC_Rest_Profiler
 from const import UPLOAD_DIR, TMP_DIR
 
 logger = logging.getLogger(__name__)
@@ -64,10 +67,16 @@ class MMVC_Rest:
 
             restHello = MMVC_Rest_Hello()
             app_fastapi.include_router(restHello.router)
+            restHealth = MMVC_Rest_Health()
+            app_fastapi.include_router(restHealth.router)
             restVoiceChanger = MMVC_Rest_VoiceChanger(voiceChangerManager)
             app_fastapi.include_router(restVoiceChanger.router)
             fileUploader = MMVC_Rest_Fileuploader(voiceChangerManager)
             app_fastapi.include_router(fileUploader.router)
+            restMetrics = MMVC_Rest_Metrics(voiceChangerManager)
+            app_fastapi.include_router(restMetrics.router)
+            restProfiler = MMVC_Rest_Profiler()
+            app_fastapi.include_router(restProfiler.router)
 
             cls._instance = app_fastapi
             logger.info("Initialized.")
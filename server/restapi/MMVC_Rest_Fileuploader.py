@@ -1,14 +1,16 @@
 import json
+import os
 from typing import Union
 from fastapi import APIRouter
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from fastapi import UploadFile, Form
 
-from restapi.mods.FileUploader import upload_file
+from restapi.mods.FileUploader import chunked_upload_path, get_upload_status, upload_chunk, upload_file
+from restapi.mods.JsonResponse import json_response
 from voice_changer.VoiceChangerManager import VoiceChangerManager
 
-from const import UPLOAD_DIR
+from const import MAX_SLOT_NUM, UPLOAD_DIR
 from voice_changer.utils.LoadModelParams import LoadModelParamFile, LoadModelParams
 import logging
 logger = logging.getLogger(__name__)
@@ -19,13 +21,18 @@ class MMVC_Rest_Fileuploader:
         self.router = APIRouter()
         self.router.add_api_route("/info", self.get_info, methods=["GET"])
         self.router.add_api_route("/upload_file", self.post_upload_file, methods=["POST"])
+        self.router.add_api_route("/upload_chunk", self.post_upload_chunk, methods=["POST"])
+        self.router.add_api_route("/upload_status", self.get_upload_status, methods=["GET"])
         self.router.add_api_route("/update_settings", self.post_update_settings, methods=["POST"])
+        self.router.add_api_route("/update_settings_batch", self.post_update_settings_batch, methods=["POST"])
         self.router.add_api_route("/load_model", self.post_load_model, methods=["POST"])
         self.router.add_api_route("/onnx", self.get_onnx, methods=["GET"])
+        self.router.add_api_route("/onnx_jobs", self.get_onnx_jobs, methods=["GET"])
         self.router.add_api_route("/merge_model", self.post_merge_models, methods=["POST"])
         self.router.add_api_route("/update_model_default", self.post_update_model_default, methods=["POST"])
         self.router.add_api_route("/update_model_info", self.post_update_model_info, methods=["POST"])
         self.router.add_api_route("/upload_model_assets", self.post_upload_model_assets, methods=["POST"])
+        self.router.add_api_route("/refresh_audio_devices", self.post_refresh_audio_devices, methods=["POST"])
 
     def post_upload_file(self, file: UploadFile, filename: str = Form(...)):
         try:
@@ -35,19 +42,52 @@ class MMVC_Rest_Fileuploader:
         except Exception as e:
             logger.exception(e)
 
+    def _slot_upload_path(self, slot: int, dir: str, filename: str):
+        if not 0 <= slot < MAX_SLOT_NUM:
+            raise ValueError(f"Invalid slot: {slot}")
+        return chunked_upload_path(os.path.join(self.voiceChangerManager.params.model_dir, str(slot)), dir, filename)
+
+    def post_upload_chunk(
+        self,
+        file: UploadFile,
+        slot: int = Form(...),
+        filename: str = Form(...),
+        offset: int = Form(...),
+        total: int = Form(...),
+        dir: str = Form(""),
+    ):
+        # Chunks are written into the slot directory, load_model then uses the file in place
+        try:
+            res = upload_chunk(self._slot_upload_path(slot, dir, filename), file, offset, total)
+            return json_response(res)
+        except Exception as e:
+            logger.exception(e)
+
+    def get_upload_status(self, slot: int, filename: str, dir: str = ""):
+        try:
+            res = get_upload_status(self._slot_upload_path(slot, dir, filename))
+            return json_response(res)
+        except Exception as e:
+            logger.exception(e)
+
     def get_info(self):
         try:
             info = self.voiceChangerManager.get_info()
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
 
     def post_update_settings(self, key: str = Form(...), val: Union[int, str, float] = Form(...)):
         try:
             info = self.voiceChangerManager.update_settings(key, val)
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
+        except Exception as e:
+            logger.exception(e)
+
+    def post_update_settings_batch(self, settings: str = Form(...)):
+        try:
+            info = self.voiceChangerManager.update_settings_batch(json.loads(settings))
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
 
@@ -65,16 +105,21 @@ class MMVC_Rest_Fileuploader:
             # logger.info(f"paramDict", loadModelparams)
 
             info = await self.voiceChangerManager.load_model(loadModelparams)
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
 
     def get_onnx(self):
         try:
             info = self.voiceChangerManager.export2onnx()
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
+        except Exception as e:
+            logger.exception(e)
+
+    def get_onnx_jobs(self):
+        try:
+            info = self.voiceChangerManager.get_onnx_export_jobs()
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
 
@@ -82,31 +127,34 @@ class MMVC_Rest_Fileuploader:
         try:
             logger.info(request)
             info = await self.voiceChangerManager.merge_models(request)
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
 
     def post_update_model_default(self):
         try:
             info = self.voiceChangerManager.update_model_default()
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
 
     def post_update_model_info(self, newData: str = Form(...)):
         try:
             info = self.voiceChangerManager.update_model_info(newData)
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
 
     def post_upload_model_assets(self, params: str = Form(...)):
         try:
             info = self.voiceChangerManager.upload_model_assets(params)
-            json_compatible_item_data = jsonable_encoder(info)
-            return JSONResponse(content=json_compatible_item_data)
+            return json_response(info)
+        except Exception as e:
+            logger.exception(e)
+
+    def post_refresh_audio_devices(self):
+        try:
+            info = self.voiceChangerManager.refresh_audio_devices()
+            return json_response(info)
         except Exception as e:
             logger.exception(e)
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from voice_changer.utils.StartupState import StartupState
+
+
+class MMVC_Rest_Health:
+    """
+    Probes for process supervisors. /healthz answers as soon as the server
+    is listening, /readyz only once the model is loaded and warmed up.
+    """
+
+    def __init__(self):
+        self.startup = StartupState.get_instance()
+        self.router = APIRouter()
+        self.router.add_api_route("/healthz", self.healthz, methods=["GET"])
+        self.router.add_api_route("/readyz", self.readyz, methods=["GET"])
+
+    # Served on the event loop, so that probes do not wait behind requests in the thread pool
+    async def healthz(self):
+        return {"status": "OK"}
+
+    async def readyz(self):
+        status = self.startup.get_status()
+        return JSONResponse(content=status, status_code=200 if status['ready'] else 503)
@@ -0,0 +1,136 @@
+import torch
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from voice_changer.VoiceChangerManager import VoiceChangerManager
+from voice_changer.utils.Metrics import STAGE_NAMES, Counter, StageMetrics, process_rss_bytes
+
+import logging
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Histogram buckets in seconds
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+LATENCY_BUCKETS_NS = [int(le * 1e9) for le in LATENCY_BUCKETS]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items()) + '}'
+
+
+class MMVC_Rest_Metrics:
+    """
+    Prometheus text exposition of the realtime path health.
+    Only reads counters kept in memory, so it is cheap enough to be scraped every second.
+    """
+
+    def __init__(self, voiceChangerManager: VoiceChangerManager):
+        self.voiceChangerManager = voiceChangerManager
+        self.metrics = StageMetrics.get_instance()
+        self.router = APIRouter()
+        self.router.add_api_route("/metrics", self.get_metrics, methods=["GET"])
+
+    def get_metrics(self):
+        lines: list[str] = []
+
+        def add(name: str, kind: str, help: str, samples: list[tuple[dict, float | int]]):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(**labels)} {value}')
+
+        try:
+            self._add_stage_histograms(lines)
+
+            counters = list(self.metrics.counters)
+            add('vcclient_chunks_total', 'counter', 'Audio chunks handled by the voice changer.', [
+                ({'result': 'processed'}, counters[Counter.CHUNKS_PROCESSED]),
+                ({'result': 'dropped'}, counters[Counter.CHUNKS_DROPPED]),
+            ])
+            add('vcclient_silent_chunks_total', 'counter', 'Processed chunks below the silence threshold.', [
+                ({}, counters[Counter.CHUNKS_SILENT]),
+            ])
+            add('vcclient_model_cache_total', 'counter', 'Shared model lookups served from memory or loaded.', [
+                ({'model': 'embedder', 'result': 'hit'}, counters[Counter.EMBEDDER_CACHE_HIT]),
+                ({'model': 'embedder', 'result': 'miss'}, counters[Counter.EMBEDDER_CACHE_MISS]),
+                ({'model': 'pitch_extractor', 'result': 'hit'}, counters[Counter.PITCH_EXTRACTOR_CACHE_HIT]),
+                ({'model': 'pitch_extractor', 'result': 'miss'}, counters[Counter.PITCH_EXTRACTOR_CACHE_MISS]),
+            ])
+
+            server_device = self.voiceChangerManager.serverDevice
+            add('vcclient_active_sessions', 'gauge', 'Connected audio sessions.', [
+                ({'transport': 'socketio'}, counters[Counter.SESSIONS_CONNECTED] - counters[Counter.SESSIONS_DISCONNECTED]),
+                ({'transport': 'server_audio'}, int(server_device.stream_loop)),
+            ])
+            add('vcclient_server_audio_xruns_total', 'counter', 'Server audio output underruns and dropped samples.', [
+                ({'kind': 'underrun'}, counters[Counter.SERVER_AUDIO_UNDERRUNS]),
+                ({'kind': 'overrun'}, counters[Counter.SERVER_AUDIO_OVERRUNS]),
+            ])
+            add('vcclient_server_audio_buffer_seconds', 'gauge', 'Audio buffered between the server audio device and the inference thread.', [
+                ({'buffer': buffer}, secs) for buffer, secs in server_device.get_buffer_status().items()
+            ])
+
+            self._add_model_info(add)
+            self._add_memory(add)
+        except Exception as e:
+            logger.exception(e)
+
+        lines.append('')
+        return Response(content='\n'.join(lines), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    def _add_stage_histograms(self, lines: list[str]):
+        name = 'vcclient_stage_duration_seconds'
+        lines.append(f'# HELP {name} Time spent per chunk in each stage of the realtime path.')
+        lines.append(f'# TYPE {name} histogram')
+        for stage, histogram in zip(STAGE_NAMES, self.metrics.histograms):
+            # Read count and sum first so that buckets never exceed them during concurrent updates.
+            count = histogram.count
+            total = histogram.sum
+            for le, cumulative in zip(LATENCY_BUCKETS, histogram.cumulative(LATENCY_BUCKETS_NS)):
+                lines.append(f'{name}_bucket{_labels(stage=stage, le=le)} {min(cumulative, count)}')
+            lines.append(f'{name}_bucket{_labels(stage=stage, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{_labels(stage=stage)} {total / 1e9}')
+            lines.append(f'{name}_count{_labels(stage=stage)} {count}')
+
+    def _add_model_info(self, add):
+        manager = self.voiceChangerManager
+        settings = manager.settings
+        device_manager = manager.device_manager
+        model = manager.voiceChangerModel
+        slot_info = model.slotInfo if model is not None else None
+        providers, _ = device_manager.get_onnx_execution_provider()
+        labels = {
+            'slot': settings.modelSlotIndex,
+            'model_type': '' if slot_info is None else (slot_info.modelTypeOnnx if settings.useONNX or slot_info.isONNX else slot_info.modelType),
+            'f0_detector': settings.f0Detector,
+            'backend': device_manager.device_metadata['backend'],
+            'device': str(device_manager.device),
+            'onnx_provider': providers[0],
+            'fp16': device_manager.use_fp16(),
+        }
+        add('vcclient_model_info', 'gauge', 'Currently loaded model slot and its backend.', [
+            (labels, int(model is not None and model.pipeline is not None)),
+        ])
+
+    def _add_memory(self, add):
+        rss = process_rss_bytes()
+        if rss is not None:
+            add('vcclient_process_resident_memory_bytes', 'gauge', 'Resident memory of the server process.', [({}, rss)])
+
+        device = self.voiceChangerManager.device_manager.device
+        if device.type == 'cuda':
+            add('vcclient_tensor_memory_bytes', 'gauge', 'Memory held by the torch allocator on the device.', [
+                ({'kind': 'allocated'}, torch.cuda.memory_allocated(device)),
+                ({'kind': 'reserved'}, torch.cuda.memory_reserved(device)),
+            ])
+        elif device.type == 'mps':
+            add('vcclient_tensor_memory_bytes', 'gauge', 'Memory held by the torch allocator on the device.', [
+                ({'kind': 'allocated'}, torch.mps.current_allocated_memory()),
+                ({'kind': 'reserved'}, torch.mps.driver_allocated_memory()),
+            ])
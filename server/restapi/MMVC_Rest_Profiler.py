@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Form
+from fastapi.responses import JSONResponse
+
+from voice_changer.utils.Profiler import Profiler
+
+
+class MMVC_Rest_Profiler:
+    def __init__(self):
+        self.profiler = Profiler.get_instance()
+        self.router = APIRouter()
+        self.router.add_api_route("/profile", self.get_profile, methods=["GET"])
+        self.router.add_api_route("/profile", self.post_profile, methods=["POST"])
+        self.router.add_api_route("/profile", self.delete_profile, methods=["DELETE"])
+
+    def get_profile(self):
+        return JSONResponse(content=self.profiler.get_status())
+
+    def post_profile(self, chunks: int = Form(...)):
+        """Arms profiling of the next chunks. Poll GET /profile for the trace file under /tmp."""
+        if not self.profiler.arm(chunks):
+            return JSONResponse(status_code=409, content=self.profiler.get_status())
+        return JSONResponse(content=self.profiler.get_status())
+
+    def delete_profile(self):
+        """Cancels an armed or running capture."""
+        if not self.profiler.cancel():
+            return JSONResponse(status_code=409, content=self.profiler.get_status())
+        return JSONResponse(content=self.profiler.get_status())
@@ -1,11 +1,12 @@
 import numpy as np
-from time import time
+from time import time, perf_counter_ns
 from msgspec import msgpack
 
 from fastapi import APIRouter, Request
 from fastapi.responses import Response, PlainTextResponse
 from const import get_edition, get_version
 from voice_changer.VoiceChangerManager import VoiceChangerManager
+from voice_changer.utils.Metrics import Stage, StageMetrics
 
 import logging
 logger = logging.getLogger(__name__)
@@ -14,6 +15,7 @@ logger = logging.getLogger(__name__)
 class MMVC_Rest_VoiceChanger:
     def __init__(self, voiceChangerManager: VoiceChangerManager):
         self.voiceChangerManager = voiceChangerManager
+        self.metrics = StageMetrics.get_instance()
         self.router = APIRouter()
         self.router.add_api_route("/test", self.test, methods=["POST"])
         self.router.add_api_route("/edition", self.edition, methods=["GET"])
@@ -32,12 +34,16 @@ class MMVC_Rest_VoiceChanger:
         recv_timestamp = round(time() * 1000)
         try:
             data = await req.body()
+            t = perf_counter_ns()
             ts, voice = msgpack.decode(data)
 
             unpackedData = np.frombuffer(voice, dtype=np.int16).astype(np.float32) / 32768
+            self.metrics.lap(Stage.TRANSPORT, t)
 
             out_audio, vol, perf, err = self.voiceChangerManager.changeVoice(unpackedData)
+            t = perf_counter_ns()
             out_audio = (out_audio * 32767).astype(np.int16).tobytes()
+            self.metrics.lap(Stage.TRANSPORT, t)
 
             if err is not None:
                 error_code, error_message = err
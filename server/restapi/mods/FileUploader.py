@@ -1,8 +1,14 @@
 import os
-import shutil
+import threading
+from dataclasses import dataclass, field
 from fastapi import UploadFile
+from xxhash import xxh128
+from voice_changer.common.ArtifactManifest import record_file_hash
 
 MAX_PATH_LENGTH = 255
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+# Incomplete chunked uploads are kept under this suffix, their size is the resume offset
+PARTIAL_SUFFIX = '.part'
 
 def sanitize_filename(filename: str) -> str:
     safe_filename = os.path.basename(filename)
@@ -14,11 +20,106 @@ def sanitize_filename(filename: str) -> str:
     return safe_filename
 
 
+def _copy_hashed(src, dst, hasher):
+    # dst is None to only hash src
+    while data := src.read(COPY_BUFFER_SIZE):
+        if dst is not None:
+            dst.write(data)
+        hasher.update(data)
+
+
 def upload_file(upload_dirname: str, file: UploadFile, filename: str):
     filename = sanitize_filename(filename)
     target_path = os.path.join(upload_dirname, filename)
     target_dir = os.path.dirname(target_path)
     os.makedirs(target_dir, exist_ok=True)
+    hasher = xxh128()
     with open(target_path, "wb+") as upload_dir:
-        shutil.copyfileobj(file.file, upload_dir)
+        _copy_hashed(file.file, upload_dir, hasher)
+    record_file_hash(target_path, hasher.hexdigest())
     return {"status": "OK", "msg": f"Uploaded {filename}"}
+
+
+@dataclass
+class _ChunkedUpload:
+    # Bytes written to the partial file and hashed so far
+    offset: int = 0
+    hasher: xxh128 = field(default_factory=xxh128)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_uploads: dict[str, _ChunkedUpload] = {}
+_uploads_lock = threading.Lock()
+
+
+def chunked_upload_path(target_dir: str, subdir: str, filename: str) -> str:
+    path = os.path.abspath(os.path.join(target_dir, subdir, sanitize_filename(filename)))
+    if os.path.commonpath([path, os.path.abspath(target_dir)]) != os.path.abspath(target_dir):
+        raise ValueError(f"Invalid upload directory: {subdir}")
+    return path
+
+
+def _get_upload(target_path: str) -> _ChunkedUpload:
+    with _uploads_lock:
+        upload = _uploads.get(target_path)
+        if upload is None:
+            upload = _ChunkedUpload()
+            _uploads[target_path] = upload
+        return upload
+
+
+def get_upload_status(target_path: str):
+    partial_path = target_path + PARTIAL_SUFFIX
+    offset = os.path.getsize(partial_path) if os.path.isfile(partial_path) else 0
+    return {"status": "OK", "offset": offset}
+
+
+def upload_chunk(target_path: str, chunk: UploadFile, offset: int, total: int):
+    """
+    Appends a chunk at offset to the partial file of target_path, hashing it
+    on the way. An upload is resumed by sending the next chunk at the offset
+    reported by get_upload_status, and restarted by sending offset 0. Once
+    total bytes are received, the file is moved into place and its xxh128 is
+    recorded in the artifact manifest, so it is never read again for hashing.
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    partial_path = target_path + PARTIAL_SUFFIX
+    upload = _get_upload(target_path)
+    with upload.lock:
+        size = os.path.getsize(partial_path) if os.path.isfile(partial_path) else 0
+        if offset == 0:
+            upload.offset = 0
+            upload.hasher = xxh128()
+            size = 0
+        elif offset != size:
+            # Resent or lost chunk, the client continues from the returned offset
+            return {"status": "OFFSET_MISMATCH", "offset": size}
+
+        if upload.offset != size:
+            # Resumed after a restart, the hash state of the received part is lost
+            upload.hasher = xxh128()
+            with open(partial_path, 'rb') as f:
+                _copy_hashed(f, None, upload.hasher)
+            upload.offset = size
+
+        with open(partial_path, 'wb' if offset == 0 else 'r+b') as f:
+            f.seek(offset)
+            _copy_hashed(chunk.file, f, upload.hasher)
+            upload.offset = f.tell()
+            f.truncate()
+
+        if upload.offset > total:
+            received = upload.offset
+            os.remove(partial_path)
+            upload.offset = 0
+            raise ValueError(f"Received {received} bytes of {os.path.basename(target_path)}, expected {total}.")
+        if upload.offset < total:
+            return {"status": "OK", "offset": upload.offset}
+
+        os.replace(partial_path, target_path)
+        hash = upload.hasher.hexdigest()
+        record_file_hash(target_path, hash)
+        with _uploads_lock:
+            del _uploads[target_path]
+    return {"status": "OK", "offset": total, "done": True, "hash": hash}
+
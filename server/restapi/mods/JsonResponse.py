@@ -0,0 +1,22 @@
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from data.RawJSON import RawJSON
+
+
+def json_response(data: Any) -> Response:
+    """
+    JSONResponse that embeds RawJSON values of a top-level dict without
+    encoding them again, f.e., the cached sample and slot lists in /info.
+    """
+    if not isinstance(data, dict) or not any(isinstance(val, RawJSON) for val in data.values()):
+        return JSONResponse(content=jsonable_encoder(data))
+
+    rest = {key: val for key, val in data.items() if not isinstance(val, RawJSON)}
+    body = json.dumps(jsonable_encoder(rest), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    parts = [body[1:-1]] if rest else []
+    parts.extend(f"{json.dumps(key, ensure_ascii=False)}:{val}" for key, val in data.items() if isinstance(val, RawJSON))
+    return Response(content="{" + ",".join(parts) + "}", media_type="application/json")
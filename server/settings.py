@@ -1,6 +1,6 @@
 from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from const import get_edition, RVCSampleMode, DOTENV_FILE
+from const import get_edition, RVCSampleMode, PrebuiltArtifact, DOTENV_FILE
 
 class ServerSettings(BaseSettings):
     model_config = SettingsConfigDict(env_file=DOTENV_FILE, env_file_encoding='utf-8', protected_namespaces=('model_config',))
@@ -24,4 +24,7 @@ class ServerSettings(BaseSettings):
     host: str = '192.168.193.163'
     port: int = 18888
     allowed_origins: Literal['*'] | list[str] = []
+    # Built in the background when a model is uploaded or merged.
+    # 'onnx' exports PyTorch models ahead of time, otherwise they are exported once useONNX is enabled.
+    prebuilt_artifacts: list[PrebuiltArtifact] = ['onnxFp16', 'indexVectors']
     edition: str = get_edition()
@@ -1,13 +1,21 @@
 import numpy as np
 import socketio
-from time import time
+from time import time, perf_counter_ns
 from voice_changer.VoiceChangerManager import VoiceChangerManager
+from voice_changer.RVC.onnxExporter.OnnxExportQueue import OnnxExportQueue
+from voice_changer.utils.Metrics import Counter, Stage, StageMetrics
+from voice_changer.utils.StartupState import StartupState
 
 import asyncio
+from collections import deque
 
 import logging
 logger = logging.getLogger(__name__)
 
+# Server stats are sent to the client at most this often
+STATS_EMIT_INTERVAL = 0.1
+
+
 class MMVC_Namespace(socketio.AsyncNamespace):
     sid: str | None = None
 
@@ -18,15 +26,63 @@ class MMVC_Namespace(socketio.AsyncNamespace):
         else:
             await self.emit("server_stats", [vol, perf], to=self.sid)
 
-    def emit_coroutine(self, vol, perf, err):
-        if self.sid:
-            asyncio.run(self.emitTo(vol, perf, err))
+    def push_stats(self, vol, perf, err):
+        # Called from audio threads for every chunk. Only the latest sample is kept
+        # (deque appends and pops are atomic), the emitter task sends it from the server loop.
+        if not self.sid:
+            return
+        if err is not None:
+            self.pending_error.append(err)
+        else:
+            self.pending_stats.append((vol, perf))
+
+    def push_export_job(self, job: dict):
+        # Called from the ONNX export worker. Only the latest status of each job is sent.
+        if not self.sid:
+            return
+        self.pending_export_jobs[job['id']] = job
+
+    def push_startup(self, status: dict):
+        # Called from the startup task and its worker thread. Only the latest status is sent.
+        if not self.sid:
+            return
+        self.pending_startup.append(status)
+
+    async def emit_stats_loop(self):
+        while True:
+            await asyncio.sleep(STATS_EMIT_INTERVAL)
+            if self.sid is None:
+                continue
+            try:
+                if self.pending_error:
+                    await self.emitTo(0, None, self.pending_error.popleft())
+                if self.pending_stats:
+                    vol, perf = self.pending_stats.popleft()
+                    await self.emitTo(vol, perf, None)
+                if self.pending_startup:
+                    await self.emit("startup", self.pending_startup.popleft(), to=self.sid)
+                while self.pending_export_jobs:
+                    _, job = self.pending_export_jobs.popitem()
+                    await self.emit("onnx_export", job, to=self.sid)
+            except IndexError:
+                # Drained by a concurrent reset
+                pass
+            except Exception as e:
+                logger.exception(e)
 
     def __init__(self, namespace: str, voiceChangerManager: VoiceChangerManager):
         super().__init__(namespace)
         self.voiceChangerManager = voiceChangerManager
-        # self.voiceChangerManager.voiceChanger.emitTo = self.emit_coroutine
-        self.voiceChangerManager.setEmitTo(self.emit_coroutine)
+        self.metrics = StageMetrics.get_instance()
+        self.pending_stats: deque[tuple] = deque(maxlen=1)
+        self.pending_error: deque[tuple[str, str]] = deque(maxlen=1)
+        self.pending_export_jobs: dict[str, dict] = {}
+        self.pending_startup: deque[dict] = deque(maxlen=1)
+        self.stats_emitter = None
+        self.voiceChangerManager.setEmitTo(self.push_stats)
+        OnnxExportQueue.get_instance(voiceChangerManager.params.model_dir).add_listener(self.push_export_job)
+        self.startup = StartupState.get_instance()
+        self.startup.add_listener(self.push_startup)
 
     @classmethod
     def get_instance(cls, voiceChangerManager: VoiceChangerManager):
@@ -36,14 +92,22 @@ class MMVC_Namespace(socketio.AsyncNamespace):
 
     def on_connect(self, sid, environ, ext):
         self.sid = sid
+        self.pending_stats.clear()
+        self.pending_error.clear()
+        self.pending_startup.append(self.startup.get_status())
+        if self.stats_emitter is None:
+            self.stats_emitter = self.server.start_background_task(self.emit_stats_loop)
+        self.metrics.inc(Counter.SESSIONS_CONNECTED)
         logger.info(f"Connected SID: {sid}")
 
     async def on_request_message(self, sid, msg):
         recv_timestamp = round(time() * 1000)
 
+        t = perf_counter_ns()
         ts, data = msg
         # Receive and send int16 instead of float32 to reduce bandwidth requirement over websocket
         input_audio = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768
+        self.metrics.lap(Stage.TRANSPORT, t)
 
         out_audio, vol, perf, err = self.voiceChangerManager.changeVoice(input_audio)
         if err is not None:
@@ -51,10 +115,13 @@ class MMVC_Namespace(socketio.AsyncNamespace):
             await self.emit("error", [error_code, error_message], to=sid)
         else:
             ping = recv_timestamp - ts
+            t = perf_counter_ns()
             out_audio = (out_audio * 32767).astype(np.int16).tobytes()
+            self.metrics.lap(Stage.TRANSPORT, t)
             send_timestamp = round(time() * 1000)
             await self.emit("response", [send_timestamp, out_audio, ping, vol, perf], to=sid)
 
     def on_disconnect(self, sid):
         self.sid = None
+        self.metrics.inc(Counter.SESSIONS_DISCONNECTED)
         logger.info(f"Disconnected SID: {sid}")
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from xxhash import xxh128
+
+from downloader import Downloader
+from downloader.HttpClient import HttpClient
+
+SEGMENT_SIZE = 64 * 1024
+SEGMENTS = 8
+
+
+class RangeServer:
+    """Local stand-in for the model hosting, serving one file with byte ranges."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.etag = '"v1"'
+        self.ranges: list[tuple[int, int]] = []
+        self.heads = 0
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+        # Segment starts that fail on their next request
+        self.fail: set[int] = set()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('HEAD', '/file', self.head)
+        app.router.add_get('/file', self.get, allow_head=False)
+        return app
+
+    async def head(self, request: web.Request):
+        self.heads += 1
+        return web.Response(headers={'Content-Length': str(len(self.data)), 'Accept-Ranges': 'bytes', 'ETag': self.etag})
+
+    async def get(self, request: web.Request):
+        start, end = request.http_range.start, request.http_range.stop
+        self.ranges.append((start, end))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if start in self.fail:
+            self.fail.remove(start)
+            # Fails after the other segments completed, so that they are kept
+            await asyncio.sleep(0.2)
+            raise web.HTTPInternalServerError()
+        return web.Response(status=206, body=self.data[start:end], headers={'ETag': self.etag})
+
+
+class TestDownloader(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saveTo = os.path.join(self.tmp.name, 'model.bin')
+        self.patch(Downloader, 'ASSETS_FILE', os.path.join(self.tmp.name, 'assets.json'))
+        self.patch(Downloader, 'files', {})
+        self.patch(Downloader, 'SEGMENT_SIZE', SEGMENT_SIZE)
+        self.patch(Downloader, '_connections', None)
+        HttpClient._instance = None
+
+        self.remote = RangeServer(os.urandom(SEGMENT_SIZE * SEGMENTS - 100))
+        self.server = TestServer(self.remote.app())
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await (await HttpClient.get_client()).close()
+        HttpClient._instance = None
+        await self.server.close()
+        self.tmp.cleanup()
+
+    def patch(self, obj, name: str, value):
+        old = getattr(obj, name)
+        setattr(obj, name, value)
+        self.addCleanup(setattr, obj, name, old)
+
+    def params(self, **kwargs) -> dict:
+        return {'url': str(self.server.make_url('/file')), 'saveTo': self.saveTo, **kwargs}
+
+    def read(self) -> bytes:
+        with open(self.saveTo, 'rb') as f:
+            return f.read()
+
+    def segment_starts(self) -> list[int]:
+        return sorted(start for start, _ in self.remote.ranges)
+
+    async def test_downloads_segments_in_parallel(self):
+        self.remote.delay = 0.05
+        await Downloader.download(self.params(hash=xxh128(self.remote.data).hexdigest()))
+
+        self.assertEqual(self.read(), self.remote.data)
+        self.assertEqual(self.segment_starts(), [i * SEGMENT_SIZE for i in range(SEGMENTS)])
+        self.assertGreater(self.remote.max_active, 1)
+        self.assertFalse(os.path.exists(self.saveTo + Downloader.STATE_SUFFIX))
+        with open(Downloader.ASSETS_FILE, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)[self.saveTo]['hash'], xxh128(self.remote.data).hexdigest())
+
+    async def test_limits_connections(self):
+        self.patch(Downloader, 'MAX_CONNECTIONS', 3)
+        self.remote.delay = 0.05
+        await Downloader.download(self.params())
+
+        self.assertEqual(self.read(), self.remote.data)
+        self.assertEqual(self.remote.max_active, 3)
+
+    async def test_resumes_after_failed_segment(self):
+        self.remote.fail.add(3 * SEGMENT_SIZE)
+        with self.assertRaises(Exception):
+            await Downloader.download(self.params())
+        with open(self.saveTo + Downloader.STATE_SUFFIX, encoding='utf-8') as f:
+            self.assertNotIn('3', json.load(f)['done'])
+
+        # Only the failed segment is fetched again
+        self.remote.ranges.clear()
+        await Downloader.download(self.params())
+        self.assertEqual(self.segment_starts(), [3 * SEGMENT_SIZE])
+        self.assertEqual(self.read(), self.remote.data)
+
+    async def test_trusts_manifest_of_complete_file(self):
+        await Downloader.download(self.params())
+        self.remote.ranges.clear()
+        self.remote.heads = 0
+
+        await Downloader.download(self.params())
+        self.assertEqual((self.remote.heads, self.remote.ranges), (0, []))
+
+        # A file that changed since it was recorded is checked again
+        st = os.stat(self.saveTo)
+        os.utime(self.saveTo, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        await Downloader.download(self.params())
+        self.assertEqual(self.remote.heads, 1)
+
+    async def test_restarts_when_etag_changes(self):
+        self.remote.fail.add(0)
+        with self.assertRaises(Exception):
+            await Downloader.download(self.params())
+
+        self.remote.data = os.urandom(len(self.remote.data))
+        self.remote.etag = '"v2"'
+        self.remote.ranges.clear()
+        await Downloader.download(self.params())
+        self.assertEqual(len(self.remote.ranges), SEGMENTS)
+        self.assertEqual(self.read(), self.remote.data)
+
+    async def test_repairs_corrupted_segment(self):
+        expected_hash = xxh128(self.remote.data).hexdigest()
+        self.remote.fail.add(0)
+        with self.assertRaises(Exception):
+            await Downloader.download(self.params(hash=expected_hash))
+        # A completed segment no longer matches its recorded hash (f.e., after a crash)
+        with open(self.saveTo, 'r+b') as f:
+            f.seek(5 * SEGMENT_SIZE)
+            f.write(bytes(16))
+
+        self.remote.ranges.clear()
+        await Downloader.download(self.params(hash=expected_hash))
+        self.assertEqual(self.segment_starts(), [0, 5 * SEGMENT_SIZE])
+        self.assertEqual(self.read(), self.remote.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from voice_changer import VoiceChangerManager as manager_module
+from voice_changer.VoiceChangerManager import VoiceChangerManager
+from voice_changer.VoiceChangerSettings import VoiceChangerSettings
+from voice_changer.utils.StartupState import StartupState
+
+BROKEN_SLOT = 1
+WORKING_SLOT = 2
+
+
+def slot_info(slot: int):
+    return SimpleNamespace(
+        slotIndex=slot,
+        voiceChangerType="RVC",
+        defaultTune=0,
+        defaultFormantShift=0,
+        defaultIndexRatio=0,
+        defaultProtect=0.5,
+    )
+
+
+class FakeModel:
+    voiceChangerType = "RVC"
+
+    def __init__(self, params, slotInfo, settings):
+        self.set_slot_info(slotInfo)
+
+    def set_slot_info(self, slotInfo):
+        if slotInfo.slotIndex == BROKEN_SLOT:
+            raise RuntimeError("Corrupt model")
+        self.slotInfo = slotInfo
+
+    def initialize(self):
+        pass
+
+
+class FakeVoiceChanger:
+    block_frame = 4
+
+    def __init__(self, params, settings):
+        self.model = None
+
+    def set_model(self, model):
+        self.model = model
+
+    def on_request(self, audio):
+        return audio, 0, [0, 0, 0]
+
+    def update_settings(self, key, val, old_val):
+        pass
+
+    def get_info(self):
+        return {}
+
+
+class TestModelLoading(unittest.TestCase):
+    def setUp(self):
+        for name, fake in (('RVCr2', FakeModel), ('VoiceChangerV2', FakeVoiceChanger)):
+            patcher = mock.patch.object(manager_module, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # Without __init__, which starts the server audio thread
+        manager = VoiceChangerManager.__new__(VoiceChangerManager)
+        manager.params = mock.Mock()
+        manager.settings = VoiceChangerSettings()
+        manager.settings_store = mock.Mock()
+        manager.startup_state = StartupState()
+        manager.model_lock = threading.RLock()
+        manager.modelSlotManager = mock.Mock(get_slot_info=slot_info)
+        manager.device_manager = mock.Mock(lock=threading.Lock())
+        manager.serverDevice = mock.Mock()
+        manager.metrics = mock.Mock()
+        manager.voiceChanger = None
+        manager.voiceChangerModel = None
+        self.manager = manager
+
+    def convert(self):
+        _, _, _, err = self.manager.changeVoice(np.zeros(4, dtype=np.float32))
+        return err
+
+    def test_slot_change_recovers_from_failed_startup_load(self):
+        self.manager.settings.modelSlotIndex = BROKEN_SLOT
+        self.manager.prepare_model()
+
+        self.assertTrue(self.manager.startup_state.ready)
+        self.assertIsNone(self.manager.voiceChanger)
+        self.assertEqual(self.convert()[0], 'NoVoiceChangerLoaded')
+
+        self.manager.update_settings_batch({'modelSlotIndex': WORKING_SLOT})
+        self.assertEqual(self.manager.voiceChangerModel.slotInfo.slotIndex, WORKING_SLOT)
+        self.assertIsNone(self.convert())
+
+    def test_failed_slot_change_drops_the_model(self):
+        self.manager.settings.modelSlotIndex = WORKING_SLOT
+        self.manager.prepare_model()
+        self.assertIsNone(self.convert())
+
+        self.manager.update_settings_batch({'modelSlotIndex': BROKEN_SLOT})
+        self.assertIsNone(self.manager.voiceChanger)
+        self.assertEqual(self.convert()[0], 'NoVoiceChangerLoaded')
+
+        self.manager.update_settings_batch({'modelSlotIndex': WORKING_SLOT})
+        self.assertIsNone(self.convert())
+
+
+if __name__ == '__main__':
+    unittest.main()
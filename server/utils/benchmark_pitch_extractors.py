@@ -0,0 +1,284 @@
+# Pitch extractor latency and accuracy benchmark.
+# Run from the server directory: python -m utils.benchmark_pitch_extractors --help
+#
+# Synthetic voice with a known f0 contour is streamed through each extractor
+# the same way RVCr2 does it: a convert buffer sized by RVCr2.realloc is
+# shifted by one block per call. Results are written as JSON so that a CI job
+# can compare them against a stored baseline (--baseline), in which case the
+# exit code is 1 on regression.
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import numpy as np
+import torch
+
+from const import PitchExtractorType
+from settings import ServerSettings
+from voice_changer.common.deviceManager.DeviceManager import DeviceManager
+from voice_changer.RVC.pitchExtractor.PitchExtractorManager import PitchExtractorManager
+from utils.synthetic_voice import make_test_signal
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+ALL_EXTRACTORS: list[PitchExtractorType] = [
+    'crepe_full', 'crepe_tiny', 'crepe_full_onnx', 'crepe_tiny_onnx',
+    'rmvpe', 'rmvpe_onnx', 'fcpe', 'fcpe_onnx',
+]
+
+SR = 16000
+WINDOW = 160
+# Estimates further than this from the reference count as gross pitch errors
+GPE_THRESHOLD = 0.2
+
+
+def get_buffer_sizes(server_read_chunk_size: int, extra_convert_size: float, crossfade_overlap_size: float, input_sample_rate: int) -> dict:
+    """Mirrors the frame size calculation of VoiceChangerV2 and RVCr2.realloc."""
+    block_frame = server_read_chunk_size * 128
+    crossfade_frame = int(crossfade_overlap_size * input_sample_rate)
+    extra_frame = int(extra_convert_size * input_sample_rate)
+    sola_search_frame = input_sample_rate // 100
+
+    block_frame_16k = int(block_frame / input_sample_rate * SR)
+    crossfade_frame_16k = int(crossfade_frame / input_sample_rate * SR)
+    sola_search_frame_16k = int(sola_search_frame / input_sample_rate * SR)
+    extra_frame_16k = int(extra_frame / input_sample_rate * SR)
+
+    convert_size_16k = block_frame_16k + sola_search_frame_16k + extra_frame_16k + crossfade_frame_16k
+    if (modulo := convert_size_16k % WINDOW) != 0:
+        convert_size_16k = convert_size_16k + (WINDOW - modulo)
+    return {
+        'block_16k': block_frame_16k,
+        'convert_size_16k': convert_size_16k,
+        'skip_head': extra_frame_16k // WINDOW,
+        'block_ms': block_frame / input_sample_rate * 1000,
+    }
+
+
+def _sync(device: torch.device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elif device.type == 'mps':
+        torch.mps.synchronize()
+
+
+def _peak_memory_mb(device: torch.device) -> float | None:
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2 ** 20
+    if resource is not None:
+        # Process-wide peak RSS. It never decreases, so run a single extractor
+        # per process (--extractors) for comparable numbers.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+    return None
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+def run_stream(extractor, audio: np.ndarray, f0_ref: np.ndarray, sizes: dict, warmup: int, dtype: torch.dtype, device: torch.device) -> dict:
+    block = sizes['block_16k']
+    convert_size = sizes['convert_size_16k']
+    skip_head = sizes['skip_head']
+
+    audio_t = torch.as_tensor(audio, device=device, dtype=dtype)
+    buffer = torch.zeros(convert_size, device=device, dtype=dtype)
+    latencies = []
+    estimates = []
+    references = []
+
+    n_chunks = len(audio) // block
+    for i in range(n_chunks + warmup):
+        # Warm up on the beginning of the signal, measure from the start again
+        chunk_index = i if i < warmup else i - warmup
+        end = (chunk_index + 1) * block
+        buffer = torch.roll(buffer, -block)
+        buffer[-block:] = audio_t[end - block:end]
+
+        _sync(device)
+        start = time.perf_counter()
+        f0 = extractor.extract(buffer, SR, WINDOW)
+        _sync(device)
+        elapsed = time.perf_counter() - start
+        if i < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+
+        f0 = f0.float().cpu().numpy().reshape(-1)
+        n_frames = min(len(f0), convert_size // WINDOW)
+        # Frames RVCr2 returns, located in the original signal
+        positions = end - convert_size + np.arange(skip_head, n_frames) * WINDOW
+        valid = (positions >= 0) & (positions < len(f0_ref))
+        estimates.append(f0[skip_head:n_frames][valid])
+        references.append(f0_ref[positions[valid]])
+
+    est = np.concatenate(estimates)
+    ref = np.concatenate(references)
+    return {
+        'latencies_ms': latencies,
+        **pitch_metrics(est, ref),
+    }
+
+
+def pitch_metrics(est: np.ndarray, ref: np.ndarray) -> dict:
+    est = np.nan_to_num(est, nan=0, posinf=0, neginf=0)
+    ref_voiced = ref > 0
+    est_voiced = est > 0
+    both = ref_voiced & est_voiced
+    cents = 1200 * np.abs(np.log2(est[both] / ref[both])) if both.any() else np.zeros(0)
+    gross = np.abs(est[both] / ref[both] - 1) > GPE_THRESHOLD
+    return {
+        'frames': int(len(ref)),
+        # Share of frames voiced in both where the estimate is off by more than 20%
+        'gross_pitch_error': float(gross.mean()) if both.any() else float('nan'),
+        # Share of frames with a wrong voiced/unvoiced decision
+        'voicing_decision_error': float(np.mean(ref_voiced != est_voiced)),
+        'voiced_recall': float(both.sum() / max(ref_voiced.sum(), 1)),
+        'unvoiced_false_alarm': float((est_voiced & ~ref_voiced).sum() / max((~ref_voiced).sum(), 1)),
+        # Fine error of voiced frames without gross errors
+        'fine_error_cents': float(np.mean(cents[~gross])) if (~gross).any() else float('nan'),
+    }
+
+
+def benchmark(args) -> dict:
+    device_manager = DeviceManager.get_instance()
+    device_manager.initialize(args.gpu, args.force_fp32, args.disable_jit)
+    device = device_manager.device
+    dtype = torch.float16 if device_manager.use_fp16() else torch.float32
+    PitchExtractorManager.initialize(ServerSettings())
+
+    signals = [(snr, *make_test_signal(SR, snr, args.seed)) for snr in args.snr]
+
+    results = []
+    for extractor_type in args.extractors:
+        if device.type == 'cuda':
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats(device)
+        extractor = PitchExtractorManager.getPitchExtractor(extractor_type, True)
+        if extractor.type != extractor_type:
+            # The manager falls back to rmvpe_onnx when loading fails
+            logger.error(f'{extractor_type} failed to load, skipping.')
+            results.append({'extractor': extractor_type, 'error': 'failed to load'})
+            continue
+
+        for chunk_size in args.chunks:
+            sizes = get_buffer_sizes(chunk_size, args.extra, args.crossfade, args.input_sr)
+            for snr, audio, f0_ref in signals:
+                stats = run_stream(extractor, audio, f0_ref, sizes, args.warmup, dtype, device)
+                latencies = stats.pop('latencies_ms')
+                result = {
+                    'extractor': extractor_type,
+                    'server_read_chunk_size': chunk_size,
+                    'snr_db': snr,
+                    **sizes,
+                    'calls': len(latencies),
+                    'latency_p50_ms': _percentile(latencies, 50),
+                    'latency_p99_ms': _percentile(latencies, 99),
+                    'latency_max_ms': max(latencies),
+                    # Share of the block duration spent on pitch extraction alone
+                    'realtime_share_p99': _percentile(latencies, 99) / sizes['block_ms'],
+                    **stats,
+                    'peak_memory_mb': _peak_memory_mb(device),
+                }
+                logger.info(
+                    f'{extractor_type:>16} chunk={chunk_size:<4} snr={snr}: '
+                    f'p50={result["latency_p50_ms"]:.2f}ms p99={result["latency_p99_ms"]:.2f}ms '
+                    f'GPE={result["gross_pitch_error"]:.3f} VDE={result["voicing_decision_error"]:.3f}'
+                )
+                results.append(result)
+        PitchExtractorManager.pitch_extractor = None
+        del extractor
+
+    return {
+        'environment': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'device': str(device),
+            'device_name': device_manager.device_metadata['name'],
+            'fp16': device_manager.use_fp16(),
+            'jit': device_manager.use_jit_compile(),
+        },
+        'config': {
+            'input_sample_rate': args.input_sr,
+            'extra_convert_size': args.extra,
+            'crossfade_overlap_size': args.crossfade,
+            'warmup': args.warmup,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def _result_key(result: dict) -> tuple:
+    return result['extractor'], result.get('server_read_chunk_size'), result.get('snr_db')
+
+
+def compare(report: dict, baseline: dict, latency_tolerance: float, accuracy_tolerance: float) -> list[str]:
+    """Returns regressions of the report against the baseline."""
+    baseline_results = {_result_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        key = _result_key(result)
+        base = baseline_results.get(key)
+        if base is None or 'error' in base:
+            continue
+        if 'error' in result:
+            regressions.append(f'{key}: {result["error"]}')
+            continue
+        if result['latency_p99_ms'] > base['latency_p99_ms'] * (1 + latency_tolerance):
+            regressions.append(f'{key}: p99 latency {base["latency_p99_ms"]:.2f}ms -> {result["latency_p99_ms"]:.2f}ms')
+        for metric in ('gross_pitch_error', 'voicing_decision_error'):
+            if result[metric] > base[metric] + accuracy_tolerance:
+                regressions.append(f'{key}: {metric} {base[metric]:.4f} -> {result[metric]:.4f}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pitch extractors on synthetic voice at realtime chunk sizes.')
+    parser.add_argument('--extractors', nargs='+', default=ALL_EXTRACTORS, choices=ALL_EXTRACTORS)
+    parser.add_argument('--chunks', nargs='+', type=int, default=[64, 128, 192, 256, 384], help='serverReadChunkSize values (x128 samples).')
+    parser.add_argument('--extra', type=float, default=0.5, help='extraConvertSize in seconds.')
+    parser.add_argument('--crossfade', type=float, default=0.1, help='crossFadeOverlapSize in seconds.')
+    parser.add_argument('--input-sr', type=int, default=48000, help='Audio device sample rate the buffer sizes are based on.')
+    parser.add_argument('--snr', nargs='+', type=float, default=[40, 10], help='Signal-to-noise ratios in dB of the test signals.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured calls before each run.')
+    parser.add_argument('--gpu', type=int, default=-1, help='Device ID as used by the server, -1 for CPU.')
+    parser.add_argument('--force-fp32', action='store_true')
+    parser.add_argument('--disable-jit', action='store_true')
+    parser.add_argument('--output', type=str, default=None, help='Write the JSON report to this file instead of stdout.')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON report to check for regressions against.')
+    parser.add_argument('--latency-tolerance', type=float, default=0.2, help='Allowed relative p99 latency increase.')
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.01, help='Allowed absolute GPE/VDE increase.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    report = benchmark(args)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.latency_tolerance, args.accuracy_tolerance)
+        for regression in regressions:
+            logger.error(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
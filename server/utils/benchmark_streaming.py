@@ -0,0 +1,305 @@
+# End-to-end streaming benchmark of the realtime voice conversion path.
+# Run from the server directory: python -m utils.benchmark_streaming --slot 0 --help
+#
+# Audio is fed chunk by chunk into VoiceChangerManager.on_request (the same
+# entry point the server audio device uses) either paced like a real audio
+# device or as fast as possible. With --server-audio the whole server audio
+# path (ring buffers and inference thread) runs on a virtual device instead.
+# Every combination of the swept settings is
+# measured separately and the report is written as JSON.
+import argparse
+import itertools
+import json
+import logging
+import platform
+import sys
+import threading
+import time
+import numpy as np
+import torch
+from typing import get_args
+
+from const import PitchExtractorType
+from settings import ServerSettings
+from voice_changer.VoiceChangerManager import VoiceChangerManager
+from voice_changer.utils.Metrics import Counter, StageMetrics
+from utils.synthetic_voice import make_test_signal
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['total', 'model', 'pitch', 'embed', 'infer']
+
+
+class StageTimer:
+    """
+    Wraps the pipeline components of the loaded model to time them per call.
+    The device is synchronized around each stage so that asynchronous GPU work
+    is attributed to the stage that issued it. This adds a little overhead
+    compared to the unsynchronized realtime path.
+    """
+
+    def __init__(self, device: torch.device):
+        self.device = device
+        self.samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+        self.patched: list[tuple[object, str]] = []
+
+    def sync(self):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+        elif self.device.type == 'mps':
+            torch.mps.synchronize()
+
+    def wrap(self, obj, method: str, stage: str):
+        func = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            self.sync()
+            start = time.perf_counter()
+            res = func(*args, **kwargs)
+            self.sync()
+            self.samples[stage].append((time.perf_counter() - start) * 1000)
+            return res
+
+        setattr(obj, method, timed)
+        self.patched.append((obj, method))
+
+    def install(self, manager: VoiceChangerManager):
+        model = manager.voiceChangerModel
+        pipeline = model.pipeline
+        self.wrap(model, 'inference', 'model')
+        self.wrap(pipeline.pitchExtractor, 'extract', 'pitch')
+        self.wrap(pipeline.embedder, 'extract_features', 'embed')
+        self.wrap(pipeline.inferencer, 'infer', 'infer')
+
+    def uninstall(self):
+        # Drop instance attributes so the class methods are visible again
+        for obj, method in reversed(self.patched):
+            delattr(obj, method)
+        self.patched.clear()
+
+
+def load_audio(path: str | None, sample_rate: int, duration: float, seed: int) -> np.ndarray:
+    if path is None:
+        audio, _ = make_test_signal(sample_rate, snr_db=40, seed=seed)
+    else:
+        import librosa
+        audio, _ = librosa.load(path, sr=sample_rate, mono=True)
+    # Loop the source to the requested duration
+    length = int(duration * sample_rate)
+    repeats = -(-length // len(audio))
+    return np.tile(audio, repeats)[:length].astype(np.float32)
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(np.max(values)),
+    }
+
+
+def run_stream(manager: VoiceChangerManager, audio: np.ndarray, block_frame: int, sample_rate: int, realtime: bool, warmup: int) -> dict:
+    block_secs = block_frame / sample_rate
+    device = manager.device_manager.device
+    timer = StageTimer(device)
+
+    for i in range(warmup):
+        manager.on_request(audio[i * block_frame:(i + 1) * block_frame])
+
+    timer.install(manager)
+    try:
+        n_chunks = len(audio) // block_frame
+        underruns = 0
+        errors = 0
+        max_lag = 0
+        busy = 0
+        # Time spent in on_request outside of the model (SOLA, device transfers, locking), per chunk
+        overhead = []
+        t0 = time.perf_counter()
+        for i in range(n_chunks):
+            chunk = audio[i * block_frame:(i + 1) * block_frame]
+            # The chunk becomes available once it has been fully recorded
+            arrival = t0 + i * block_secs if realtime else time.perf_counter()
+            if realtime and (wait := arrival - time.perf_counter()) > 0:
+                time.sleep(wait)
+
+            model_calls = len(timer.samples['model'])
+            start = time.perf_counter()
+            _, _, _, err = manager.on_request(chunk)
+            timer.sync()
+            end = time.perf_counter()
+
+            timer.samples['total'].append((end - start) * 1000)
+            # Silent chunks skip the model
+            overhead.append((end - start) * 1000 - sum(timer.samples['model'][model_calls:]))
+            busy += end - start
+            if err is not None:
+                errors += 1
+                logger.error(f'{err[0]}: {err[1]}')
+            # Output must be ready before the next chunk arrives, otherwise the device plays silence
+            lag = end - (arrival + block_secs)
+            max_lag = max(max_lag, lag)
+            if lag > 0:
+                underruns += 1
+    finally:
+        timer.uninstall()
+
+    stages = {stage: _percentiles(samples) for stage, samples in timer.samples.items() if samples}
+    stages['sola_and_io'] = _percentiles(overhead)
+    audio_secs = n_chunks * block_secs
+    return {
+        'chunks': n_chunks,
+        'block_ms': block_secs * 1000,
+        'stages': stages,
+        # Processing time per second of audio, must stay below 1 for realtime
+        'realtime_factor': busy / audio_secs,
+        'underruns': underruns,
+        'max_lag_ms': max_lag * 1000,
+        'errors': errors,
+    }
+
+
+def run_server_audio(manager: VoiceChangerManager, audio: np.ndarray, block_frame: int, sample_rate: int) -> dict:
+    """Streams through the server audio path (ring buffers and inference thread) on a virtual device."""
+    device = manager.serverDevice
+    counters = StageMetrics.get_instance().counters
+    before = list(counters)
+    res = {}
+    thread = threading.Thread(target=lambda: res.update(stream=device.run_null(block_frame, sample_rate, source=audio, capture_frames=len(audio))))
+    thread.start()
+    targets = []
+    deadline = time.perf_counter() + len(audio) / sample_rate
+    while time.perf_counter() < deadline:
+        time.sleep(0.1)
+        if (status := device.get_buffer_status()):
+            targets.append(status['target'] * 1000)
+    device.stream_loop = False
+    thread.join()
+
+    return {
+        'chunks': counters[Counter.CHUNKS_PROCESSED] - before[Counter.CHUNKS_PROCESSED],
+        'block_ms': block_frame / sample_rate * 1000,
+        'underruns': counters[Counter.SERVER_AUDIO_UNDERRUNS] - before[Counter.SERVER_AUDIO_UNDERRUNS],
+        'overruns': counters[Counter.SERVER_AUDIO_OVERRUNS] - before[Counter.SERVER_AUDIO_OVERRUNS],
+        'late_callbacks': res['stream'].late,
+        'target_latency_ms': {'final': targets[-1] if targets else 0, 'max': max(targets, default=0)},
+    }
+
+
+def apply_settings(manager: VoiceChangerManager, settings: dict):
+    manager.update_settings_batch({key: str(val) for key, val in settings.items() if manager.settings.get_property(key) != val})
+
+
+def benchmark(args) -> dict:
+    params = ServerSettings() if args.model_dir is None else ServerSettings(model_dir=args.model_dir)
+    manager = VoiceChangerManager.get_instance(params)
+    manager.setEmitTo(lambda vol, perf, err: None)
+    # Keep the sweep from overwriting the stored server settings
+    manager.store_setting = lambda: None
+
+    apply_settings(manager, {
+        'gpu': args.gpu,
+        'forceFp32': int(args.force_fp32),
+        'inputSampleRate': args.sample_rate,
+        'outputSampleRate': args.sample_rate,
+        'modelSlotIndex': args.slot,
+    })
+    # The server does this in the background after the weights are downloaded
+    manager.prepare_model()
+    if manager.voiceChanger is None:
+        raise RuntimeError(f'Failed to load model slot {args.slot} from {params.model_dir}.')
+
+    audio = load_audio(args.input, args.sample_rate, args.duration, args.seed)
+
+    results = []
+    sweep = itertools.product(args.onnx, args.f0_detectors, args.chunks, args.extra, args.crossfade)
+    for use_onnx, f0_detector, chunk_size, extra, crossfade in sweep:
+        settings = {
+            'useONNX': use_onnx,
+            'f0Detector': f0_detector,
+            'serverReadChunkSize': chunk_size,
+            'extraConvertSize': extra,
+            'crossFadeOverlapSize': crossfade,
+        }
+        apply_settings(manager, settings)
+        if manager.voiceChangerModel.pipeline is None:
+            logger.error(f'Pipeline failed to initialize with {settings}, skipping.')
+            results.append({'settings': settings, 'error': 'pipeline not initialized'})
+            continue
+
+        if args.server_audio:
+            # Same block size as ServerDevice.start
+            block_frame = int(chunk_size * 128 / 48000 * args.sample_rate)
+            stats = run_server_audio(manager, audio, block_frame, args.sample_rate)
+            logger.info(f'{settings}: underruns={stats["underruns"]} overruns={stats["overruns"]} target={stats["target_latency_ms"]}')
+            results.append({'settings': settings, **stats})
+            continue
+
+        block_frame = manager.voiceChanger.block_frame
+        stats = run_stream(manager, audio, block_frame, args.sample_rate, not args.fast, args.warmup)
+        total = stats['stages']['total']
+        logger.info(
+            f'{settings}: total p50={total["p50_ms"]:.2f}ms p99={total["p99_ms"]:.2f}ms '
+            f'RTF={stats["realtime_factor"]:.3f} underruns={stats["underruns"]}/{stats["chunks"]}'
+        )
+        results.append({'settings': settings, **stats})
+
+    device_manager = manager.device_manager
+    return {
+        'environment': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'device': str(device_manager.device),
+            'device_name': device_manager.device_metadata['name'],
+            'fp16': device_manager.use_fp16(),
+            'jit': device_manager.use_jit_compile(),
+        },
+        'config': {
+            'slot': args.slot,
+            'sample_rate': args.sample_rate,
+            'input': args.input or 'synthetic',
+            'duration': args.duration,
+            'pacing': 'server_audio' if args.server_audio else 'fast' if args.fast else 'realtime',
+            'warmup': args.warmup,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the streaming voice conversion path with a local model slot.')
+    parser.add_argument('--slot', type=int, required=True, help='Model slot index to load.')
+    parser.add_argument('--model-dir', type=str, default=None, help='Model directory. Defaults to the server setting.')
+    parser.add_argument('--input', type=str, default=None, help='Audio file to stream. Defaults to synthetic voice.')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of audio per run, the input is looped if shorter.')
+    parser.add_argument('--sample-rate', type=int, default=48000, help='Input and output sample rate.')
+    parser.add_argument('--fast', action='store_true', help='Feed chunks as fast as possible instead of realtime pacing.')
+    parser.add_argument('--server-audio', action='store_true', help='Stream through the server audio buffers on a virtual device.')
+    parser.add_argument('--chunks', nargs='+', type=int, default=[192], help='serverReadChunkSize values (x128 samples).')
+    parser.add_argument('--extra', nargs='+', type=float, default=[0.5], help='extraConvertSize values in seconds.')
+    parser.add_argument('--crossfade', nargs='+', type=float, default=[0.1], help='crossFadeOverlapSize values in seconds.')
+    parser.add_argument('--f0-detectors', nargs='+', type=str, default=['rmvpe_onnx'], choices=get_args(PitchExtractorType))
+    parser.add_argument('--onnx', nargs='+', type=int, default=[0], choices=[0, 1], help='useONNX values.')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured chunks before each run.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--gpu', type=int, default=-1, help='Device ID as used by the server, -1 for CPU.')
+    parser.add_argument('--force-fp32', action='store_true')
+    parser.add_argument('--output', type=str, default=None, help='Write the JSON report to this file instead of stdout.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    report = benchmark(args)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ import torch.nn.functional as F
 import torch
 from librosa.filters import mel
 from io import BytesIO
+# Run from the server directory: python -m utils.rmvpe_onnx
+from voice_changer.common.PitchDecoder import LocalWeightedDecoder, crepe_cents_table, cents_to_frequency
 
 class BiGRU(nn.Module):
     def __init__(self, input_features, hidden_features, num_layers):
@@ -307,15 +309,17 @@ class MelSpectrogram(torch.nn.Module):
         return log_mel_spec
 
 class RMVPEModule(torch.nn.Module):
-    def __init__(self, cpt):
+    def __init__(self, cpt, decode: bool = True):
         super(RMVPEModule, self).__init__()
         self.e2e = E2E(4, 1, (2, 2))
         self.e2e.load_state_dict(cpt)
-        self.idx = torch.arange(360)[None, None, :]
-        self.idx_cents = self.idx * 20 + 1997.3794084376191
+        self.decoder = LocalWeightedDecoder(crepe_cents_table())
+        self.include_decoder = decode
 
     def forward(self, mel: torch.Tensor, threshold: float) -> torch.Tensor:
         hidden = self.mel2hidden(mel)
+        if not self.include_decoder:
+            return hidden
         return self.decode(hidden, threshold)
 
     def mel2hidden(self, mel: torch.Tensor) -> torch.Tensor:
@@ -325,16 +329,9 @@ class RMVPEModule(torch.nn.Module):
         return hidden[:, :n_frames]
 
     def decode(self, hidden: torch.Tensor, threshold: float) -> torch.Tensor:
-        center = torch.argmax(hidden, dim=2, keepdim=True)  # [B, T, 1]
-        start = torch.clip(center - 4, min=0)  # [B, T, 1]
-        end = torch.clip(center + 5, max=360)  # [B, T, 1]
-        idx_mask = (self.idx >= start) & (self.idx < end)  # [B, T, N]
-        weights = hidden * idx_mask  # [B, T, N]
-        product_sum = torch.sum(weights * self.idx_cents, dim=2)  # [B, T]
-        weight_sum = torch.sum(weights, dim=2)  # [B, T]
-        cents = product_sum / (weight_sum + (weight_sum == 0))  # avoid dividing by zero, [B, T]
-        f0 = 10 * 2 ** (cents / 1200)
-        uv = hidden.max(dim=2)[0] < threshold  # [B, T]
+        cents, confidence = self.decoder(hidden)  # [B, T]
+        f0 = cents_to_frequency(cents)
+        uv = confidence < threshold  # [B, T]
         return f0 * ~uv
 
 def convert(pt_model: torch.nn.Module, input_names: list[str], inputs: tuple[torch.Tensor], output_names: list[str], dynamic_axes: dict) -> onnx.ModelProto:
@@ -364,18 +361,22 @@ if __name__ == '__main__':
     mel_sample = mel_extractor(audio_sample)
     threshold_sample = torch.tensor(0.03, dtype=torch.float32, device=dev)
 
+    # Set to False to export only the network and decode pitch outside of the graph.
+    include_decoder = True
+    output_name = 'pitchf' if include_decoder else 'hidden'
+
     cpt = torch.load(r'C:\Sources\voice-changer\server\pretrain\rmvpe.pt', map_location='cpu')
-    rmvpe = RMVPEModule(cpt).eval().to(dev)
+    rmvpe = RMVPEModule(cpt, include_decoder).eval().to(dev)
     rmvpe_onnx = convert(
         rmvpe,
-        ['mel', 'threshold'],
-        (mel_sample, threshold_sample),
-        ['pitchf'],
+        ['mel', 'threshold'] if include_decoder else ['mel'],
+        (mel_sample, threshold_sample) if include_decoder else (mel_sample, None),
+        [output_name],
         {
             'mel': {
                 2: 'n_samples'
             },
-            'pitchf': {
+            output_name: {
                 1: 'n_samples',
             }
         }
@@ -0,0 +1,85 @@
+import numpy as np
+from dataclasses import dataclass
+
+# Synthetic voice-like signals with a known f0 contour, used by the benchmarks.
+# The contour is defined per sample, so ground truth can be looked up at any
+# frame position regardless of how the stream is chunked.
+
+
+@dataclass
+class Segment:
+    duration: float
+    # 0 for unvoiced segments (breath noise only)
+    f0_start: float = 0
+    f0_end: float | None = None
+    vibrato_rate: float = 0
+    vibrato_depth_cents: float = 0
+
+
+# Steady tones with vibrato, rising and falling glides and unvoiced gaps
+# in both low and high voice ranges.
+DEFAULT_SEGMENTS = [
+    Segment(0.3),
+    Segment(1.5, 130, vibrato_rate=5.5, vibrato_depth_cents=50),
+    Segment(0.4),
+    Segment(1.2, 110, 330),
+    Segment(0.25),
+    Segment(1.5, 260, vibrato_rate=6, vibrato_depth_cents=80),
+    Segment(0.15),
+    Segment(1.0, 440, 90),
+    Segment(0.8, 200, 200),
+    Segment(0.3),
+]
+
+
+def make_f0_contour(segments: list[Segment], sr: int) -> np.ndarray:
+    contour = []
+    for seg in segments:
+        n = int(seg.duration * sr)
+        if seg.f0_start <= 0:
+            contour.append(np.zeros(n))
+            continue
+        f0_end = seg.f0_start if seg.f0_end is None else seg.f0_end
+        # Glides are linear in cents
+        f0 = np.geomspace(seg.f0_start, f0_end, n)
+        if seg.vibrato_rate > 0:
+            t = np.arange(n) / sr
+            f0 = f0 * 2 ** (seg.vibrato_depth_cents * np.sin(2 * np.pi * seg.vibrato_rate * t) / 1200)
+        contour.append(f0)
+    return np.concatenate(contour)
+
+
+def synthesize(f0: np.ndarray, sr: int, snr_db: float | None = 30, seed: int = 0) -> np.ndarray:
+    """
+    Renders a harmonic source with a decaying spectrum along the f0 contour
+    and mixes in breath noise for unvoiced samples and white noise at snr_db.
+    """
+    rng = np.random.default_rng(seed)
+    voiced = f0 > 0
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    audio = np.zeros_like(f0)
+    max_harmonic = int(sr / 2 / max(f0[voiced].min(), 1)) if voiced.any() else 0
+    for k in range(1, max_harmonic + 1):
+        # Harmonics above Nyquist are muted per sample to avoid aliasing
+        audio += np.where(k * f0 < sr / 2, np.sin(k * phase) / k ** 1.2, 0)
+
+    # Smooth onsets and offsets to avoid clicks at segment boundaries
+    fade = int(0.01 * sr)
+    envelope = np.convolve(voiced.astype(np.float64), np.ones(fade) / fade, mode='same')
+    audio *= envelope
+    audio /= max(np.abs(audio).max(), 1e-9)
+    audio *= 0.5
+
+    breath = rng.standard_normal(len(f0)) * 0.01 * (1 - envelope)
+    audio += breath
+    if snr_db is not None:
+        signal_power = np.mean(audio[voiced] ** 2) if voiced.any() else 1e-4
+        noise_power = signal_power / 10 ** (snr_db / 10)
+        audio += rng.standard_normal(len(f0)) * np.sqrt(noise_power)
+    return audio.astype(np.float32)
+
+
+def make_test_signal(sr: int = 16000, snr_db: float | None = 30, seed: int = 0, segments: list[Segment] = DEFAULT_SEGMENTS) -> tuple[np.ndarray, np.ndarray]:
+    """Returns audio and the per-sample ground truth f0 (0 where unvoiced)."""
+    f0 = make_f0_contour(segments, sr)
+    return synthesize(f0, sr, snr_db, seed), f0
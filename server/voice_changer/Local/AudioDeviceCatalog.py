@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+import sounddevice as sd
+
+from const import ServerAudioDeviceType
+from voice_changer.Local.AudioDeviceList import ServerAudioDevice, list_audio_device, probe_sample_rates
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Time a single device may take to report its sample rates
+PROBE_TIMEOUT = 2
+
+
+class AudioDeviceCatalog:
+    """
+    In-memory list of server audio devices with their supported sample rates.
+
+    Devices are enumerated and probed by refresh(), which is run from the
+    server device thread (on start and periodically while server audio is
+    stopped) or on demand, so get_devices() never touches the audio host APIs.
+
+    PortAudio is not thread-safe, so devices are probed one after another in
+    a single probe thread. A device that does not answer within PROBE_TIMEOUT
+    is listed without sample rates together with the devices after it, and
+    PortAudio is left alone until the hung probe returns.
+    """
+
+    def __init__(self):
+        # Empty, not None, until the first refresh: clients list them right away
+        self.inputs: list[ServerAudioDevice] = []
+        self.outputs: list[ServerAudioDevice] = []
+        self.last_refresh = 0.0
+        self.lock = threading.Lock()
+        self.probe: threading.Thread | None = None
+
+    def get_devices(self) -> tuple[list[ServerAudioDevice], list[ServerAudioDevice]]:
+        return self.inputs, self.outputs
+
+    def find(self, index: int, type: ServerAudioDeviceType) -> ServerAudioDevice | None:
+        devices = self.inputs if type == "input" else self.outputs
+        return next((d for d in devices if d.index == index), None)
+
+    def supports_sample_rate(self, device: ServerAudioDevice, samplerate: int) -> bool:
+        # Devices whose probe failed are not rejected, opening the stream reports the error
+        return not device.available_samplerates or samplerate in device.available_samplerates
+
+    def refresh(self, reinitialize: bool = False):
+        """
+        Enumerates devices and probes their sample rates. reinitialize restarts
+        PortAudio to pick up added or removed devices, which must not be done
+        while server audio streams are open.
+        """
+        with self.lock:
+            if self.probe is not None and self.probe.is_alive():
+                logger.warning('Sample rate probe is still running, audio devices are not refreshed.')
+                return
+            start = time.perf_counter()
+            if reinitialize:
+                sd._terminate()
+                sd._initialize()
+            inputs, outputs = list_audio_device()
+            # Listed right away, sample rates are filled in as they are probed
+            self.inputs, self.outputs = inputs, outputs
+
+            devices: list[tuple[ServerAudioDevice, ServerAudioDeviceType]] = [(d, "input") for d in inputs] + [(d, "output") for d in outputs]
+            results: queue.Queue[list[int] | Exception] = queue.Queue()
+            cancel = threading.Event()
+            self.probe = threading.Thread(target=self._probe, args=(devices, results, cancel), name='audio_probe', daemon=True)
+            self.probe.start()
+            for device, _type in devices:
+                try:
+                    result = results.get(timeout=PROBE_TIMEOUT)
+                except queue.Empty:
+                    logger.warning(f'Sample rate probe of "{device.name}" ({device.hostAPI}) timed out.')
+                    cancel.set()
+                    break
+                if isinstance(result, Exception):
+                    logger.warning(f'Sample rate probe of "{device.name}" ({device.hostAPI}) failed: {result}')
+                else:
+                    device.available_samplerates = result
+
+            self.last_refresh = time.monotonic()
+            logger.info(f'Found {len(inputs)} input and {len(outputs)} output audio devices in {time.perf_counter() - start:.2f}s.')
+
+    def _probe(self, devices: list[tuple[ServerAudioDevice, ServerAudioDeviceType]], results: queue.Queue, cancel: threading.Event):
+        for device, type in devices:
+            if cancel.is_set():
+                return
+            try:
+                results.put(probe_sample_rates(device.index, type))
+            except Exception as e:
+                results.put(e)
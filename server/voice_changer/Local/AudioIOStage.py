@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class AudioIOStage:
+    """
+    Preallocated conversion between multichannel device buffers and the mono
+    signal of the voice changer, used from audio callbacks.
+
+    Downmixing is a single reduction into the preallocated buffer and output
+    is broadcast to all channels with np.copyto from a strided view, gains
+    are applied in place. Single-channel streams (f.e., ASIO channel
+    selectors) are read through a view of the device buffer.
+    """
+
+    def __init__(self, frames: int):
+        self.buffer = np.zeros(frames, dtype=np.float32)
+
+    def get(self, frames: int) -> np.ndarray:
+        # Devices may deliver more frames than requested, grow once and keep the buffer
+        if frames > len(self.buffer):
+            self.buffer = np.zeros(frames, dtype=np.float32)
+        return self.buffer[:frames]
+
+    def downmix(self, indata: np.ndarray, gain: float) -> np.ndarray:
+        frames, channels = indata.shape
+        mono = self.get(frames)
+        if channels == 1:
+            np.multiply(indata[:, 0], gain, out=mono)
+        else:
+            np.sum(indata, axis=1, out=mono)
+            mono *= gain / channels
+        return mono
+
+    def fan_out(self, outdata: np.ndarray, gain: float):
+        """Writes the first len(outdata) samples of the buffer to every output channel."""
+        mono = self.buffer[:len(outdata)]
+        if gain != 1:
+            mono *= gain
+        np.copyto(outdata, mono[:, None])
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Single-producer single-consumer ring buffer of mono float32 samples.
+
+    Read and write positions only grow and each of them is advanced by one
+    side only, so the audio callback and the inference thread can exchange
+    samples without locking. Data is copied into and out of a preallocated
+    array, nothing is allocated after construction.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.write_pos = 0
+        self.read_pos = 0
+
+    def available(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def free(self) -> int:
+        return self.capacity - self.available()
+
+    def write(self, data: np.ndarray) -> int:
+        """Producer side. Returns the number of samples written, the rest is dropped if the buffer is full."""
+        n = min(len(data), self.free())
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:n - first] = data[first:n]
+        self.write_pos += n
+        return n
+
+    def read(self, out: np.ndarray) -> int:
+        """Consumer side. Fills out from the start and returns the number of samples read."""
+        n = min(len(out), self.available())
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:n] = self.buffer[:n - first]
+        self.read_pos += n
+        return n
+
+    def skip(self, n: int):
+        """Consumer side. Drops up to n oldest samples."""
+        self.read_pos += min(n, self.available())
+
+
+class LatencyController:
+    """
+    Adaptive amount of output kept buffered on top of one device block.
+
+    Playback starts once the buffer holds a device block plus the target.
+    Every underrun raises the target by one step and waits for the buffer
+    to refill, and after the output has been stable for `hold` samples the
+    target is lowered by one step again. This keeps the added latency just
+    above the jitter of the inference time.
+    """
+
+    def __init__(self, step: int, max_target: int, hold: int):
+        self.step = step
+        self.max_target = max_target
+        self.hold = hold
+        self.target = 0
+        self.stable = 0
+        self.primed = False
+
+    def on_underrun(self):
+        self.target = min(self.target + self.step, self.max_target)
+        self.stable = 0
+        self.primed = False
+
+    def on_played(self, frames: int):
+        self.stable += frames
+        if self.stable >= self.hold and self.target > 0:
+            self.target = max(self.target - self.step, 0)
+            self.stable = 0
@@ -0,0 +1,78 @@
+import threading
+import time
+import numpy as np
+
+
+class NullAudioStream:
+    """
+    Stand-in for sounddevice.Stream that drives the callback from a thread at
+    realtime pace without audio hardware. Input is read from `source` (looped)
+    or is silence, and the first `capture_frames` output samples of the first
+    channel are kept in `captured`. Other sounddevice arguments are ignored.
+    """
+
+    def __init__(self, callback, blocksize: int, samplerate: int, channels: int | tuple[int, int], source: np.ndarray | None = None, capture_frames: int = 0, **kwargs):
+        self.callback = callback
+        self.blocksize = blocksize
+        self.samplerate = samplerate
+        input_channels, output_channels = channels if isinstance(channels, tuple) else (0, channels)
+        self.indata = np.zeros((blocksize, input_channels), dtype=np.float32)
+        self.outdata = np.zeros((blocksize, output_channels), dtype=np.float32)
+        self.source = source
+        self.captured = np.zeros(capture_frames, dtype=np.float32)
+        self.captured_frames = 0
+        # Callbacks that could not start on time, like device xruns
+        self.late = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _invoke(self):
+        self.callback(self.indata, self.outdata, self.blocksize, None, None)
+
+    def _fill_input(self, pos: int):
+        if self.source is None or not self.indata.shape[1]:
+            return
+        length = len(self.source)
+        idx = np.arange(pos, pos + self.blocksize) % length
+        self.indata[:] = self.source[idx, None]
+
+    def _capture(self):
+        n = min(self.blocksize, len(self.captured) - self.captured_frames)
+        if n > 0:
+            self.captured[self.captured_frames:self.captured_frames + n] = self.outdata[:n, 0]
+            self.captured_frames += n
+
+    def _run(self):
+        period = self.blocksize / self.samplerate
+        deadline = time.perf_counter()
+        pos = 0
+        while not self._stop.is_set():
+            self._fill_input(pos)
+            pos += self.blocksize
+            self.outdata.fill(0)
+            self._invoke()
+            self._capture()
+            deadline += period
+            wait = deadline - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                self.late += 1
+                deadline = time.perf_counter()
+
+
+class NullAudioOutputStream(NullAudioStream):
+    """Stand-in for sounddevice.OutputStream."""
+
+    def _invoke(self):
+        self.callback(self.outdata, self.blocksize, None, None)
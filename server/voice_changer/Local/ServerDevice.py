@@ -1,16 +1,20 @@
 import numpy as np
-from const import SERVER_DEVICE_SAMPLE_RATES
 
-from queue import Queue
 import logging
+import threading
+from contextlib import ExitStack
 from voice_changer.VoiceChangerSettings import VoiceChangerSettings
-from voice_changer.Local.AudioDeviceList import checkSamplingRate, list_audio_device
+from voice_changer.utils.Metrics import Counter, Stage, StageMetrics
+from voice_changer.Local.AudioIOStage import AudioIOStage
+from voice_changer.Local.AudioRingBuffer import AudioRingBuffer, LatencyController
+from voice_changer.Local.NullAudioStream import NullAudioStream
+from voice_changer.Local.AudioDeviceCatalog import AudioDeviceCatalog
 import time
+from time import perf_counter_ns
 import sounddevice as sd
-import librosa
 
 from voice_changer.utils.VoiceChangerModel import AudioInOut
-from typing import Protocol
+from typing import Callable, ContextManager, Protocol
 from typing import Union
 
 logger = logging.getLogger(__name__)
@@ -22,6 +26,18 @@ Available sample rates:
   [Monitor]: %s"""
 ERR_GENERIC_SERVER_AUDIO_ERROR = "A server audio error occurred."
 
+# Ring buffer sizes in conversion blocks
+INPUT_BUFFER_BLOCKS = 4
+OUTPUT_BUFFER_BLOCKS = 8
+# Output latency target is adjusted in quarter blocks up to this many blocks
+LATENCY_STEPS_PER_BLOCK = 4
+MAX_TARGET_BLOCKS = 4
+# Stable playback time before the latency target is lowered again
+LATENCY_HOLD_SECS = 10
+INPUT_WAIT_TIMEOUT = 0.1
+# Seconds between device list refreshes while server audio is stopped
+DEVICE_REFRESH_INTERVAL = 60
+
 class ServerDeviceCallbacks(Protocol):
     def on_request(self, unpackedData: AudioInOut) -> tuple[AudioInOut, list[Union[int, float]]]:
         ...
@@ -34,93 +50,174 @@ class ServerDevice:
     def __init__(self, serverDeviceCallbacks: ServerDeviceCallbacks, settings: VoiceChangerSettings):
         self.settings = settings
         self.serverDeviceCallbacks = serverDeviceCallbacks
-        self.mon_wav = None
-        self.serverAudioInputDevices = None
-        self.serverAudioOutputDevices = None
-        self.monQueue = Queue()
+        self.metrics = StageMetrics.get_instance()
+        self.catalog = AudioDeviceCatalog()
         self.performance = [0, 0, 0]
 
+        self.block_frame = 0
+        self.sample_rate = 0
+        self.input_buffer: AudioRingBuffer | None = None
+        self.output_buffer: AudioRingBuffer | None = None
+        self.monitor_buffer: AudioRingBuffer | None = None
+        self.latency: LatencyController | None = None
+        self.input_stage: AudioIOStage | None = None
+        self.output_stage: AudioIOStage | None = None
+        self.monitor_stage: AudioIOStage | None = None
+        self.input_ready = threading.Event()
+
         self.control_loop = False
         self.stream_loop = False
 
     def getServerInputAudioDevice(self, index: int):
-        audioinput, _audiooutput = list_audio_device()
-        serverAudioDevice = [x for x in audioinput if x.index == index]
-        if len(serverAudioDevice) > 0:
-            return serverAudioDevice[0]
-        else:
-            return None
+        return self.catalog.find(index, "input")
 
     def getServerOutputAudioDevice(self, index: int):
-        _audioinput, audiooutput = list_audio_device()
-        serverAudioDevice = [x for x in audiooutput if x.index == index]
-        if len(serverAudioDevice) > 0:
-            return serverAudioDevice[0]
-        else:
-            return None
+        return self.catalog.find(index, "output")
 
     ###########################################
     # Callback Section
     ###########################################
 
-    def _processData(self, indata: np.ndarray):
-        indata = indata * self.settings.serverInputAudioGain
-        unpackedData = librosa.to_mono(indata.T)
-        return self.serverDeviceCallbacks.on_request(unpackedData)
-
-    def _processDataWithTime(self, indata: np.ndarray):
-        out_wav, vol, perf, err = self._processData(indata)
-        self.performance = perf
-        self.serverDeviceCallbacks.emitTo(vol, self.performance, err)
-        return out_wav
+    def _prepare_buffers(self, block_frame: int, sample_rate: int, monitor: bool):
+        self.block_frame = block_frame
+        self.sample_rate = sample_rate
+        self.input_buffer = AudioRingBuffer(block_frame * INPUT_BUFFER_BLOCKS)
+        self.output_buffer = AudioRingBuffer(block_frame * OUTPUT_BUFFER_BLOCKS)
+        self.monitor_buffer = AudioRingBuffer(block_frame * OUTPUT_BUFFER_BLOCKS) if monitor else None
+        self.latency = LatencyController(
+            step=block_frame // LATENCY_STEPS_PER_BLOCK,
+            max_target=block_frame * MAX_TARGET_BLOCKS,
+            hold=int(LATENCY_HOLD_SECS * sample_rate),
+        )
+        self.input_stage = AudioIOStage(block_frame)
+        self.output_stage = AudioIOStage(block_frame)
+        self.monitor_stage = AudioIOStage(block_frame)
+
+    def _read_output(self, out_wav: np.ndarray):
+        buf = self.output_buffer
+        latency = self.latency
+        frames = len(out_wav)
+        available = buf.available()
+        if not latency.primed:
+            if available < frames + latency.target:
+                out_wav.fill(0)
+                return
+            latency.primed = True
+        elif available > frames + latency.target + self.block_frame:
+            # Inference caught up after a stall, drop what exceeds the target latency
+            buf.skip(available - frames - latency.target)
+            self.metrics.inc(Counter.SERVER_AUDIO_OVERRUNS)
+
+        n = buf.read(out_wav)
+        if n < frames:
+            out_wav[n:] = 0
+            latency.on_underrun()
+            self.metrics.inc(Counter.SERVER_AUDIO_UNDERRUNS)
+        else:
+            latency.on_played(frames)
 
     def audio_stream_callback(self, indata: np.ndarray, outdata: np.ndarray, frames, times, status):
+        # Only moves samples between the device and the ring buffers, conversion runs in the inference thread.
         try:
-            out_wav = self._processDataWithTime(indata)
-            outputChannels = outdata.shape[1]
-            outdata[:] = (np.repeat(out_wav, outputChannels).reshape(-1, outputChannels) * self.settings.serverOutputAudioGain)
-        except Exception as e:
-            self.serverDeviceCallbacks.emitTo(0, self.performance, ('ERR_GENERIC_SERVER_AUDIO_ERROR', ERR_GENERIC_SERVER_AUDIO_ERROR))
-            logger.exception(e)
-
-    def audio_stream_callback_mon_queue(self, indata: np.ndarray, outdata: np.ndarray, frames, times, status):
-        try:
-            out_wav = self._processDataWithTime(indata)
-            self.monQueue.put(out_wav)
-            outputChannels = outdata.shape[1]
-            outdata[:] = (np.repeat(out_wav, outputChannels).reshape(-1, outputChannels) * self.settings.serverOutputAudioGain)
+            t = perf_counter_ns()
+            unpackedData = self.input_stage.downmix(indata, self.settings.serverInputAudioGain)
+            if self.input_buffer.write(unpackedData) < len(unpackedData):
+                self.metrics.inc(Counter.SERVER_AUDIO_OVERRUNS)
+            self.input_ready.set()
+
+            self._read_output(self.output_stage.get(frames))
+            self.output_stage.fan_out(outdata, self.settings.serverOutputAudioGain)
+            self.metrics.lap(Stage.TRANSPORT, t)
         except Exception as e:
             self.serverDeviceCallbacks.emitTo(0, self.performance, ('ERR_GENERIC_SERVER_AUDIO_ERROR', ERR_GENERIC_SERVER_AUDIO_ERROR))
             logger.exception(e)
 
     def audio_monitor_callback(self, outdata: np.ndarray, frames, times, status):
         try:
-            mon_wav = self.monQueue.get()
-            while self.monQueue.qsize() > 0:
-                self.monQueue.get()
-            outputChannels = outdata.shape[1]
-            outdata[:] = (np.repeat(mon_wav, outputChannels).reshape(-1, outputChannels) * self.settings.serverMonitorAudioGain)
+            buf = self.monitor_buffer
+            mon_wav = self.monitor_stage.get(frames)
+            # Monitor follows the converted output as closely as possible, without its own latency target
+            if buf.available() > frames + self.block_frame:
+                buf.skip(buf.available() - frames)
+            n = buf.read(mon_wav)
+            mon_wav[n:] = 0
+            self.monitor_stage.fan_out(outdata, self.settings.serverMonitorAudioGain)
         except Exception as e:
             self.serverDeviceCallbacks.emitTo(0, self.performance, ('ERR_GENERIC_SERVER_AUDIO_ERROR', ERR_GENERIC_SERVER_AUDIO_ERROR))
             logger.exception(e)
 
+    ###########################################
+    # Inference Section
+    ###########################################
+    def _inference_loop(self):
+        block = np.zeros(self.block_frame, dtype=np.float32)
+        while self.stream_loop:
+            self.input_ready.clear()
+            if self.input_buffer.available() < self.block_frame:
+                self.input_ready.wait(INPUT_WAIT_TIMEOUT)
+                continue
+            self.input_buffer.read(block)
+            try:
+                out_wav, vol, perf, err = self.serverDeviceCallbacks.on_request(block)
+                self.performance = perf
+                self.serverDeviceCallbacks.emitTo(vol, self.performance, err)
+                if err is not None:
+                    continue
+                if self.output_buffer.write(out_wav) < len(out_wav):
+                    self.metrics.inc(Counter.SERVER_AUDIO_OVERRUNS)
+                if self.monitor_buffer is not None:
+                    self.monitor_buffer.write(out_wav)
+            except Exception as e:
+                self.serverDeviceCallbacks.emitTo(0, self.performance, ('ERR_GENERIC_SERVER_AUDIO_ERROR', ERR_GENERIC_SERVER_AUDIO_ERROR))
+                logger.exception(e)
+
+    def get_buffer_status(self) -> dict:
+        if self.input_buffer is None:
+            return {}
+        return {
+            'input': self.input_buffer.available() / self.sample_rate,
+            'output': self.output_buffer.available() / self.sample_rate,
+            'target': self.latency.target / self.sample_rate,
+        }
+
     ###########################################
     # Main Loop Section
     ###########################################
+    def run_streams(self, block_frame: int, sample_rate: int, streams: list[Callable[[], ContextManager]]):
+        self._prepare_buffers(block_frame, sample_rate, monitor=len(streams) > 1)
+        inference = threading.Thread(target=self._inference_loop, daemon=True)
+        inference.start()
+        try:
+            with ExitStack() as stack:
+                for stream in streams:
+                    stack.enter_context(stream())
+                while self.stream_loop:
+                    time.sleep(1)
+        finally:
+            self.stream_loop = False
+            inference.join()
+
     def run_no_monitor(self, block_frame: int, inputMaxChannel: int, outputMaxChannel: int, inputExtraSetting, outputExtraSetting):
-        with (
-            sd.Stream(callback=self.audio_stream_callback, latency='low', dtype="float32", device=(self.settings.serverInputDeviceId, self.settings.serverOutputDeviceId), blocksize=block_frame, samplerate=self.settings.serverInputAudioSampleRate, channels=(inputMaxChannel, outputMaxChannel), extra_settings=(inputExtraSetting, outputExtraSetting)),
-        ):
-            while self.stream_loop:
-                time.sleep(1)
+        self.run_streams(block_frame, self.settings.serverInputAudioSampleRate, [
+            lambda: sd.Stream(callback=self.audio_stream_callback, latency='low', dtype="float32", device=(self.settings.serverInputDeviceId, self.settings.serverOutputDeviceId), blocksize=block_frame, samplerate=self.settings.serverInputAudioSampleRate, channels=(inputMaxChannel, outputMaxChannel), extra_settings=(inputExtraSetting, outputExtraSetting)),
+        ])
 
     def run_with_monitor(self, block_frame: int, inputMaxChannel: int, outputMaxChannel: int, monitorMaxChannel: int, inputExtraSetting, outputExtraSetting, monitorExtraSetting):
-        with (
-            sd.Stream(callback=self.audio_stream_callback_mon_queue, latency='low', dtype="float32", device=(self.settings.serverInputDeviceId, self.settings.serverOutputDeviceId), blocksize=block_frame, samplerate=self.settings.serverInputAudioSampleRate, channels=(inputMaxChannel, outputMaxChannel), extra_settings=(inputExtraSetting, outputExtraSetting)),
-            sd.OutputStream(callback=self.audio_monitor_callback, dtype="float32", device=self.settings.serverMonitorDeviceId, blocksize=block_frame, samplerate=self.settings.serverMonitorAudioSampleRate, channels=monitorMaxChannel, extra_settings=monitorExtraSetting),
-        ):
-            while self.stream_loop:
-                time.sleep(1)
+        self.run_streams(block_frame, self.settings.serverInputAudioSampleRate, [
+            lambda: sd.Stream(callback=self.audio_stream_callback, latency='low', dtype="float32", device=(self.settings.serverInputDeviceId, self.settings.serverOutputDeviceId), blocksize=block_frame, samplerate=self.settings.serverInputAudioSampleRate, channels=(inputMaxChannel, outputMaxChannel), extra_settings=(inputExtraSetting, outputExtraSetting)),
+            lambda: sd.OutputStream(callback=self.audio_monitor_callback, dtype="float32", device=self.settings.serverMonitorDeviceId, blocksize=block_frame, samplerate=self.settings.serverMonitorAudioSampleRate, channels=monitorMaxChannel, extra_settings=monitorExtraSetting),
+        ])
+
+    def run_null(self, block_frame: int, sample_rate: int, source: np.ndarray | None = None, capture_frames: int = 0, channels: int = 1) -> NullAudioStream:
+        """
+        Runs server audio on a virtual device until stream_loop is cleared,
+        f.e. to test buffering and conversion without audio hardware.
+        Returns the stream with the captured output.
+        """
+        stream = NullAudioStream(self.audio_stream_callback, blocksize=block_frame, samplerate=sample_rate, channels=(channels, channels), source=source, capture_frames=capture_frames)
+        self.stream_loop = True
+        self.run_streams(block_frame, sample_rate, [lambda: stream])
+        return stream
 
     ###########################################
     # Start Section
@@ -128,11 +225,22 @@ class ServerDevice:
     def start(self):
         while True:
             if not self.control_loop:
+                # Pick up added or removed devices while server audio is stopped
+                if time.monotonic() - self.catalog.last_refresh > DEVICE_REFRESH_INTERVAL:
+                    try:
+                        self.catalog.refresh(reinitialize=True)
+                    except Exception as e:
+                        logger.exception(e)
                 time.sleep(1)
                 continue
 
-            sd._terminate()
-            sd._initialize()
+            try:
+                self.catalog.refresh(reinitialize=True)
+            except Exception as e:
+                self.serverDeviceCallbacks.emitTo(0, self.performance, ('ERR_GENERIC_SERVER_AUDIO_ERROR', ERR_GENERIC_SERVER_AUDIO_ERROR))
+                logger.exception(e)
+                time.sleep(2)
+                continue
 
             # Device 特定
             serverInputAudioDevice = self.getServerInputAudioDevice(self.settings.serverInputDeviceId)
@@ -182,9 +290,10 @@ class ServerDevice:
 
             # Sample Rate Check
             if "WASAPI" not in serverInputAudioDevice.hostAPI and not wasapiExclusiveMode:
-                inputAudioSampleRateAvailable = checkSamplingRate(self.settings.serverInputDeviceId, self.settings.serverInputAudioSampleRate, "input")
-                outputAudioSampleRateAvailable = checkSamplingRate(self.settings.serverOutputDeviceId, self.settings.serverOutputAudioSampleRate, "output")
-                monitorAudioSampleRateAvailable = checkSamplingRate(self.settings.serverMonitorDeviceId, self.settings.serverMonitorAudioSampleRate, "output") if serverMonitorAudioDevice else True
+                # Probed by the device catalog, no test streams are opened
+                inputAudioSampleRateAvailable = self.catalog.supports_sample_rate(serverInputAudioDevice, self.settings.serverInputAudioSampleRate)
+                outputAudioSampleRateAvailable = self.catalog.supports_sample_rate(serverOutputAudioDevice, self.settings.serverOutputAudioSampleRate)
+                monitorAudioSampleRateAvailable = self.catalog.supports_sample_rate(serverMonitorAudioDevice, self.settings.serverMonitorAudioSampleRate) if serverMonitorAudioDevice else True
 
                 logger.info("Sample Rate:")
                 logger.info(f"  [Input]: {self.settings.serverInputAudioSampleRate} -> {inputAudioSampleRateAvailable}")
@@ -197,18 +306,9 @@ class ServerDevice:
                 # 2. Server must pick the default device sample rate automatically so UI doesn't have to bother.
                 # This must be removed once it's done.
                 if not inputAudioSampleRateAvailable or not outputAudioSampleRateAvailable or not monitorAudioSampleRateAvailable:
-                    logger.info("Checking Available Sample Rate:")
-                    availableInputSampleRate = []
-                    availableOutputSampleRate = []
-                    availableMonitorSampleRate = []
-                    for sr in SERVER_DEVICE_SAMPLE_RATES:
-                        if checkSamplingRate(self.settings.serverInputDeviceId, sr, "input"):
-                            availableInputSampleRate.append(sr)
-                        if checkSamplingRate(self.settings.serverOutputDeviceId, sr, "output"):
-                            availableOutputSampleRate.append(sr)
-                        if serverMonitorAudioDevice is not None:
-                            if checkSamplingRate(self.settings.serverMonitorDeviceId, sr, "output"):
-                                availableMonitorSampleRate.append(sr)
+                    availableInputSampleRate = serverInputAudioDevice.available_samplerates
+                    availableOutputSampleRate = serverOutputAudioDevice.available_samplerates
+                    availableMonitorSampleRate = serverMonitorAudioDevice.available_samplerates if serverMonitorAudioDevice is not None else []
                     err = ERR_SAMPLE_RATE_NOT_SUPPORTED % (availableInputSampleRate, availableOutputSampleRate, availableMonitorSampleRate)
                     self.serverDeviceCallbacks.emitTo(
                         0,
@@ -238,18 +338,19 @@ class ServerDevice:
     ###########################################
     def get_info(self):
         data = {}
+        audioinput, audiooutput = self.catalog.get_devices()
+        data["serverAudioInputDevices"] = audioinput
+        data["serverAudioOutputDevices"] = audiooutput
+        return data
+
+    def refresh_devices(self):
         try:
-            audioinput, audiooutput = list_audio_device()
-            self.serverAudioInputDevices = audioinput
-            self.serverAudioOutputDevices = audiooutput
+            # PortAudio can only be restarted while server audio is stopped
+            self.catalog.refresh(reinitialize=not self.control_loop)
         except Exception as e:
             self.serverDeviceCallbacks.emitTo(0, self.performance, ('ERR_GENERIC_SERVER_AUDIO_ERROR', ERR_GENERIC_SERVER_AUDIO_ERROR))
             logger.exception(e)
 
-        data["serverAudioInputDevices"] = self.serverAudioInputDevices
-        data["serverAudioOutputDevices"] = self.serverAudioOutputDevices
-        return data
-
     def update_settings(self, key: str, val, old_val):
         if key == 'serverAudioStated':
             # Toggle control loop
@@ -1,20 +1,47 @@
-from const import UPLOAD_DIR
-from data.ModelSlot import ModelSlots, loadAllSlotInfo, saveSlotInfo
+from const import MAX_SLOT_NUM, UPLOAD_DIR
+from data.ModelSlot import ModelSlot, ModelSlots, loadSlotInfo, saveSlotInfo, slotInfoFromDict
+from data.RawJSON import RawJSON, dataclassesToRawJSON
+from dataclasses import asdict
 import json
 import os
 import shutil
+import threading
+import time
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Catalog of all slots, kept next to the slot directories
+SLOT_INDEX_FILE = "slot_index.json"
+SLOT_INDEX_VERSION = 1
+# Minimum seconds between checks for slots changed outside of the server
+RESCAN_INTERVAL = 2
+
 
 class ModelSlotManager:
+    """
+    In-memory catalog of model slots.
+
+    Slots are loaded once (from the slot index when it is up to date) and
+    updated one by one when they are saved. External changes are detected by
+    comparing modification time and size of the params.json files of
+    existing slot directories, so a rescan lists the model directory and
+    stats the existing slots instead of reading all MAX_SLOT_NUM files.
+    """
     _instance = None
 
     def __init__(self, model_dir: str):
         self.model_dir = model_dir
-        self.modelSlots = loadAllSlotInfo(self.model_dir)
+        self.modelSlots: list[ModelSlots] = [ModelSlot(slotIndex=i) for i in range(MAX_SLOT_NUM)]
+        # (mtime_ns, size) of params.json of the loaded slots
+        self.fingerprints: dict[int, tuple[int, int]] = {}
+        self.last_scan = 0.0
+        # Serialized slot list for /info, rebuilt after changes
+        self.modelSlotsJson: RawJSON | None = None
+        self.lock = threading.RLock()
+        self._load_index()
+        self._scan()
 
     @classmethod
     def get_instance(cls, model_dir: str):
@@ -22,18 +49,110 @@ class ModelSlotManager:
             cls._instance = cls(model_dir)
         return cls._instance
 
+    def _index_path(self):
+        return os.path.join(self.model_dir, SLOT_INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") != SLOT_INDEX_VERSION:
+                return
+            for key, entry in index["slots"].items():
+                slotIndex = int(key)
+                slotInfo = slotInfoFromDict(entry["params"])
+                slotInfo.slotIndex = slotIndex
+                self.modelSlots[slotIndex] = slotInfo
+                self.fingerprints[slotIndex] = tuple(entry["fingerprint"])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # Slots are rescanned from params.json files
+            logger.warning(f"Failed to load slot index: {e}")
+            self.modelSlots = [ModelSlot(slotIndex=i) for i in range(MAX_SLOT_NUM)]
+            self.fingerprints = {}
+
+    def _save_index(self):
+        index = {
+            "version": SLOT_INDEX_VERSION,
+            "slots": {
+                str(slotIndex): {"fingerprint": fingerprint, "params": asdict(self.modelSlots[slotIndex])}
+                for slotIndex, fingerprint in sorted(self.fingerprints.items())
+            },
+        }
+        path = self._index_path()
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to save slot index: {e}")
+
+    def _stat_slots(self) -> dict[int, tuple[int, int]]:
+        res = {}
+        if not os.path.isdir(self.model_dir):
+            return res
+        with os.scandir(self.model_dir) as entries:
+            for entry in entries:
+                if not entry.name.isdecimal() or str(int(entry.name)) != entry.name or int(entry.name) >= MAX_SLOT_NUM:
+                    continue
+                try:
+                    st = os.stat(os.path.join(entry.path, "params.json"))
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                res[int(entry.name)] = (st.st_mtime_ns, st.st_size)
+        return res
+
+    def _reload_slot(self, slotIndex: int, fingerprint: tuple[int, int] | None):
+        self.modelSlotsJson = None
+        if fingerprint is None:
+            self.modelSlots[slotIndex] = ModelSlot(slotIndex=slotIndex)
+            self.fingerprints.pop(slotIndex, None)
+            return
+        slotInfo = loadSlotInfo(self.model_dir, slotIndex)
+        slotInfo.slotIndex = slotIndex  # スロットインデックスは動的に注入
+        self.modelSlots[slotIndex] = slotInfo
+        self.fingerprints[slotIndex] = fingerprint
+
+    def _scan(self):
+        with self.lock:
+            current = self._stat_slots()
+            changed = [i for i in current.keys() | self.fingerprints.keys() if current.get(i) != self.fingerprints.get(i)]
+            for slotIndex in changed:
+                try:
+                    self._reload_slot(slotIndex, current.get(slotIndex))
+                except Exception as e:
+                    logger.warning(f"Failed to load slot {slotIndex}: {e}")
+                    self._reload_slot(slotIndex, None)
+            if changed:
+                logger.info(f"Reloaded {len(changed)} model slots.")
+                self._save_index()
+            self.last_scan = time.monotonic()
+
     def _save_model_slot(self, slotIndex: int, slotInfo: ModelSlots):
-        saveSlotInfo(self.model_dir, slotIndex, slotInfo)
-        self.modelSlots = loadAllSlotInfo(self.model_dir)
+        with self.lock:
+            saveSlotInfo(self.model_dir, slotIndex, slotInfo)
+            st = os.stat(os.path.join(self.model_dir, str(slotIndex), "params.json"))
+            # Reload from the file so that the catalog matches what a restart would load
+            self._reload_slot(slotIndex, (st.st_mtime_ns, st.st_size))
+            self._save_index()
 
     def _load_model_slot(self, slotIndex: int):
         return self.modelSlots[slotIndex]
 
     def getAllSlotInfo(self, reload: bool = False):
-        if reload:
-            self.modelSlots = loadAllSlotInfo(self.model_dir)
+        if reload and time.monotonic() - self.last_scan > RESCAN_INTERVAL:
+            self._scan()
         return self.modelSlots
 
+    def getAllSlotInfoJson(self, reload: bool = False) -> RawJSON:
+        modelSlots = self.getAllSlotInfo(reload)
+        # Slots edited in place (update_model_info) are saved, which resets the cache
+        if (res := self.modelSlotsJson) is None:
+            res = self.modelSlotsJson = dataclassesToRawJSON(modelSlots)
+        return res
+
     def get_slot_info(self, slotIndex: int):
         if slotIndex == -1:
             return
@@ -0,0 +1,112 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable
+from data.ModelSlot import RVCModelSlot
+from settings import ServerSettings
+from voice_changer.ModelSlotManager import ModelSlotManager
+from voice_changer.common.ArtifactManifest import get_file_hash, get_recorded_hash
+from voice_changer.common.BlobStore import BlobStore
+from voice_changer.common.OnnxLoader import build_fp16_model, prepare_fp16_model
+from voice_changer.RVC.onnxExporter.OnnxExportQueue import OnnxExportQueue
+from voice_changer.RVC.pipeline.PipelineGenerator import export_index_vectors
+import logging
+logger = logging.getLogger(__name__)
+
+# Artifacts built at the same time
+ARTIFACT_WORKERS = 2
+
+
+class RVCArtifactBuilder:
+    """
+    Builds the configured artifacts (ServerSettings.prebuilt_artifacts) of
+    a slot in the background once it is uploaded or merged, so that loading
+    the slot only reads ready-made files.
+
+    Conversions run in worker processes and store their results in the blob
+    store, so slots with identical sources share them. Finished artifacts are
+    recorded in RVCModelSlot.artifacts. Results of a slot that was replaced
+    in the meantime are not recorded.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls, params: ServerSettings):
+        if cls._instance is None:
+            cls._instance = cls(params)
+        return cls._instance
+
+    def __init__(self, params: ServerSettings):
+        self.params = params
+        self.model_dir = params.model_dir
+        self.store = BlobStore.get_instance(self.model_dir)
+        self.slotManager = ModelSlotManager.get_instance(self.model_dir)
+        self.jobs = ThreadPoolExecutor(max_workers=ARTIFACT_WORKERS, thread_name_prefix='artifacts')
+        self.processes: Executor | None = None
+
+    def submit(self, slot: int):
+        slotInfo = self.slotManager.get_slot_info(slot)
+        if not isinstance(slotInfo, RVCModelSlot):
+            return
+        artifacts = set(self.params.prebuilt_artifacts)
+        if 'indexVectors' in artifacts and slotInfo.indexFile:
+            self.jobs.submit(self._run, self._build_index_vectors, slot, slotInfo.indexFile)
+        if slotInfo.isONNX:
+            if 'onnxFp16' in artifacts:
+                self.jobs.submit(self._run, self._build_onnx_fp16, slot, slotInfo.modelFile)
+        elif 'onnx' in artifacts:
+            source_hash = get_file_hash(self._slot_path(slot, slotInfo.modelFile))
+            OnnxExportQueue.get_instance(self.model_dir).submit(slotInfo, lambda installed: self._on_onnx_exported(installed, source_hash))
+
+    def _slot_path(self, slot: int, file: str):
+        return os.path.join(self.model_dir, str(slot), os.path.basename(file))
+
+    def _run_in_process(self, fn: Callable, *args):
+        if self.processes is None:
+            # Spawn, so that the workers do not inherit threads and device contexts of the server
+            self.processes = ProcessPoolExecutor(max_workers=ARTIFACT_WORKERS, mp_context=mp.get_context('spawn'))
+        return self.processes.submit(fn, *args).result()
+
+    def _run(self, build: Callable, slot: int, *args):
+        try:
+            build(slot, *args)
+        except Exception as e:
+            logger.error(f"Failed to build artifacts of slot {slot}.")
+            logger.exception(e)
+
+    def _build_index_vectors(self, slot: int, indexFile: str):
+        indexPath = self._slot_path(slot, indexFile)
+        source_hash = get_file_hash(indexPath)
+        output = f'{os.path.basename(indexFile)}.vectors.npy'
+        logger.info(f"Building index vectors of slot {slot}...")
+        self.store.install_derived(
+            source_hash,
+            'vectors.npy',
+            self._slot_path(slot, output),
+            lambda tmp: self._run_in_process(export_index_vectors, indexPath, tmp),
+        )
+        self._record(slot, 'indexVectors', output, indexFile, source_hash)
+
+    def _build_onnx_fp16(self, slot: int, onnxFile: str):
+        onnxPath = self._slot_path(slot, onnxFile)
+        source_hash = get_file_hash(onnxPath)
+        logger.info(f"Building FP16 model of slot {slot}...")
+        output = prepare_fp16_model(onnxPath, lambda src, tmp: self._run_in_process(build_fp16_model, src, tmp))
+        self._record(slot, 'onnxFp16', os.path.basename(output), onnxFile, source_hash)
+
+    def _on_onnx_exported(self, installed: dict[int, RVCModelSlot], source_hash: str):
+        # Every slot of the export job has the same source model
+        for slot, slotInfo in installed.items():
+            self._record(slot, 'onnx', slotInfo.modelFileOnnx, slotInfo.modelFile, source_hash)
+            if 'onnxFp16' in self.params.prebuilt_artifacts:
+                self.jobs.submit(self._run, self._build_onnx_fp16, slot, slotInfo.modelFileOnnx)
+
+    def _record(self, slot: int, artifact: str, file: str, source_file: str, source_hash: str):
+        with self.slotManager.lock:
+            slotInfo = self.slotManager.get_slot_info(slot)
+            if not isinstance(slotInfo, RVCModelSlot) or get_recorded_hash(self._slot_path(slot, source_file)) != source_hash:
+                logger.info(f"Slot {slot} has changed, {artifact} is not recorded.")
+                return
+            slotInfo.artifacts[artifact] = file
+            self.slotManager.save_model_slot(slot, slotInfo)
+        logger.info(f"Built {artifact} of slot {slot}: {file}")
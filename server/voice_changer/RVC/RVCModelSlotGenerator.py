@@ -7,7 +7,9 @@ import json
 import safetensors
 
 from data.ModelSlot import RVCModelSlot
-from voice_changer.common.SafetensorsUtils import convert_single
+from voice_changer.common.ArtifactManifest import get_file_hash
+from voice_changer.common.BlobStore import BlobStore
+from voice_changer.common.SafetensorsUtils import convert_file
 from voice_changer.utils.LoadModelParams import LoadModelParams
 from voice_changer.utils.ModelSlotGenerator import ModelSlotGenerator
 from settings import ServerSettings
@@ -41,8 +43,11 @@ class RVCModelSlotGenerator(ModelSlotGenerator):
         else:
             slotInfo = cls._setInfoByPytorch(modelPath, slotInfo)
             if not modelPath.endswith(".safetensors"):
-                convert_single(modelPath, True)
                 filename, _ = os.path.splitext(os.path.basename(modelPath))
+                sfPath = os.path.join(os.path.dirname(modelPath), f'{filename}.safetensors')
+                # Converted once per checkpoint, slots with the same checkpoint share the result
+                BlobStore.get_instance(model_dir).install_derived(get_file_hash(modelPath), 'safetensors', sfPath, lambda output: convert_file(modelPath, output))
+                os.remove(modelPath)
                 slotInfo.modelFile = f'{filename}.safetensors'
         return slotInfo
 
@@ -2,25 +2,31 @@
 VoiceChangerV2向け
 """
 import torch
-from data.ModelSlot import RVCModelSlot, saveSlotInfo
+from data.ModelSlot import RVCModelSlot
+from voice_changer.ModelSlotManager import ModelSlotManager
 from const import EnumInferenceTypes
 import logging
 import os
+from time import perf_counter_ns
 from voice_changer.RVC.embedder.EmbedderManager import EmbedderManager
 from voice_changer.utils.VoiceChangerModel import (
     AudioInOutFloat,
     VoiceChangerModel,
 )
 from settings import ServerSettings
-from voice_changer.RVC.onnxExporter.export2onnx import export2onnx
+from voice_changer.RVC.onnxExporter.OnnxExportQueue import OnnxExportQueue
+from voice_changer.RVC.inferencer.InferencerManager import InferencerManager
 from voice_changer.RVC.pitchExtractor.PitchExtractorManager import PitchExtractorManager
 from voice_changer.RVC.pipeline.PipelineGenerator import createPipeline
+from voice_changer.RVC.modelMerger.WeightBlender import WeightBlender
 from voice_changer.common.TorchUtils import circular_write
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
+from voice_changer.utils.Metrics import Counter, Stage, StageMetrics
 from voice_changer.RVC.pipeline.Pipeline import Pipeline
 from torchaudio import transforms as tat
 from voice_changer.VoiceChangerSettings import VoiceChangerSettings
 from Exceptions import (
+    ModelBlendException,
     PipelineNotInitializedException,
 )
 
@@ -32,12 +38,14 @@ class RVCr2(VoiceChangerModel):
         self.voiceChangerType = "RVC"
 
         self.device_manager = DeviceManager.get_instance()
+        self.metrics = StageMetrics.get_instance()
         EmbedderManager.initialize(params)
         PitchExtractorManager.initialize(params)
         self.settings = settings
         self.params = params
 
         self.pipeline: Pipeline | None = None
+        self.blender: WeightBlender | None = None
 
         self.convert_buffer: torch.Tensor | None = None
         self.pitch_buffer: torch.Tensor | None = None
@@ -67,21 +75,32 @@ class RVCr2(VoiceChangerModel):
     def initialize(self, force_reload: bool = False):
         logger.info("Initializing...")
 
-        if self.settings.useONNX and not self.slotInfo.modelFileOnnx:
+        use_onnx = self.settings.useONNX and bool(self.slotInfo.modelFileOnnx)
+        if self.settings.useONNX and not use_onnx and not self.slotInfo.isONNX:
+            # Keep converting with PyTorch, the ONNX model is swapped in once exported
             self.export2onnx()
 
         self.is_half = self.device_manager.use_fp16()
 
         # pipelineの生成
+        self.blender = None
         try:
             self.pipeline = createPipeline(
-                self.params, self.slotInfo, self.settings.f0Detector, self.settings.useONNX, force_reload
+                self.params, self.slotInfo, self.settings.f0Detector, use_onnx, force_reload
             )
         except Exception as e:  # NOQA
             logger.error("Failed to create pipeline.")
             logger.exception(e)
             return
 
+        if self.settings.blendRatios:
+            try:
+                self.apply_blend()
+            except ModelBlendException as e:
+                # F.e., JIT was enabled. The model runs with its own weights, so does the setting.
+                logger.exception(e)
+                self.settings.blendRatios = {}
+
         self.dtype = torch.float16 if self.is_half else torch.float32
 
         # 処理は16Kで実施(Pitch, embed, (infer))
@@ -131,6 +150,38 @@ class RVCr2(VoiceChangerModel):
         elif key == 'silentThreshold':
             # Convert dB to RMS
             self.inputSensitivity = 10 ** (self.settings.silentThreshold / 20)
+        elif key == 'blendRatios' and self.pipeline is not None:
+            self.apply_blend()
+
+    def apply_blend(self):
+        """
+        Blends the weights of the slots in blendRatios into the live model.
+        Models are loaded only when a slot is added, ratio changes are
+        computed in place. Raises ModelBlendException if the slots cannot be
+        blended, the live weights are then left unchanged.
+        """
+        ratios = self.settings.blendRatios
+        try:
+            if self.blender is None:
+                if not ratios:
+                    return
+                self.blender = WeightBlender(self.pipeline.inferencer, self.slotInfo.slotIndex)
+
+            slotManager = ModelSlotManager.get_instance(self.params.model_dir)
+            for slot in ratios:
+                slotInfo = slotManager.get_slot_info(slot)
+                if slotInfo is None or slotInfo.voiceChangerType != self.slotInfo.voiceChangerType or slotInfo.modelType != self.slotInfo.modelType or slotInfo.samplingRate != self.slotInfo.samplingRate:
+                    raise RuntimeError(f"Model in slot {slot} cannot be blended with slot {self.slotInfo.slotIndex}.")
+                self.blender.add_source(slot, os.path.join(self.params.model_dir, str(slot), os.path.basename(slotInfo.modelFile)))
+            self.blender.retain_sources(set(ratios))
+
+            with self.device_manager.lock:
+                self.blender.blend(ratios if ratios else {self.slotInfo.slotIndex: 1.0})
+            if not ratios:
+                # Weights of the live slot are restored, release the sources
+                self.blender = None
+        except Exception as e:  # NOQA
+            raise ModelBlendException(str(e)) from e
 
     def set_slot_info(self, slotInfo: RVCModelSlot):
         self.slotInfo = slotInfo
@@ -225,11 +276,13 @@ class RVCr2(VoiceChangerModel):
         if self.pipeline is None:
             raise PipelineNotInitializedException()
 
+        t = perf_counter_ns()
         # Input audio is always float32
         audio_in_t = torch.as_tensor(audio_in, dtype=torch.float32, device=self.device_manager.device)
         audio_in_16k = self.resampler_in(audio_in_t)
         if self.is_half:
             audio_in_16k = audio_in_16k.half()
+        t = self.metrics.lap(Stage.RESAMPLE, t)
 
         circular_write(audio_in_16k, self.audio_buffer)
 
@@ -237,6 +290,7 @@ class RVCr2(VoiceChangerModel):
             torch.square(self.audio_buffer).mean()
         )
         vol = max(vol_t.item(), 0)
+        self.metrics.lap(Stage.PRE_PROCESS, t)
 
         if vol < self.inputSensitivity:
             # Busy wait to keep power manager happy and clocks stable. Running pipeline on-demand seems to lag when the delay between
@@ -258,9 +312,12 @@ class RVCr2(VoiceChangerModel):
                 self.return_length,
                 self.settings.protect,
             )
+            self.metrics.inc(Counter.CHUNKS_SILENT)
             return None, vol
 
+        t = perf_counter_ns()
         circular_write(audio_in_16k, self.convert_buffer)
+        self.metrics.lap(Stage.PRE_PROCESS, t)
 
         audio_model = self.pipeline.exec(
             self.settings.dstId,
@@ -279,8 +336,10 @@ class RVCr2(VoiceChangerModel):
             self.settings.protect,
         )
 
+        t = perf_counter_ns()
         # FIXME: Why the heck does it require another sqrt to amplify the volume?
         audio_out: torch.Tensor = self.resampler_out(audio_model * torch.sqrt(vol_t))
+        self.metrics.lap(Stage.RESAMPLE, t)
 
         return audio_out, vol
 
@@ -294,11 +353,28 @@ class RVCr2(VoiceChangerModel):
             logger.error(f"{modelSlot.modelFile} is already in ONNX format.")
             return
 
-        output_path = export2onnx(modelSlot)
+        job = OnnxExportQueue.get_instance(self.params.model_dir).submit(modelSlot, self._on_onnx_exported)
+        return {"status": "OK", "job": job.to_dict()}
+
+    def _on_onnx_exported(self, slotInfos: dict[int, RVCModelSlot]):
+        # Called from the export worker thread
+        slotInfo = slotInfos.get(self.slotInfo.slotIndex)
+        if slotInfo is None:
+            return
+        self.slotInfo = slotInfo
+        pipeline = self.pipeline
+        if not self.settings.useONNX or pipeline is None:
+            return
+        if EnumInferenceTypes(pipeline.inferencer.inferencerType) in {EnumInferenceTypes.onnxRVC, EnumInferenceTypes.onnxRVCNono}:
+            return
 
-        self.slotInfo.modelFileOnnx = os.path.basename(output_path)
-        self.slotInfo.modelTypeOnnx = EnumInferenceTypes.onnxRVC.value if self.slotInfo.f0 else EnumInferenceTypes.onnxRVCNono.value
-        saveSlotInfo(self.params.model_dir, self.slotInfo.slotIndex, self.slotInfo)
+        modelPath = os.path.join(self.params.model_dir, str(slotInfo.slotIndex), os.path.basename(slotInfo.modelFileOnnx))
+        inferencer = InferencerManager.getInferencer(slotInfo.modelTypeOnnx, modelPath)
+        # Swap between chunks, the rest of the pipeline does not depend on the backend
+        with self.device_manager.lock:
+            pipeline.inferencer = inferencer
+            self.blender = None
+        logger.info("Switched to the exported ONNX model.")
 
     def get_model_current(self):
         return [
@@ -2,6 +2,7 @@ from const import EmbedderType
 from voice_changer.RVC.embedder.Embedder import Embedder
 from voice_changer.RVC.embedder.OnnxContentvec import OnnxContentvec
 from settings import ServerSettings
+from voice_changer.utils.Metrics import Counter, StageMetrics
 import logging
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,9 @@ class EmbedderManager:
             and cls.embedder.matchCondition(embedder_type) \
             and not force_reload:
             logger.info('Reusing embedder.')
+            StageMetrics.get_instance().inc(Counter.EMBEDDER_CACHE_HIT)
             return cls.embedder
+        StageMetrics.get_instance().inc(Counter.EMBEDDER_CACHE_MISS)
         cls.embedder = cls.load_embedder(embedder_type)
         return cls.embedder
 
@@ -1,8 +1,8 @@
 import torch
 from voice_changer.common.OnnxLoader import load_onnx_model
+from voice_changer.common.OnnxSession import OnnxSession
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
 from voice_changer.RVC.embedder.Embedder import Embedder
-import onnxruntime
 import numpy as np
 
 class OnnxContentvec(Embedder):
@@ -17,12 +17,15 @@ class OnnxContentvec(Embedder):
 
         model = load_onnx_model(file, self.is_half, device_manager.is_int8_avalable())
 
-        so = onnxruntime.SessionOptions()
-        # so.log_severity_level = 3
-        # so.enable_profiling = True
         self.fp_dtype_t = torch.float16 if self.is_half else torch.float32
         self.fp_dtype_np = np.float16 if self.is_half else np.float32
-        self.onnx_session = onnxruntime.InferenceSession(model.SerializeToString(), sess_options=so, providers=onnxProviders, provider_options=onnxProviderOptions)
+        self.onnx_session = OnnxSession(
+            'contentvec',
+            model.SerializeToString(),
+            onnxProviders,
+            onnxProviderOptions,
+            reload=lambda: load_onnx_model(file, self.is_half, device_manager.is_int8_avalable()).SerializeToString(),
+        )
         super().set_props('hubert_base', file)
         return self
 
@@ -44,7 +47,6 @@ class OnnxContentvec(Embedder):
                 ['units9', 'unit12', 'unit12s'],
                 { 'audio': feats.detach().cpu().numpy() }
             )
-        # self.onnx_session.end_profiling()
 
         return torch.as_tensor(
             units[0] if embOutputLayer == 9 else units[1],
@@ -1,8 +1,8 @@
 import torch
-import onnxruntime
 import json
 from const import EnumInferenceTypes
 from voice_changer.common.OnnxLoader import load_onnx_model
+from voice_changer.common.OnnxSession import OnnxSession
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
 from voice_changer.RVC.inferencer.Inferencer import Inferencer
 import numpy as np
@@ -23,10 +23,13 @@ class OnnxRVCInferencer(Inferencer):
         self.fp_dtype_t = torch.float16 if self.is_half else torch.float32
         self.fp_dtype_np = np.float16 if self.is_half else np.float32
 
-        so = onnxruntime.SessionOptions()
-        # so.log_severity_level = 3
-        # so.enable_profiling = True
-        self.model = onnxruntime.InferenceSession(model.SerializeToString(), sess_options=so, providers=onnxProviders, provider_options=onnxProviderOptions)
+        self.model = OnnxSession(
+            'rvc',
+            model.SerializeToString(),
+            onnxProviders,
+            onnxProviderOptions,
+            reload=lambda: load_onnx_model(file, self.is_half).SerializeToString(),
+        )
 
         metadata = json.loads(self.model.get_modelmeta().custom_metadata_map["metadata"])
         self.inferencerTypeVersion = metadata['version']
@@ -77,7 +80,6 @@ class OnnxRVCInferencer(Inferencer):
                     "formant_length": np.array(formant_length, dtype=np.int64),
                 },
             )
-        # self.model.end_profiling()
 
         res = torch.as_tensor(output[0], dtype=self.fp_dtype_t, device=feats.device)
 
@@ -49,7 +49,6 @@ class OnnxRVCInferencerNono(OnnxRVCInferencer):
                     "formant_length": np.array(formant_length, dtype=np.int64),
                 },
             )
-        # self.model.end_profiling()
 
         res = torch.as_tensor(output[0], dtype=self.fp_dtype_t, device=feats.device)
 
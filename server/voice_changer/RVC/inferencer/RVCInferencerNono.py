@@ -10,10 +10,16 @@ from voice_changer.common.SafetensorsUtils import load_model
 
 class RVCInferencerNono(Inferencer):
     def load_model(self, file: str):
+        self.set_props(EnumInferenceTypes.pyTorchRVCNono, file)
+
+        self.model = self.build_model(file)
+        return self
+
+    def build_model(self, file: str) -> torch.nn.Module:
+        """Loads the model without JIT compilation, ready for inference."""
         device_manager = DeviceManager.get_instance()
         dev = device_manager.device
         is_half = device_manager.use_fp16()
-        self.set_props(EnumInferenceTypes.pyTorchRVCNono, file)
 
         # Keep torch.load for backward compatibility, but discourage the use of this loading method
         if file.endswith('.safetensors'):
@@ -31,8 +37,7 @@ class RVCInferencerNono(Inferencer):
         if is_half:
             model = model.half()
 
-        self.model = model
-        return self
+        return model
 
     def infer(
         self,
@@ -13,11 +13,25 @@ logger = logging.getLogger(__name__)
 class RVCInferencerv2(Inferencer):
     def load_model(self, file: str):
         device_manager = DeviceManager.get_instance()
-        dev = device_manager.device
-        is_half = device_manager.use_fp16()
         use_jit_compile = device_manager.use_jit_compile()
         self.set_props(EnumInferenceTypes.pyTorchRVCv2, file)
 
+        model = self.build_model(file)
+
+        self.use_jit_eager = not use_jit_compile
+        if use_jit_compile:
+            logger.info('Compiling JIT model...')
+            model = torch.jit.optimize_for_inference(torch.jit.script(model), other_methods=['infer'])
+
+        self.model = model
+        return self
+
+    def build_model(self, file: str) -> torch.nn.Module:
+        """Loads the model without JIT compilation, ready for inference."""
+        device_manager = DeviceManager.get_instance()
+        dev = device_manager.device
+        is_half = device_manager.use_fp16()
+
         # Keep torch.load for backward compatibility, but discourage the use of this loading method
         if file.endswith('.safetensors'):
             with safe_open(file, 'pt', device=str(dev) if dev.type == 'cuda' else 'cpu') as cpt:
@@ -35,13 +49,7 @@ class RVCInferencerv2(Inferencer):
         if is_half:
             model = model.half()
 
-        self.use_jit_eager = not use_jit_compile
-        if use_jit_compile:
-            logger.info('Compiling JIT model...')
-            model = torch.jit.optimize_for_inference(torch.jit.script(model), other_methods=['infer'])
-
-        self.model = model
-        return self
+        return model
 
     def infer(
         self,
@@ -57,6 +57,10 @@ class Encoder(nn.Module):
             )
             self.norm_layers_2.append(LayerNorm(hidden_channels))
 
+    def clear_cache(self):
+        for attn_layers in self.attn_layers:
+            attn_layers.clear_cache()
+
     def forward(self, x, x_mask):
         attn_mask = x_mask.unsqueeze(2) * x_mask.unsqueeze(-1)
         x = x * x_mask
@@ -163,6 +167,14 @@ class Decoder(nn.Module):
 
 
 class MultiHeadAttention(nn.Module):
+    # Relative embeddings and proximal bias only depend on the sequence length,
+    # which stays the same between realtime chunks. Keep the expanded tensors
+    # around and rebuild them only when the length (or dtype/device) changes.
+    _rel_cache_length: int
+    _rel_k_cache: Optional[torch.Tensor]
+    _rel_v_cache: Optional[torch.Tensor]
+    _proximal_cache: Optional[torch.Tensor]
+
     def __init__(
         self,
         channels,
@@ -188,6 +200,10 @@ class MultiHeadAttention(nn.Module):
         self.proximal_bias = proximal_bias
         self.proximal_init = proximal_init
         self.attn = None
+        self._rel_cache_length = -1
+        self._rel_k_cache = None
+        self._rel_v_cache = None
+        self._proximal_cache = None
 
         self.k_channels = channels // n_heads
         self.k_channels_sqrt = math.sqrt(self.k_channels)
@@ -250,14 +266,13 @@ class MultiHeadAttention(nn.Module):
             assert (
                 t_s == t_t
             ), "Relative attention is only available for self-attention."
-            key_relative_embeddings = self._get_relative_embeddings(self.emb_rel_k, t_s)
+            key_relative_embeddings = self._get_cached_relative_embeddings(True, t_s)
             rel_logits = self._matmul_with_relative_keys(query, key_relative_embeddings)
             scores_local = self._relative_position_to_absolute_position(rel_logits)
             scores = scores + scores_local
         if self.proximal_bias:
             assert t_s == t_t, "Proximal bias is only available for self-attention."
-            r = torch.arange(t_s, dtype=scores.dtype, device=scores.device)
-            scores = scores + self._attention_bias_proximal(r)
+            scores = scores + self._get_cached_proximal_bias(t_s, scores)
         if mask is not None:
             scores = scores.masked_fill(mask == 0, -1e4)
             if self.block_length is not None:
@@ -275,8 +290,8 @@ class MultiHeadAttention(nn.Module):
         output = torch.matmul(p_attn, value)
         if self.window_size is not None:
             relative_weights = self._absolute_position_to_relative_position(p_attn)
-            value_relative_embeddings = self._get_relative_embeddings(
-                self.emb_rel_v, t_s
+            value_relative_embeddings = self._get_cached_relative_embeddings(
+                False, t_s
             )
             output = output + self._matmul_with_relative_values(
                 relative_weights, value_relative_embeddings
@@ -304,6 +319,65 @@ class MultiHeadAttention(nn.Module):
         ret = torch.matmul(x, y.unsqueeze(0).transpose(-2, -1))
         return ret
 
+    def clear_cache(self):
+        self._rel_cache_length = -1
+        self._rel_k_cache = None
+        self._rel_v_cache = None
+        self._proximal_cache = None
+
+    def _use_cache(self) -> bool:
+        # Tracing must see the actual pad/slice ops to keep dynamic axes intact.
+        return not self.training and not torch.jit.is_tracing()
+
+    def _get_cached_relative_embeddings(self, is_key: bool, length: int):
+        relative_embeddings = self.emb_rel_k if is_key else self.emb_rel_v
+        if not self._use_cache():
+            return self._get_relative_embeddings(relative_embeddings, length)
+
+        if self._rel_cache_length != length:
+            self.clear_cache()
+            self._rel_cache_length = length
+
+        cached = self._rel_k_cache if is_key else self._rel_v_cache
+        if (
+            cached is not None
+            and cached.dtype == relative_embeddings.dtype
+            and cached.device == relative_embeddings.device
+        ):
+            return cached
+
+        # Detach so the cache never holds on to an autograd graph.
+        used_relative_embeddings = self._get_relative_embeddings(
+            relative_embeddings.detach(), length
+        )
+        if is_key:
+            self._rel_k_cache = used_relative_embeddings
+        else:
+            self._rel_v_cache = used_relative_embeddings
+        return used_relative_embeddings
+
+    def _get_cached_proximal_bias(self, length: int, scores: torch.Tensor):
+        if not self._use_cache():
+            r = torch.arange(length, dtype=scores.dtype, device=scores.device)
+            return self._attention_bias_proximal(r)
+
+        if self._rel_cache_length != length:
+            self.clear_cache()
+            self._rel_cache_length = length
+
+        cached = self._proximal_cache
+        if (
+            cached is not None
+            and cached.dtype == scores.dtype
+            and cached.device == scores.device
+        ):
+            return cached
+
+        r = torch.arange(length, dtype=scores.dtype, device=scores.device)
+        proximal_bias = self._attention_bias_proximal(r)
+        self._proximal_cache = proximal_bias
+        return proximal_bias
+
     def _get_relative_embeddings(self, relative_embeddings, length: int):
         max_relative_position = 2 * self.window_size + 1
         # Pad first before slice to avoid using cond ops.
@@ -1,88 +1,109 @@
-from typing import Dict, Any
+from typing import Callable
 import os
-from collections import OrderedDict
+from contextlib import ExitStack
+from dataclasses import dataclass
 import torch
 from voice_changer.ModelSlotManager import ModelSlotManager
+from voice_changer.common.SafetensorsUtils import SAFETENSORS_DTYPES, TORCH_DTYPES, build_metadata, save_file_streaming
 from safetensors import safe_open
 from voice_changer.utils.ModelMerger import ModelMergerRequest
 from settings import ServerSettings
-import json
 import logging
 logger = logging.getLogger(__name__)
 
-def merge_model(params: ServerSettings, request: ModelMergerRequest):
-    def extract(ckpt: Dict[str, Any]):
-        a = ckpt["model"]
-        opt: Dict[str, Any] = OrderedDict()
 
-        opt["weight"] = {}
-        for key in a.keys():
-            if "enc_q" in key:
-                continue
-            opt["weight"][key] = a[key]
-        return opt
-
-    def load_weight(path: str):
-        logger.info(f"Loading {path}...")
-        if path.endswith('.safetensors'):
-            with safe_open(path, 'pt', device='cpu') as cpt:
-                state_dict = cpt.metadata()
-                weight = { k: cpt.get_tensor(k) for k in cpt.keys() }
-                config = json.loads(state_dict['config'])
-        else:
-            state_dict = torch.load(path, map_location='cpu')
-            if "model" in state_dict:
-                weight = extract(state_dict)
+@dataclass
+class MergeSource:
+    # safetensors dtype and shape of every tensor
+    layout: dict[str, tuple[str, list[int]]]
+    get_tensor: Callable[[str], torch.Tensor]
+    metadata: dict[str, str]
+    alpha: float
+
+
+def open_source(path: str, alpha: float, stack: ExitStack) -> MergeSource:
+    logger.info(f"Opening {path}...")
+    if path.endswith('.safetensors'):
+        cpt = stack.enter_context(safe_open(path, 'pt', device='cpu'))
+        layout = {}
+        for k in cpt.keys():
+            tensor_slice = cpt.get_slice(k)
+            layout[k] = (tensor_slice.get_dtype(), tensor_slice.get_shape())
+        return MergeSource(layout, cpt.get_tensor, cpt.metadata(), alpha)
+
+    # Memory-map checkpoints in the zip format, so that tensors are read when they are merged
+    try:
+        state_dict = torch.load(path, map_location='cpu', mmap=True)
+    except RuntimeError:
+        state_dict = torch.load(path, map_location='cpu')
+    if "model" in state_dict:
+        weight = {k: v for k, v in state_dict["model"].items() if "enc_q" not in k}
+    else:
+        weight = state_dict["weight"]
+    layout = {k: (SAFETENSORS_DTYPES[v.dtype], list(v.shape)) for k, v in weight.items()}
+    return MergeSource(layout, weight.__getitem__, build_metadata({k: v for k, v in state_dict.items() if k != "model"}), alpha)
+
+
+def merged_tensors(sources: list[MergeSource], layout: dict[str, tuple[str, list[int]]]):
+    """Weighted sums of the source tensors, computed one tensor at a time."""
+    for key, (dtype, _shape) in layout.items():
+        merged = None
+        for source in sources:
+            tensor = source.get_tensor(key)
+            if merged is None:
+                # Copy, so that memory-mapped sources are not modified
+                merged = tensor.to(torch.float32, copy=True).mul_(source.alpha)
             else:
-                weight = state_dict["weight"]
-            config = state_dict['config']
-        return weight, state_dict, config
+                merged.add_(tensor.to(torch.float32), alpha=source.alpha)
+            del tensor
+        yield key, merged.to(TORCH_DTYPES[dtype])
+
 
+def merge_model(params: ServerSettings, request: ModelMergerRequest, output_path: str):
+    """
+    Merges the models of the requested slots into a safetensors file in a
+    single pass. Source tensors are read one by one (memory-mapped where
+    possible) and each merged tensor is written out before the next one is
+    computed, so memory use stays around the size of the largest tensor.
+    """
     files = request.files
     if len(files) == 0:
         raise RuntimeError("No merge file.")
 
-    weights = []
-    alphas = []
     slotManager = ModelSlotManager.get_instance(params.model_dir)
-    for f in files:
-        strength = f.strength
-        if strength == 0:
-            continue
-        slotInfo = slotManager.get_slot_info(f.slotIndex)
-
-        filename = os.path.join(params.model_dir, str(f.slotIndex), os.path.basename(slotInfo.modelFile))  # slotInfo.modelFileはv.1.5.3.11以前はmodel_dirから含まれている。
-
-        weight, state_dict, config = load_weight(filename)
-        weights.append(weight)
-        alphas.append(f.strength)
-
-    alphas = [x / sum(alphas) for x in alphas]
-
-    for weight in weights:
-        if sorted(list(weight.keys())) != sorted(list(weights[0].keys())):
-            raise RuntimeError("Failed to merge models.")
-
-    merged: Dict[str, Any] = OrderedDict()
-    merged["weight"] = {}
-    logger.info("merge start.")
-    for key in weights[0].keys():
-        merged["weight"][key] = 0
-        for i, weight in enumerate(weights):
-            merged["weight"][key] += weight[key] * alphas[i]
-    logger.info("merge done. write metadata.")
-
-    merged["config"] = config
-    merged["params"] = state_dict["params"] if "params" in state_dict else None
-    merged["version"] = state_dict["version"] if "version" in state_dict else None
-    merged["sr"] = state_dict["sr"]
-    merged["f0"] = int(state_dict["f0"] == "1" or state_dict["f0"] == "True")
-    try:
-        # Some forks do not include info apparently (?)
-        merged["info"] = state_dict["info"]
-    except:
-        pass
-    merged["embedder_name"] = state_dict["embedder_name"] if "embedder_name" in state_dict else None
-    merged["embedder_output_layer"] = state_dict["embedder_output_layer"] if "embedder_output_layer" in state_dict else None
-    logger.info("write metadata done.")
-    return merged
+    with ExitStack() as stack:
+        sources: list[MergeSource] = []
+        for f in files:
+            strength = f.strength
+            if strength == 0:
+                continue
+            slotInfo = slotManager.get_slot_info(f.slotIndex)
+
+            filename = os.path.join(params.model_dir, str(f.slotIndex), os.path.basename(slotInfo.modelFile))  # slotInfo.modelFileはv.1.5.3.11以前はmodel_dirから含まれている。
+
+            sources.append(open_source(filename, strength, stack))
+
+        if len(sources) == 0:
+            raise RuntimeError("No merge file.")
+        total = sum(source.alpha for source in sources)
+        for source in sources:
+            source.alpha /= total
+
+        # Output tensors keep dtype and order of the first model
+        layout = sources[0].layout
+        for source in sources:
+            if sorted(source.layout.keys()) != sorted(layout.keys()) or any(source.layout[k][1] != shape for k, (_dtype, shape) in layout.items()):
+                raise RuntimeError("Failed to merge models.")
+
+        # Metadata of the last model, like the merged checkpoints before
+        state_dict = sources[-1].metadata
+        metadata = {"format": "pt"}
+        for key in ["config", "params", "version", "sr", "info", "embedder_name", "embedder_output_layer"]:
+            if key in state_dict:
+                metadata[key] = state_dict[key]
+        metadata["f0"] = str(int(state_dict["f0"] in ("1", "True")))
+
+        logger.info("merge start.")
+        save_file_streaming(output_path, layout, merged_tensors(sources, layout), metadata)
+        logger.info("merge done.")
+    return output_path
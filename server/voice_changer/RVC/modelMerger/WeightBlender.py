@@ -0,0 +1,78 @@
+import torch
+from voice_changer.RVC.inferencer.Inferencer import Inferencer
+import logging
+logger = logging.getLogger(__name__)
+
+
+class WeightBlender:
+    """
+    Interpolates the weights of models that share architecture and config
+    directly in the parameters of the live model.
+
+    Weights of every source slot are loaded once and stay resident on the
+    device, prepared the same way as the live model (weight norm removed,
+    inference dtype). Changing the ratios only writes the weighted sums into
+    the existing parameter storage, so neither files nor the pipeline are
+    touched. Weights of the live slot are kept as one of the sources, so
+    that they can be restored.
+    """
+
+    def __init__(self, inferencer: Inferencer, base_slot: int):
+        model = inferencer.model
+        # JIT compiled models are frozen, their weights are constants of the graph
+        if not hasattr(inferencer, 'build_model') or not isinstance(model, torch.nn.Module) or isinstance(model, torch.jit.ScriptModule):
+            raise RuntimeError("Live blending requires a PyTorch model with JIT disabled.")
+        self.inferencer = inferencer
+        self.model = model
+        self.base_slot = base_slot
+        # state_dict() shares storage with the parameters, so writing into it updates the model
+        self.targets = {k: v for k, v in model.state_dict().items() if v.is_floating_point()}
+        self.sources: dict[int, dict[str, torch.Tensor]] = {
+            base_slot: {k: v.clone() for k, v in self.targets.items()}
+        }
+        self.ratios: dict[int, float] = {base_slot: 1.0}
+
+    def add_source(self, slot: int, file: str):
+        if slot in self.sources:
+            return
+        logger.info(f"Loading blend source {file}...")
+        state_dict = self.inferencer.build_model(file).state_dict()
+        for k, target in self.targets.items():
+            tensor = state_dict.get(k)
+            if tensor is None or tensor.shape != target.shape:
+                raise RuntimeError(f"Model in slot {slot} does not match the architecture of slot {self.base_slot}: {k}")
+        self.sources[slot] = {k: state_dict[k] for k in self.targets}
+
+    def retain_sources(self, slots: set[int]):
+        """Releases sources of the slots that are not listed, except the live slot."""
+        for slot in list(self.sources.keys()):
+            if slot != self.base_slot and slot not in slots:
+                del self.sources[slot]
+
+    def blend(self, ratios: dict[int, float]):
+        """
+        Writes the weighted sum of the sources into the model. Ratios are
+        normalized, slots without ratio do not contribute.
+        Must not run concurrently with inference.
+        """
+        weights = [(slot, ratio) for slot, ratio in ratios.items() if ratio > 0]
+        for slot, _ in weights:
+            if slot not in self.sources:
+                raise RuntimeError(f"Model in slot {slot} is not loaded for blending.")
+        total = sum(ratio for _, ratio in weights)
+        if total <= 0:
+            weights, total = [(self.base_slot, 1.0)], 1.0
+
+        with torch.no_grad():
+            for k, target in self.targets.items():
+                (slot, ratio), *rest = weights
+                torch.mul(self.sources[slot][k], ratio / total, out=target)
+                for slot, ratio in rest:
+                    target.add_(self.sources[slot][k], alpha=ratio / total)
+
+        # Attention layers cache tensors derived from the relative embeddings
+        for module in self.model.modules():
+            if hasattr(module, 'clear_cache'):
+                module.clear_cache()
+        self.ratios = {slot: ratio / total for slot, ratio in weights}
+        logger.info(f"Blended weights: {self.ratios}")
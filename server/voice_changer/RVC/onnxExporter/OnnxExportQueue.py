@@ -0,0 +1,194 @@
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Literal, TypeAlias
+from const import EnumInferenceTypes
+from data.ModelSlot import RVCModelSlot
+from voice_changer.ModelSlotManager import ModelSlotManager
+from voice_changer.common.ArtifactManifest import get_file_hash
+from voice_changer.common.BlobStore import BlobStore
+from voice_changer.RVC.onnxExporter.export2onnx import export_device, export_metadata, run_export
+import logging
+logger = logging.getLogger(__name__)
+
+ExportState: TypeAlias = Literal['queued', 'running', 'done', 'failed']
+# Called with the updated slot infos of all slots the model was installed to
+ExportCallback: TypeAlias = Callable[[dict[int, RVCModelSlot]], None]
+
+PROGRESS_POLL_INTERVAL = 0.5
+
+
+@dataclass
+class OnnxExportJob:
+    id: str
+    slots: list[int]
+    state: ExportState = 'queued'
+    stage: str = ''
+    progress: float = 0.0
+    error: str | None = None
+    callbacks: list[ExportCallback] = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> dict:
+        # Not asdict(), that would deep copy the callbacks
+        return {
+            'id': self.id,
+            'slots': list(self.slots),
+            'state': self.state,
+            'stage': self.stage,
+            'progress': self.progress,
+            'error': self.error,
+        }
+
+
+class OnnxExportQueue:
+    """
+    Exports models to ONNX one at a time in a separate process, so that the
+    export (and onnxsim in particular) never blocks the server or the audio.
+
+    Jobs are identified by the hash of the source model and the export
+    parameters. Requests for a model that is already queued join the existing
+    job, and finished exports are kept in the blob store, so exporting the
+    same model again only links the result.
+    Once a job is done, the ONNX file is installed into every requesting slot
+    and the callbacks are called with the updated slot infos.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls, model_dir: str):
+        if cls._instance is None:
+            cls._instance = cls(model_dir)
+        return cls._instance
+
+    def __init__(self, model_dir: str):
+        self.model_dir = model_dir
+        self.store = BlobStore.get_instance(model_dir)
+        self.jobs: dict[str, OnnxExportJob] = {}
+        self.pending: queue.Queue[OnnxExportJob] = queue.Queue()
+        self.listeners: list[Callable[[dict], None]] = []
+        self.lock = threading.Lock()
+        self.worker: threading.Thread | None = None
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """listener is called from the worker thread with the job status on every update."""
+        self.listeners.append(listener)
+
+    def get_jobs(self) -> list[dict]:
+        return [job.to_dict() for job in list(self.jobs.values())]
+
+    def submit(self, slotInfo: RVCModelSlot, callback: ExportCallback | None = None) -> OnnxExportJob:
+        model_file = os.path.join(self.model_dir, str(slotInfo.slotIndex), os.path.basename(slotInfo.modelFile))
+        metadata = export_metadata(slotInfo)
+        key = hashlib.sha256(json.dumps([get_file_hash(model_file), metadata], sort_keys=True).encode()).hexdigest()
+
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None or job.state in ('done', 'failed'):
+                job = OnnxExportJob(key, [])
+                self.jobs[key] = job
+                self.pending.put(job)
+            if slotInfo.slotIndex not in job.slots:
+                job.slots.append(slotInfo.slotIndex)
+            if callback is not None:
+                job.callbacks.append(callback)
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._work, daemon=True)
+                self.worker.start()
+        self._notify(job)
+        return job
+
+    def _work(self):
+        while True:
+            job = self.pending.get()
+            try:
+                cache_file = self.store.derived_path(job.id, 'onnx')
+                if not os.path.isfile(cache_file):
+                    self._export(job, cache_file)
+                with self.lock:
+                    job.state = 'done'
+                    job.stage = ''
+                    job.progress = 1.0
+                    slots = list(job.slots)
+                    callbacks = job.callbacks
+                    # Finished jobs stay listed, they must not keep the models alive
+                    job.callbacks = []
+                self._notify(job)
+                self._install(cache_file, slots, callbacks)
+            except Exception as e:
+                logger.error("Failed to export ONNX model.")
+                logger.exception(e)
+                with self.lock:
+                    job.state = 'failed'
+                    job.error = str(e)
+                self._notify(job)
+
+    def _export(self, job: OnnxExportJob, cache_file: str):
+        slotInfo = ModelSlotManager.get_instance(self.model_dir).get_slot_info(job.slots[0])
+        model_file = os.path.join(self.model_dir, str(slotInfo.slotIndex), os.path.basename(slotInfo.modelFile))
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f'{cache_file}.tmp'
+
+        # Spawn, so that the export does not inherit threads and device contexts of the server
+        ctx = mp.get_context('spawn')
+        progress = ctx.Queue()
+        process = ctx.Process(
+            target=run_export,
+            args=(model_file, tmp_file, export_metadata(slotInfo), str(export_device()), progress),
+            daemon=True,
+        )
+        job.state = 'running'
+        self._notify(job)
+        logger.info(f"Exporting {model_file} to ONNX...")
+        process.start()
+        try:
+            while True:
+                try:
+                    msg = progress.get(timeout=PROGRESS_POLL_INTERVAL)
+                except queue.Empty:
+                    if not process.is_alive():
+                        raise RuntimeError(f"Export process exited with code {process.exitcode}.")
+                    continue
+                if msg[0] == 'progress':
+                    _, job.stage, job.progress = msg
+                    self._notify(job)
+                elif msg[0] == 'done':
+                    break
+                else:
+                    raise RuntimeError(msg[1])
+            process.join()
+            os.replace(tmp_file, cache_file)
+        finally:
+            if process.is_alive():
+                process.kill()
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        logger.info(f"Exported {model_file} to ONNX.")
+
+    def _install(self, cache_file: str, slots: list[int], callbacks: list[ExportCallback]):
+        slotManager = ModelSlotManager.get_instance(self.model_dir)
+        installed: dict[int, RVCModelSlot] = {}
+        for slot in slots:
+            slotInfo: RVCModelSlot = slotManager.get_slot_info(slot)
+            output_file = os.path.splitext(os.path.basename(slotInfo.modelFile))[0] + '.onnx'
+            self.store.install(cache_file, os.path.join(self.model_dir, str(slot), output_file))
+            slotInfo.modelFileOnnx = output_file
+            slotInfo.modelTypeOnnx = EnumInferenceTypes.onnxRVC.value if slotInfo.f0 else EnumInferenceTypes.onnxRVCNono.value
+            slotManager.save_model_slot(slot, slotInfo)
+            installed[slot] = slotInfo
+        for callback in callbacks:
+            try:
+                callback(installed)
+            except Exception as e:
+                logger.exception(e)
+
+    def _notify(self, job: OnnxExportJob):
+        status = job.to_dict()
+        for listener in self.listeners:
+            try:
+                listener(status)
+            except Exception as e:
+                logger.exception(e)
@@ -1,4 +1,3 @@
-import os
 import json
 import torch
 from onnxsim import simplify
@@ -9,19 +8,14 @@ from data.ModelSlot import RVCModelSlot
 from voice_changer.common.SafetensorsUtils import load_model
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
 from ..inferencer.rvc_models.infer_pack.models_onnx import SynthesizerTrnMsNSFsidM  # type: ignore
-from settings import ServerSettings
 from io import BytesIO
+from typing import Callable
+from queue import Queue
 import logging
 logger = logging.getLogger(__name__)
 
-def export2onnx(modelSlot: RVCModelSlot) -> str:
-    model_dir = ServerSettings().model_dir
-    model_path = os.path.join(model_dir, str(modelSlot.slotIndex))
-    modelFile = os.path.join(model_path, modelSlot.modelFile)
-
-    output_file = os.path.splitext(modelSlot.modelFile)[0] + ".onnx"
-    output_path = os.path.join(model_path, output_file)
-    metadata = {
+def export_metadata(modelSlot: RVCModelSlot) -> dict:
+    return {
         "application": "VC_CLIENT",
         "version": "2.1",
         "modelType": modelSlot.modelType,
@@ -33,18 +27,29 @@ def export2onnx(modelSlot: RVCModelSlot) -> str:
         "useFinalProj": modelSlot.useFinalProj,
     }
 
-    logger.info("Exporting onnx...")
-    _export2onnx(modelFile, output_path, metadata)
-
-    return output_path
 
-
-def _export2onnx(input_model: str, output_model_simple: str, metadata: dict):
-    device_manager = DeviceManager.get_instance()
-    dev = device_manager.device
+def export_device() -> torch.device:
+    dev = DeviceManager.get_instance().device
     # DirectML and MPS fail to export due to different incompatibilities. And export is in FP32 anyway.
     if dev.type != 'cuda':
         dev = torch.device('cpu')
+    return dev
+
+
+def run_export(input_model: str, output_model: str, metadata: dict, device: str, progress: Queue):
+    """
+    Entry point of the export process. Reports ('progress', stage, fraction)
+    while exporting and ends with ('done', output_model) or ('failed', error).
+    """
+    try:
+        _export2onnx(input_model, output_model, metadata, torch.device(device), lambda stage, fraction: progress.put(('progress', stage, fraction)))
+        progress.put(('done', output_model))
+    except Exception as e:
+        progress.put(('failed', f'{type(e).__name__}: {e}'))
+
+
+def _export2onnx(input_model: str, output_model_simple: str, metadata: dict, dev: torch.device, progress: Callable[[str, float], None] = lambda stage, fraction: None):
+    progress('loading', 0.0)
     is_half = False
     is_safetensors = input_model.endswith('.safetensors')
 
@@ -79,8 +84,7 @@ def _export2onnx(input_model: str, output_model_simple: str, metadata: dict):
     elif metadata["modelType"] == EnumInferenceTypes.pyTorchRVCv2Nono.value:
         net_g_onnx = SynthesizerTrnMsNSFsidM(*data["config"], 768, is_half=is_half)
     else:
-        logger.error(f"Unknown model type: {metadata['modelType']}")
-        return
+        raise RuntimeError(f"Unknown model type: {metadata['modelType']}")
 
     net_g_onnx.eval().to(dev)
     if is_safetensors:
@@ -127,6 +131,7 @@ def _export2onnx(input_model: str, output_model_simple: str, metadata: dict):
         "audio",
     ]
 
+    progress('exporting', 0.2)
     with BytesIO() as io:
         torch.onnx.export(
             net_g_onnx,
@@ -143,9 +148,11 @@ def _export2onnx(input_model: str, output_model_simple: str, metadata: dict):
             input_names=input_names,
             output_names=output_names,
         )
+        progress('simplifying', 0.5)
         onnx_model, _ = simplify(onnx.load_model_from_string(io.getvalue()))
 
     meta = onnx_model.metadata_props.add()
     meta.key = "metadata"
     meta.value = json.dumps(metadata)
+    progress('saving', 0.9)
     onnx.save(onnx_model, output_model_simple)
@@ -10,10 +10,11 @@ from onnx.helper import (
 import numpy as np
 import sys
 import torch
+from time import perf_counter_ns
 import torch.nn.functional as F
-import onnxruntime
 from torchaudio import transforms as tat
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
+from voice_changer.common.OnnxSession import OnnxSession
 import logging
 
 from voice_changer.common.TorchUtils import circular_write
@@ -21,7 +22,7 @@ from voice_changer.RVC.embedder.Embedder import Embedder
 from voice_changer.RVC.inferencer.Inferencer import Inferencer
 
 from voice_changer.RVC.pitchExtractor.PitchExtractor import PitchExtractor
-from voice_changer.utils.Timer import Timer2
+from voice_changer.utils.Metrics import Stage, StageMetrics
 from const import F0_MEL_MIN, F0_MEL_MAX
 
 logger = logging.getLogger(__name__)
@@ -59,6 +60,7 @@ class Pipeline:
         logger.info("GENERATE PITCH EXTRACTOR" + str(self.pitchExtractor))
 
         self.device_manager = DeviceManager.get_instance()
+        self.metrics = StageMetrics.get_instance()
         self.device = self.device_manager.device
         self.is_half = self.device_manager.use_fp16()
 
@@ -103,7 +105,7 @@ class Pipeline:
             providers,
             provider_options,
         ) = self.device_manager.get_onnx_execution_provider()
-        return onnxruntime.InferenceSession(onnx_model.SerializeToString(), providers=providers, provider_options=provider_options)
+        return OnnxSession('upscaler', onnx_model.SerializeToString(), providers, provider_options)
 
     def getPipelineInfo(self):
         inferencerInfo = self.inferencer.getInferencerInfo() if self.inferencer else {}
@@ -175,75 +177,76 @@ class Pipeline:
         return_length: int,
         protect: float = 0.5,
     ) -> torch.Tensor:
-        with Timer2("Pipeline-Exec", False) as t:  # NOQA
-            # 16000のサンプリングレートで入ってきている。以降この世界は16000で処理。
-            assert audio.dim() == 1, audio.dim()
-
-            formant_factor = 2 ** (formant_shift / 12)
-            formant_length = int(np.ceil(return_length * formant_factor))
-            t.record("pre-process")
-
-            # ピッチ検出
-            pitch, pitchf = self.extract_pitch(audio[silence_front:], pitch, pitchf, f0_up_key, formant_shift) if self.use_f0 else (None, None)
-            t.record("extract-pitch")
-
-            # embedding
-            feats = self.embedder.extract_features(audio.view(1, -1), embOutputLayer, useFinalProj)
-            feats = torch.cat((feats, feats[:, -1:, :]), 1)
-            t.record("extract-feats")
-
-            # Index - feature抽出
-            is_active_index = self.use_index and index_rate > 0
-            use_protect = protect < 0.5
-            if self.use_f0 and is_active_index and use_protect:
-                feats_orig = feats.detach().clone()
-
-            if is_active_index:
-                skip_offset = skip_head // 2
-                index_audio = feats[0][skip_offset :]
-
-                # TODO: kは調整できるようにする
-                index_audio = self._search_index(index_audio.float(), 8).unsqueeze(0)
-                if self.is_half:
-                    index_audio = index_audio.half()
-
-                # Recover silent front
-                feats[0][skip_offset :] = index_audio * index_rate + feats[0][skip_offset :] * (1 - index_rate)
-
-            feats = self._upscale(feats)[:, :audio_feats_len, :]
-            if self.use_f0:
-                pitch = pitch[:, -audio_feats_len:]
-                pitchf = pitchf[:, -audio_feats_len:] * (formant_length / return_length)
-                # pitchの推定が上手くいかない(pitchf=0)場合、検索前の特徴を混ぜる
-                # pitchffの作り方の疑問はあるが、本家通りなので、このまま使うことにする。
-                # https://github.com/w-okada/voice-changer/pull/276#issuecomment-1571336929
-                if is_active_index and use_protect:
-                    # FIXME: Another interpolate on feats is a big performance hit.
-                    feats_orig = self._upscale(feats_orig)[:, :audio_feats_len, :]
-                    pitchff = pitchf.detach().clone()
-                    pitchff[pitchf > 0] = 1
-                    pitchff[pitchf < 1] = protect
-                    pitchff = pitchff.unsqueeze(-1)
-                    feats = feats * pitchff + feats_orig * (1 - pitchff)
-
-            p_len = torch.tensor([audio_feats_len], device=self.device, dtype=torch.int64)
-
-            sid = torch.tensor([sid], device=self.device, dtype=torch.int64)
-            t.record("mid-precess")
-            # 推論実行
-            out_audio = self.inferencer.infer(feats, p_len, pitch, pitchf, sid, skip_head, return_length, formant_length).float()
-            t.record("infer")
-
-            # Formant shift sample rate adjustment
-            scaled_window = int(np.floor(formant_factor * self.model_window))
-            if scaled_window != self.model_window:
-                if scaled_window not in self.resamplers:
-                    self.resamplers[scaled_window] = tat.Resample(
-                        orig_freq=scaled_window,
-                        new_freq=self.model_window,
-                        dtype=torch.float32,
-                    ).to(self.device)
-                out_audio = self.resamplers[scaled_window](
-                    out_audio[: return_length * scaled_window]
-                )
+        t = perf_counter_ns()
+        # 16000のサンプリングレートで入ってきている。以降この世界は16000で処理。
+        assert audio.dim() == 1, audio.dim()
+
+        formant_factor = 2 ** (formant_shift / 12)
+        formant_length = int(np.ceil(return_length * formant_factor))
+        t = self.metrics.lap(Stage.PRE_PROCESS, t)
+
+        # ピッチ検出
+        pitch, pitchf = self.extract_pitch(audio[silence_front:], pitch, pitchf, f0_up_key, formant_shift) if self.use_f0 else (None, None)
+        t = self.metrics.lap(Stage.PITCH, t)
+
+        # embedding
+        feats = self.embedder.extract_features(audio.view(1, -1), embOutputLayer, useFinalProj)
+        feats = torch.cat((feats, feats[:, -1:, :]), 1)
+        t = self.metrics.lap(Stage.EMBED, t)
+
+        # Index - feature抽出
+        is_active_index = self.use_index and index_rate > 0
+        use_protect = protect < 0.5
+        if self.use_f0 and is_active_index and use_protect:
+            feats_orig = feats.detach().clone()
+
+        if is_active_index:
+            skip_offset = skip_head // 2
+            index_audio = feats[0][skip_offset :]
+
+            # TODO: kは調整できるようにする
+            index_audio = self._search_index(index_audio.float(), 8).unsqueeze(0)
+            if self.is_half:
+                index_audio = index_audio.half()
+
+            # Recover silent front
+            feats[0][skip_offset :] = index_audio * index_rate + feats[0][skip_offset :] * (1 - index_rate)
+            t = self.metrics.lap(Stage.INDEX, t)
+
+        feats = self._upscale(feats)[:, :audio_feats_len, :]
+        if self.use_f0:
+            pitch = pitch[:, -audio_feats_len:]
+            pitchf = pitchf[:, -audio_feats_len:] * (formant_length / return_length)
+            # pitchの推定が上手くいかない(pitchf=0)場合、検索前の特徴を混ぜる
+            # pitchffの作り方の疑問はあるが、本家通りなので、このまま使うことにする。
+            # https://github.com/w-okada/voice-changer/pull/276#issuecomment-1571336929
+            if is_active_index and use_protect:
+                # FIXME: Another interpolate on feats is a big performance hit.
+                feats_orig = self._upscale(feats_orig)[:, :audio_feats_len, :]
+                pitchff = pitchf.detach().clone()
+                pitchff[pitchf > 0] = 1
+                pitchff[pitchf < 1] = protect
+                pitchff = pitchff.unsqueeze(-1)
+                feats = feats * pitchff + feats_orig * (1 - pitchff)
+
+        p_len = torch.tensor([audio_feats_len], device=self.device, dtype=torch.int64)
+
+        sid = torch.tensor([sid], device=self.device, dtype=torch.int64)
+        # 推論実行
+        out_audio = self.inferencer.infer(feats, p_len, pitch, pitchf, sid, skip_head, return_length, formant_length).float()
+        t = self.metrics.lap(Stage.INFER, t)
+
+        # Formant shift sample rate adjustment
+        scaled_window = int(np.floor(formant_factor * self.model_window))
+        if scaled_window != self.model_window:
+            if scaled_window not in self.resamplers:
+                self.resamplers[scaled_window] = tat.Resample(
+                    orig_freq=scaled_window,
+                    new_freq=self.model_window,
+                    dtype=torch.float32,
+                ).to(self.device)
+            out_audio = self.resamplers[scaled_window](
+                out_audio[: return_length * scaled_window]
+            )
+            self.metrics.lap(Stage.RESAMPLE, t)
         return out_audio
@@ -2,6 +2,7 @@ import os
 import sys
 import faiss
 import faiss.contrib.torch_utils
+import numpy as np
 import torch
 from data.ModelSlot import RVCModelSlot
 
@@ -32,7 +33,9 @@ def createPipeline(params: ServerSettings, modelSlot: RVCModelSlot, f0Detector:
 
     # index, feature
     indexPath = os.path.join(params.model_dir, str(modelSlot.slotIndex), os.path.basename(modelSlot.indexFile))
-    index, index_reconstruct = _loadIndex(indexPath)
+    vectorsFile = modelSlot.artifacts.get('indexVectors')
+    vectorsPath = os.path.join(params.model_dir, str(modelSlot.slotIndex), os.path.basename(vectorsFile)) if vectorsFile else None
+    index, index_reconstruct = _loadIndex(indexPath, vectorsPath)
 
     pipeline = Pipeline(
         embedder,
@@ -48,7 +51,7 @@ def createPipeline(params: ServerSettings, modelSlot: RVCModelSlot, f0Detector:
     return pipeline
 
 
-def _loadIndex(indexPath: str) -> tuple[faiss.Index | None, torch.Tensor | None]:
+def _loadIndex(indexPath: str, vectorsPath: str | None = None) -> tuple[faiss.Index | None, torch.Tensor | None]:
     dev = DeviceManager.get_instance().device
     # Indexのロード
     logger.info("Loading index...")
@@ -63,9 +66,12 @@ def _loadIndex(indexPath: str) -> tuple[faiss.Index | None, torch.Tensor | None]
         if not index.is_trained:
             logger.error("Invalid index. You MUST use added_xxxx.index, not trained_xxxx.index. Index will not be used.")
             return (None, None)
-        # BUG: faiss-gpu does not support reconstruct on GPU indices
-        # https://github.com/facebookresearch/faiss/issues/2181
-        index_reconstruct = index.reconstruct_n(0, index.ntotal).to(dev)
+        index_reconstruct = _loadIndexVectors(vectorsPath, index.ntotal)
+        if index_reconstruct is None:
+            # BUG: faiss-gpu does not support reconstruct on GPU indices
+            # https://github.com/facebookresearch/faiss/issues/2181
+            index_reconstruct = index.reconstruct_n(0, index.ntotal)
+        index_reconstruct = index_reconstruct.to(dev)
         if sys.platform == 'linux' and '+cu' in torch.__version__ and dev.type == 'cuda':
             index: faiss.GpuIndexIVFFlat = faiss.index_cpu_to_gpus_list(index, gpus=[dev.index])
     except Exception as e: # NOQA
@@ -74,3 +80,24 @@ def _loadIndex(indexPath: str) -> tuple[faiss.Index | None, torch.Tensor | None]
         return (None, None)
 
     return index, index_reconstruct
+
+
+def _loadIndexVectors(vectorsPath: str | None, ntotal: int) -> torch.Tensor | None:
+    if vectorsPath is None or not os.path.isfile(vectorsPath):
+        return None
+    # Copy-on-write map, so slots with the same index share the pages on CPU
+    vectors = np.load(vectorsPath, mmap_mode='c')
+    if vectors.ndim != 2 or vectors.shape[0] != ntotal:
+        logger.warning(f"{vectorsPath} does not match the index, reconstructing vectors.")
+        return None
+    return torch.from_numpy(vectors)
+
+
+def export_index_vectors(indexPath: str, output: str):
+    """Saves all vectors of the index, so that loading it does not need to reconstruct them."""
+    index = faiss.read_index(indexPath)
+    vectors = index.reconstruct_n(0, index.ntotal)
+    if isinstance(vectors, torch.Tensor):
+        vectors = vectors.numpy()
+    with open(output, 'wb') as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
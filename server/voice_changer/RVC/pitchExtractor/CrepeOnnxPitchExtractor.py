@@ -1,8 +1,8 @@
 import numpy as np
 import torch
-import onnxruntime
 from const import PitchExtractorType, F0_MIN, F0_MAX
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
+from voice_changer.common.OnnxSession import OnnxSession
 from voice_changer.RVC.pitchExtractor.PitchExtractor import PitchExtractor
 from voice_changer.RVC.pitchExtractor import onnxcrepe
 
@@ -17,9 +17,7 @@ class CrepeOnnxPitchExtractor(PitchExtractor):
             onnxProviderOptions,
         ) = DeviceManager.get_instance().get_onnx_execution_provider()
 
-        self.onnx_session = onnxruntime.InferenceSession(
-            file, providers=onnxProviders, provider_options=onnxProviderOptions
-        )
+        self.onnx_session = OnnxSession(type, file, onnxProviders, onnxProviderOptions)
 
     def extract(
         self,
@@ -40,8 +38,8 @@ class CrepeOnnxPitchExtractor(PitchExtractor):
             decoder=onnxcrepe.decode.weighted_argmax,
         )
 
-        f0: np.ndarray = onnxcrepe.filter.median(onnx_f0, 3)
-        pd: np.ndarray = onnxcrepe.filter.median(onnx_pd, 3)
+        # Filter pitch and periodicity in one pass
+        f0, pd = onnxcrepe.filter.median(np.concatenate((onnx_f0, onnx_pd)), 3)
 
         f0[pd < 0.1] = 0
         return torch.as_tensor(f0, dtype=torch.float32, device=audio.device).squeeze()
@@ -1,10 +1,10 @@
 import numpy as np
 import torch
-import onnxruntime
 from const import PitchExtractorType
 from voice_changer.RVC.pitchExtractor.PitchExtractor import PitchExtractor
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
 from voice_changer.common.OnnxLoader import load_onnx_model
+from voice_changer.common.OnnxSession import OnnxSession
 from voice_changer.common.MelExtractorFcpe import Wav2MelModule
 
 class FcpeOnnxPitchExtractor(PitchExtractor):
@@ -30,9 +30,6 @@ class FcpeOnnxPitchExtractor(PitchExtractor):
 
         self.threshold = np.array(0.006, dtype=self.fp_dtype_np)
 
-        so = onnxruntime.SessionOptions()
-        # so.log_severity_level = 3
-        # so.enable_profiling = True
         self.mel_extractor = Wav2MelModule(
             sr=16000,
             n_mels=128,
@@ -44,7 +41,13 @@ class FcpeOnnxPitchExtractor(PitchExtractor):
             clip_val=1e-05,
             is_half=self.is_half
         ).to(device_manager.device)
-        self.onnx_session = onnxruntime.InferenceSession(model.SerializeToString(), sess_options=so, providers=onnxProviders, provider_options=onnxProviderOptions)
+        self.onnx_session = OnnxSession(
+            self.type,
+            model.SerializeToString(),
+            onnxProviders,
+            onnxProviderOptions,
+            reload=lambda: load_onnx_model(file, self.is_half).SerializeToString(),
+        )
 
     def extract(
         self,
@@ -73,6 +76,5 @@ class FcpeOnnxPitchExtractor(PitchExtractor):
                     "threshold": self.threshold,
                 },
             )
-        # self.onnx_session.end_profiling()
 
         return torch.as_tensor(output[0], dtype=self.fp_dtype_t, device=audio.device).squeeze()
\ No newline at end of file
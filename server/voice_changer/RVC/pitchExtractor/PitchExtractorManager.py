@@ -8,6 +8,7 @@ from voice_changer.RVC.pitchExtractor.RMVPEPitchExtractor import RMVPEPitchExtra
 from voice_changer.RVC.pitchExtractor.FcpePitchExtractor import FcpePitchExtractor
 from voice_changer.RVC.pitchExtractor.FcpeOnnxPitchExtractor import FcpeOnnxPitchExtractor
 from settings import ServerSettings
+from voice_changer.utils.Metrics import Counter, StageMetrics
 import logging
 logger = logging.getLogger(__name__)
 
@@ -30,8 +31,10 @@ class PitchExtractorManager(Protocol):
             and pitch_extractor == cls.pitch_extractor.type \
             and not force_reload:
             logger.info('Reusing pitch extractor.')
+            StageMetrics.get_instance().inc(Counter.PITCH_EXTRACTOR_CACHE_HIT)
             return cls.pitch_extractor
 
+        StageMetrics.get_instance().inc(Counter.PITCH_EXTRACTOR_CACHE_MISS)
         logger.info(f'Loading pitch extractor {pitch_extractor}')
         try:
             if pitch_extractor == 'crepe_tiny':
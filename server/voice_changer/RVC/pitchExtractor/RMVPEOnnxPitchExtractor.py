@@ -1,11 +1,12 @@
 import numpy as np
 import torch
-import onnxruntime
 from const import PitchExtractorType
 from voice_changer.common.OnnxLoader import load_onnx_model
+from voice_changer.common.OnnxSession import OnnxSession
 from voice_changer.RVC.pitchExtractor.PitchExtractor import PitchExtractor
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
 from voice_changer.common.MelExtractor import MelSpectrogram
+from voice_changer.common.PitchDecoder import LocalWeightedDecoder, crepe_cents_table, cents_to_frequency
 
 class RMVPEOnnxPitchExtractor(PitchExtractor):
 
@@ -28,13 +29,22 @@ class RMVPEOnnxPitchExtractor(PitchExtractor):
 
         self.threshold = np.array(0.05, dtype=self.fp_dtype_np)
 
-        so = onnxruntime.SessionOptions()
-        # so.log_severity_level = 3
-        # so.enable_profiling = True
         self.mel_extractor = MelSpectrogram(
             self.is_half, 128, 16000, 1024, 160, mel_fmin=30, mel_fmax=8000
         ).to(device_manager.device)
-        self.onnx_session = onnxruntime.InferenceSession(model.SerializeToString(), sess_options=so, providers=onnxProviders, provider_options=onnxProviderOptions)
+        self.onnx_session = OnnxSession(
+            self.type,
+            model.SerializeToString(),
+            onnxProviders,
+            onnxProviderOptions,
+            reload=lambda: load_onnx_model(file, self.is_half).SerializeToString(),
+        )
+
+        # Models exported without the decoder output raw bin activations.
+        self.output_name = self.onnx_session.get_outputs()[0].name
+        self.decode_in_graph = self.output_name == 'pitchf'
+        if not self.decode_in_graph:
+            self.decoder = LocalWeightedDecoder(crepe_cents_table()).to(device_manager.device)
 
     def extract(
         self,
@@ -48,21 +58,22 @@ class RMVPEOnnxPitchExtractor(PitchExtractor):
             binding = self.onnx_session.io_binding()
 
             binding.bind_input('mel', device_type='cuda', device_id=audio.device.index, element_type=self.fp_dtype_np, shape=tuple(mel.shape), buffer_ptr=mel.data_ptr())
-            binding.bind_cpu_input('threshold', self.threshold)
+            if self.decode_in_graph:
+                binding.bind_cpu_input('threshold', self.threshold)
 
-            binding.bind_output('pitchf', device_type='cuda', device_id=audio.device.index)
+            binding.bind_output(self.output_name, device_type='cuda', device_id=audio.device.index)
 
             self.onnx_session.run_with_iobinding(binding)
 
             output = [output.numpy() for output in binding.get_outputs()]
         else:
-            output: list[np.ndarray] = self.onnx_session.run(
-                ["pitchf"],
-                {
-                    "mel": mel.detach().cpu().numpy(),
-                    "threshold": self.threshold,
-                },
-            )
-        # self.onnx_session.end_profiling()
+            inputs = {"mel": mel.detach().cpu().numpy()}
+            if self.decode_in_graph:
+                inputs["threshold"] = self.threshold
+            output: list[np.ndarray] = self.onnx_session.run([self.output_name], inputs)
 
-        return torch.as_tensor(output[0], dtype=self.fp_dtype_t, device=audio.device).squeeze()
\ No newline at end of file
+        res = torch.as_tensor(output[0], dtype=self.fp_dtype_t, device=audio.device)
+        if not self.decode_in_graph:
+            cents, confidence = self.decoder(res)
+            res = cents_to_frequency(cents) * (confidence >= self.threshold.item())
+        return res.squeeze()
\ No newline at end of file
@@ -133,8 +133,7 @@ def preprocess(audio: np.ndarray,
         frames (numpy.ndarray [shape=(1 + int(time // precision), 1024)])
     """
     # Resample
-    if sample_rate != SAMPLE_RATE:
-        audio = librosa.resample(audio, orig_sr=sample_rate, target_sr=SAMPLE_RATE)
+    audio = resample(audio, sample_rate)
 
     # Default hop length of 10 ms
     hop_length = SAMPLE_RATE / 100 if precision is None else SAMPLE_RATE * precision / 1000
@@ -253,4 +252,6 @@ def periodicity(probabilities: np.ndarray, bins: np.ndarray):
 
 def resample(audio: np.ndarray, sample_rate: int):
     """Resample audio"""
+    if sample_rate == onnxcrepe.SAMPLE_RATE:
+        return audio
     return librosa.resample(audio, orig_sr=sample_rate, target_sr=onnxcrepe.SAMPLE_RATE)
@@ -1,5 +1,7 @@
-import librosa
 import numpy as np
+import torch
+
+from voice_changer.common.PitchDecoder import LocalWeightedDecoder, crepe_cents_table
 
 from voice_changer.RVC.pitchExtractor import onnxcrepe
 
@@ -26,22 +28,13 @@ def weighted_argmax(logits: np.ndarray):
 
 def viterbi(logits: np.ndarray):
     """Sample observations using viterbi decoding"""
-    # Create viterbi transition matrix
-    if not hasattr(viterbi, 'transition'):
-        xx, yy = np.meshgrid(range(360), range(360))
-        transition = np.maximum(12 - abs(xx - yy), 0)
-        transition = transition / transition.sum(axis=1, keepdims=True)
-        viterbi.transition = transition
-
     # Normalize logits (softmax)
-    logits -= logits.max(axis=1)
+    logits = logits - logits.max(axis=1, keepdims=True)
     exp = np.exp(logits)
-    probs = exp / np.sum(exp, axis=1)
+    probs = exp / np.sum(exp, axis=1, keepdims=True)
 
-    # Perform viterbi decoding
-    bins = np.array([
-        librosa.sequence.viterbi(sequence, viterbi.transition)
-        for sequence in probs], dtype=np.int64)
+    # Perform viterbi decoding, shape=(batch, time)
+    bins = _banded_viterbi(probs.transpose(0, 2, 1))
 
     # Convert to frequency in Hz
     return bins, onnxcrepe.convert.bins_to_frequency(bins)
@@ -54,27 +47,73 @@ def weighted_viterbi(logits):
     return bins, _apply_weights(logits, bins)
 
 
-def _apply_weights(logits, bins):
-    # Find bounds of analysis window
-    start = np.maximum(0, bins - 4)
-    end = np.minimum(logits.shape[1], bins + 5)
+def _banded_log_transition(n_bins: int, width: int):
+    """Log transition probabilities as a band, shape=(n_bins, 2 * width - 1).
+
+    Entry [j, k] is the transition from bin j + k - (width - 1) to bin j.
+    Transitions are non-zero only within width - 1 bins.
+    """
+    offsets = np.arange(-(width - 1), width)
+    band = np.maximum(width - np.abs(offsets), 0).astype(np.float64)
+    source = np.arange(n_bins)[:, None] + offsets[None, :]
+    valid = (source >= 0) & (source < n_bins)
+
+    # Normalize over the outgoing transitions of each source bin
+    row_sum = np.zeros(n_bins)
+    np.add.at(row_sum, source[valid], np.broadcast_to(band, source.shape)[valid])
+
+    with np.errstate(divide='ignore'):
+        log_band = np.log(band[None, :] / row_sum[np.clip(source, 0, n_bins - 1)])
+    log_band[~valid] = -np.inf
+    return log_band
+
+
+_LOG_TRANSITION = _banded_log_transition(360, 12)
+
+
+def _banded_viterbi(probs: np.ndarray):
+    """Viterbi decoding with a banded transition matrix.
+
+    Equivalent to librosa.sequence.viterbi with a uniform initial
+    distribution, vectorized over batch and pitch bins.
+
+    Arguments
+        probs (numpy.ndarray [shape=(batch, time, n_bins)])
+
+    Returns
+        states (numpy.ndarray [shape=(batch, time)])
+    """
+    batch, n_frames, n_bins = probs.shape
+    half = _LOG_TRANSITION.shape[1] // 2
+    log_prob = np.log(probs + np.finfo(probs.dtype).tiny)
+
+    ptr = np.empty((n_frames, batch, n_bins), dtype=np.int64)
+    padded = np.full((batch, n_bins + 2 * half), -np.inf)
+    padded[:, half:-half] = log_prob[:, 0] - np.log(n_bins)
+    window = np.lib.stride_tricks.sliding_window_view(padded, 2 * half + 1, axis=1)  # view on padded
+    bins = np.arange(n_bins)
+    for t in range(1, n_frames):
+        scores = window + _LOG_TRANSITION  # shape=(batch, n_bins, band)
+        best = scores.argmax(axis=2)
+        ptr[t] = bins + best - half
+        padded[:, half:-half] = np.take_along_axis(scores, best[..., None], axis=2)[..., 0] + log_prob[:, t]
+
+    # Backtrack
+    states = np.empty((batch, n_frames), dtype=np.int64)
+    states[:, -1] = padded[:, half:-half].argmax(axis=1)
+    for t in range(n_frames - 1, 0, -1):
+        states[:, t - 1] = np.take_along_axis(ptr[t], states[:, t, None], axis=1)[:, 0]
+    return states
 
-    # Mask out everything outside of window
-    for batch in range(logits.shape[0]):
-        for time in range(logits.shape[2]):
-            logits[batch, :start[batch, time], time] = float('-inf')
-            logits[batch, end[batch, time]:, time] = float('-inf')
 
-    # Construct weights
-    if not hasattr(_apply_weights, 'weights'):
-        weights = onnxcrepe.convert.bins_to_cents(np.arange(360))
-        _apply_weights.weights = weights[None, :, None]
+_WEIGHTED_DECODER = LocalWeightedDecoder(crepe_cents_table(360))
 
-    # Convert to probabilities (ReLU)
-    probs = np.maximum(0, logits)
 
-    # Apply weights
-    cents = (_apply_weights.weights * probs).sum(axis=1) / probs.sum(axis=1)
+def _apply_weights(logits: np.ndarray, bins: np.ndarray):
+    # shape=(batch, time, 360), only the window around each bin is read
+    hidden = torch.from_numpy(logits).transpose(1, 2)
+    center = torch.from_numpy(bins.astype(np.int64, copy=False))[..., None]
+    cents, _ = _WEIGHTED_DECODER(hidden, center)
 
     # Convert to frequency in Hz
-    return onnxcrepe.convert.cents_to_frequency(cents)
+    return onnxcrepe.convert.cents_to_frequency(cents.numpy())
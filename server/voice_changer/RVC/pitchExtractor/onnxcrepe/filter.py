@@ -44,82 +44,63 @@ def median(signals, win_length):
 def nanfilter(signals, win_length, filter_fn):
     """Filters a sequence, ignoring nan values
 
+    Windows are truncated at the edges of the signal. This is done by
+    padding with nans and filtering strided windows in one call.
+
     Arguments
         signals (numpy.ndarray (shape=(batch, time)))
             The signals to filter
         win_length
             The size of the analysis window
         filter_fn (function)
-            The function to use for filtering
+            The function to use for filtering, reduces the last axis
 
     Returns
         filtered (numpy.ndarray (shape=(batch, time)))
     """
-    # Output buffer
-    filtered = np.empty_like(signals)
-
-    # Loop over frames
-    for i in range(signals.shape[1]):
+    half = win_length // 2
+    padded = np.pad(signals, ((0, 0), (half, half)), constant_values=np.nan)
 
-        # Get analysis window bounds
-        start = max(0, i - win_length // 2)
-        end = min(signals.shape[1], i + win_length // 2 + 1)
+    # shape=(batch, time, win_length), no copy
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * half + 1, axis=1)
 
-        # Apply filter to window
-        filtered[:, i] = filter_fn(signals[:, start:end])
-
-    return filtered
+    return filter_fn(windows).astype(signals.dtype, copy=False)
 
 
 def nanmean(signals):
-    """Computes the mean, ignoring nans
+    """Computes the mean over the last axis, ignoring nans
 
     Arguments
-        signals (numpy.ndarray [shape=(batch, time)])
+        signals (numpy.ndarray [shape=(..., time)])
             The signals to filter
 
     Returns
-        filtered (numpy.ndarray [shape=(batch, time)])
+        filtered (numpy.ndarray [shape=(...)])
     """
-    signals = signals.clone()
-
     # Find nans
     nans = np.isnan(signals)
 
-    # Set nans to 0.
-    signals[nans] = 0.
-
-    # Compute average
-    return signals.sum(axis=1) / (~nans).astype(np.float32).sum(axis=1)
+    # Compute average with nans set to 0.
+    return np.where(nans, 0., signals).sum(axis=-1) / (~nans).sum(axis=-1)
 
 
 def nanmedian(signals):
-    """Computes the median, ignoring nans
+    """Computes the median over the last axis, ignoring nans.
+    If all values are nan, returns nan.
 
     Arguments
-        signals (numpy.ndarray [shape=(batch, time)])
+        signals (numpy.ndarray [shape=(..., time)])
             The signals to filter
 
     Returns
-        filtered (numpy.ndarray [shape=(batch, time)])
-    """
-    # Find nans
-    nans = np.isnan(signals)
-
-    # Compute median for each slice
-    medians = [nanmedian1d(signal[~nan]) for signal, nan in zip(signals, nans)]
-
-    # Stack results
-    return np.array(medians, dtype=signals.dtype)
-
-
-def nanmedian1d(signal):
-    """Computes the median. If signal is empty, returns torch.nan
-
-    Arguments
-        signal (numpy.ndarray [shape=(time,)])
-
-    Returns
-        median (numpy.ndarray [shape=(1,)])
+        filtered (numpy.ndarray [shape=(...)])
     """
-    return np.median(signal) if signal.size else np.nan
+    # Sorting moves nans to the end of each window
+    ordered = np.sort(signals, axis=-1)
+    count = (~np.isnan(ordered)).sum(axis=-1, keepdims=True)
+
+    lower = np.take_along_axis(ordered, np.maximum(count - 1, 0) // 2, axis=-1)
+    upper = np.take_along_axis(ordered, count // 2, axis=-1)
+    median = (lower + upper) / 2
+    median[count == 0] = np.nan
+    return median[..., 0]
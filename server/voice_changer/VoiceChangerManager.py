@@ -1,23 +1,32 @@
+import asyncio
 import json
 import os
 import sys
-import shutil
 import threading
 import numpy as np
-from downloader.SampleDownloader import downloadSample, getSampleInfos
+from downloader.SampleDownloader import downloadInitialSamples, downloadSample, getSampleInfosJson
+from downloader.WeightDownloader import downloadWeight
 import logging
 from voice_changer.Local.ServerDevice import ServerDevice, ServerDeviceCallbacks
 from voice_changer.ModelSlotManager import ModelSlotManager
+from voice_changer.RVC.RVCArtifactBuilder import RVCArtifactBuilder
 from voice_changer.RVC.RVCModelMerger import RVCModelMerger
+from voice_changer.RVC.onnxExporter.OnnxExportQueue import OnnxExportQueue
 from const import STORED_SETTING_FILE, UPLOAD_DIR
 from voice_changer.VoiceChangerSettings import VoiceChangerSettings
+from voice_changer.common.ArtifactManifest import clear_directory, get_recorded_hash, move_file
+from voice_changer.common.BlobStore import BlobStore
 from voice_changer.VoiceChangerV2 import VoiceChangerV2
 from voice_changer.utils.LoadModelParams import LoadModelParamFile, LoadModelParams
 from voice_changer.utils.ModelMerger import MergeElement, ModelMergerRequest
 from voice_changer.utils.VoiceChangerModel import AudioInOut
 from settings import ServerSettings
 from voice_changer.common.deviceManager.DeviceManager import DeviceManager
+from voice_changer.utils.Metrics import Counter, StageMetrics
+from voice_changer.utils.SettingsStore import SettingsStore
+from voice_changer.utils.StartupState import StartupState
 from Exceptions import (
+    ModelBlendException,
     PipelineNotInitializedException,
     VoiceChangerIsNotSelectedException,
 )
@@ -30,6 +39,10 @@ from voice_changer.RVC.RVCModelSlotGenerator import RVCModelSlotGenerator  # 起
 
 logger = logging.getLogger(__name__)
 
+# Chunks converted before the server reports ready, so that the first real
+# chunk does not pay for lazy initialization (ORT sessions, CUDA kernels, ...)
+WARMUP_CHUNKS = 2
+
 
 class VoiceChangerManager(ServerDeviceCallbacks):
     _instance = None
@@ -51,8 +64,13 @@ class VoiceChangerManager(ServerDeviceCallbacks):
         self.params = params
         self.voiceChanger: VoiceChangerV2 = None
         self.voiceChangerModel = None
+        self.startup_state = StartupState.get_instance()
+        self.startup_task: asyncio.Task | None = None
+        # Serializes loading the model at startup and setting updates that reinitialize it
+        self.model_lock = threading.RLock()
 
         self.modelSlotManager = ModelSlotManager.get_instance(self.params.model_dir)
+        self.blob_store = BlobStore.get_instance(self.params.model_dir)
         # スタティックな情報を収集
 
         self.settings = VoiceChangerSettings()
@@ -62,24 +80,24 @@ class VoiceChangerManager(ServerDeviceCallbacks):
             self.settings.set_properties(settings)
         except:
             pass
+        self.settings_store = SettingsStore(STORED_SETTING_FILE, self.settings.to_dict_stateless)
 
         self.device_manager = DeviceManager.get_instance()
+        self.metrics = StageMetrics.get_instance()
         self.devices = self.device_manager.list_devices()
         self.device_manager.initialize(self.settings.gpu, self.settings.forceFp32, self.settings.disableJit)
 
         self.serverDevice = ServerDevice(self, self.settings)
 
-        thread = threading.Thread(target=self.serverDevice.start, args=())
+        # Daemon so that headless users (f.e., benchmarks) can exit without stopping the device loop
+        thread = threading.Thread(target=self.serverDevice.start, args=(), daemon=True)
         thread.start()
 
         logger.info("Initialized.")
 
-        # Initialize the voice changer
-        self.initialize(self.settings.modelSlotIndex)
-
     def store_setting(self):
-        with open(STORED_SETTING_FILE, "w") as f:
-            json.dump(self.settings.to_dict_stateless(), f)
+        # Written in the background once updates settle
+        self.settings_store.mark_dirty()
 
     @classmethod
     def get_instance(cls, params: ServerSettings):
@@ -87,6 +105,72 @@ class VoiceChangerManager(ServerDeviceCallbacks):
             cls._instance = cls(params)
         return cls._instance
 
+    async def begin_startup(self):
+        """Starts loading in the background, so that the server can accept connections right away."""
+        if self.startup_task is None:
+            self.startup_task = asyncio.ensure_future(self.startup())
+
+    async def startup(self):
+        """
+        Downloads weights and initial samples, loads the selected model slot
+        and warms it up. Audio is rejected until this is done.
+        """
+        try:
+            self.startup_state.set_stage('downloading_weights')
+            await downloadWeight(self.params, self.startup_state.set_progress)
+
+            self.startup_state.set_stage('downloading_samples')
+            try:
+                await downloadInitialSamples(self.params.sample_mode, self.params.model_dir)
+            except Exception as e:
+                logger.error("Failed to download samples.")
+                logger.exception(e)
+            self.modelSlotManager.getAllSlotInfo(reload=True)
+            await asyncio.to_thread(self.blob_store.collect)
+
+            await asyncio.to_thread(self.prepare_model)
+        except Exception as e:
+            logger.error("Failed to start the voice changer.")
+            logger.exception(e)
+            self.startup_state.fail(str(e))
+
+    def prepare_model(self):
+        """Loads and warms up the selected model slot, then marks the voice changer ready."""
+        # Setting updates wait until the model is ready, so the slot cannot change meanwhile
+        # and updates that reinitialize the model do not run during its first load.
+        with self.model_lock:
+            self.startup_state.set_stage('loading_model')
+            self.load_slot(self.settings.modelSlotIndex)
+            if self.voiceChanger is not None:
+                self.startup_state.set_stage('warming_up')
+                self.warmup()
+            self.startup_state.set_stage('ready')
+
+    def load_slot(self, slot: int):
+        """
+        Initializes the model of the slot. If it fails to load (f.e., a corrupt
+        model or out of memory), the voice changer runs without a model, so
+        that another slot can be selected.
+        """
+        try:
+            self.initialize(slot)
+        except Exception as e:
+            logger.error(f"Failed to load model slot {slot}.")
+            logger.exception(e)
+            self.voiceChanger = None
+            self.voiceChangerModel = None
+
+    def warmup(self):
+        block = np.zeros(self.voiceChanger.block_frame, dtype=np.float32)
+        try:
+            for _ in range(WARMUP_CHUNKS):
+                with self.device_manager.lock:
+                    self.voiceChanger.on_request(block)
+        except Exception as e:
+            # The model may still work with other settings, it is reported when audio is sent
+            logger.warning("Failed to warm up the voice changer.")
+            logger.exception(e)
+
     async def load_model(self, params: LoadModelParams):
         if params.isSampleMode:
             # サンプルダウンロード
@@ -102,8 +186,15 @@ class VoiceChangerManager(ServerDeviceCallbacks):
             self.params.model_dir,
             str(params.slot),
         )
+        # Files uploaded in chunks are already in the slot directory and stay there
+        uploaded: set[str] = set()
+        for file in params.files:
+            srcPath = os.path.join(UPLOAD_DIR, file.dir, file.name)
+            dstPath = os.path.abspath(os.path.join(slotDir, file.dir, file.name))
+            if not os.path.exists(srcPath) and get_recorded_hash(dstPath) is not None:
+                uploaded.add(dstPath)
         if os.path.isdir(slotDir):
-            shutil.rmtree(slotDir)
+            clear_directory(slotDir, uploaded)
 
         for file in params.files:
             logger.info(f"FILE: {file}")
@@ -114,27 +205,45 @@ class VoiceChangerManager(ServerDeviceCallbacks):
                 file.dir,
             )
             dstPath = os.path.join(dstDir, file.name)
+            if os.path.abspath(dstPath) in uploaded:
+                logger.info(f"Using uploaded {dstPath}")
+                continue
             os.makedirs(dstDir, exist_ok=True)
             logger.info(f"Moving {srcPath} -> {dstPath}")
-            shutil.move(srcPath, dstPath)
+            move_file(srcPath, dstPath)
             file.name = os.path.basename(dstPath)
 
         # メタデータ作成(各VCで定義)
         if params.voiceChangerType == "RVC":
             slotInfo = RVCModelSlotGenerator.load_model(params)
             self.modelSlotManager.save_model_slot(params.slot, slotInfo)
+            await asyncio.to_thread(self._share_slot_files, params.slot, [slotInfo.modelFile, slotInfo.indexFile])
+            await asyncio.to_thread(RVCArtifactBuilder.get_instance(self.params).submit, params.slot)
+        # Files of the replaced model may no longer be used by any slot
+        await asyncio.to_thread(self.blob_store.collect)
 
         logger.info(f"params, {params}")
 
+    def _share_slot_files(self, slot: int, files: list[str | None]):
+        # Identical models and indexes of other slots are stored once
+        slotDir = os.path.join(self.params.model_dir, str(slot))
+        for file in files:
+            if not file:
+                continue
+            path = os.path.join(slotDir, os.path.basename(file))
+            if os.path.isfile(path):
+                self.blob_store.add(path)
+
     def get_info(self):
         data = self.settings.to_dict()
         data["gpus"] = self.devices
-        data["modelSlots"] = self.modelSlotManager.getAllSlotInfo(reload=True)
-        data["sampleModels"] = getSampleInfos(self.params.sample_mode)
+        data["modelSlots"] = self.modelSlotManager.getAllSlotInfoJson(reload=True)
+        data["sampleModels"] = getSampleInfosJson(self.params.sample_mode)
         data["python"] = sys.version
         data["voiceChangerParams"] = self.params
 
         data["status"] = "OK"
+        data["startup"] = self.startup_state.get_status()
 
         info = self.serverDevice.get_info()
         data.update(info)
@@ -174,20 +283,43 @@ class VoiceChangerManager(ServerDeviceCallbacks):
             logger.error(f"Unknown voice changer model: {slotInfo.voiceChangerType}")
 
     def update_settings(self, key: str, val: Any):
+        self._update_setting(key, val)
+        return self.get_info()
+
+    def update_settings_batch(self, updates: dict[str, Any]):
+        """Applies several settings at once and returns only the settings that changed."""
+        before = self.settings.to_dict()
+        for key, val in updates.items():
+            self._update_setting(key, val)
+        after = self.settings.to_dict()
+        return {
+            "status": "OK",
+            "changed": {key: val for key, val in after.items() if before.get(key) != val},
+        }
+
+    def _update_setting(self, key: str, val: Any):
+        # Waits for the model that is being loaded at startup
+        with self.model_lock:
+            self._apply_setting(key, val)
+
+    def _apply_setting(self, key: str, val: Any):
         logger.info(f"update configuration {key}: {val}")
         error, old_value = self.settings.set_property(key, val)
         if error:
-            return self.get_info()
+            return
         # TODO: This is required to get type-casted setting. But maybe this should be done prior to setting.
         val = self.settings.get_property(key)
         if old_value == val:
-            return self.get_info()
-        # TODO: Storing settings on each change is suboptimal. Maybe timed autosave?
+            return
         self.store_setting()
 
         if key == "modelSlotIndex":
             logger.info(f"Model slot is changed {old_value} -> {val}")
-            self.initialize(val)
+            # Blend ratios refer to the previous slot, which has no weight in them
+            self.settings.blendRatios = {}
+            # Until startup is done, the selected slot is loaded by prepare_model
+            if self.startup_state.ready:
+                self.load_slot(val)
         elif key == 'gpu':
             self.device_manager.set_device(val)
         elif key == 'forceFp32':
@@ -200,22 +332,33 @@ class VoiceChangerManager(ServerDeviceCallbacks):
         # Revert change in case we switched back to client audio mode.
         elif key == 'enableServerAudio':
             if val:
-                self.update_settings('inputSampleRate', self.settings.serverAudioSampleRate)
-                self.update_settings('outputSampleRate', self.settings.serverAudioSampleRate)
+                self._update_setting('inputSampleRate', self.settings.serverAudioSampleRate)
+                self._update_setting('outputSampleRate', self.settings.serverAudioSampleRate)
             else:
-                self.update_settings('inputSampleRate', 48000)
-                self.update_settings('outputSampleRate', 48000)
+                self._update_setting('inputSampleRate', 48000)
+                self._update_setting('outputSampleRate', 48000)
         elif key == 'serverAudioSampleRate':
-            self.update_settings('inputSampleRate', self.settings.serverAudioSampleRate)
-            self.update_settings('outputSampleRate', self.settings.serverAudioSampleRate)
+            self._update_setting('inputSampleRate', self.settings.serverAudioSampleRate)
+            self._update_setting('outputSampleRate', self.settings.serverAudioSampleRate)
 
         self.serverDevice.update_settings(key, val, old_value)
         if self.voiceChanger is not None:
-            self.voiceChanger.update_settings(key, val, old_value)
-
-        return self.get_info()
+            try:
+                self.voiceChanger.update_settings(key, val, old_value)
+            except ModelBlendException as e:
+                logger.exception(e)
+                # The live model keeps its weights, so the setting is reverted
+                self.settings.blendRatios = old_value
+                self.emitTo(0, [0, 0, 0], ('ModelBlendException', str(e)))
 
     def changeVoice(self, receivedData: AudioInOut) -> tuple[AudioInOut, tuple, tuple | None]:
+        if not self.startup_state.ready:
+            self.metrics.inc(Counter.CHUNKS_DROPPED)
+            status = self.startup_state.get_status()
+            if status['stage'] == 'failed':
+                return np.zeros(1, dtype=np.float32), 0, [0, 0, 0], ('ServerStartupFailed', f"Voice changer failed to start: {status['error']}")
+            return np.zeros(1, dtype=np.float32), 0, [0, 0, 0], ('ServerNotReady', f"Voice changer is starting ({status['stage']}). Try again later.")
+
         if self.settings.passThrough:  # パススルー
             vol = float(np.sqrt(
                 np.square(receivedData).mean(dtype=np.float32)
@@ -224,25 +367,33 @@ class VoiceChangerManager(ServerDeviceCallbacks):
 
         if self.voiceChanger is None:
             logger.error("Voice Change is not loaded. Did you load a correct model?")
+            self.metrics.inc(Counter.CHUNKS_DROPPED)
             return np.zeros(1, dtype=np.float32), 0, [0, 0, 0], ('NoVoiceChangerLoaded', "Voice Change is not loaded. Did you load a correct model?")
 
         try:
             with self.device_manager.lock:
                 audio, vol, perf = self.voiceChanger.on_request(receivedData)
+            self.metrics.inc(Counter.CHUNKS_PROCESSED)
             return audio, vol, perf, None
         except VoiceChangerIsNotSelectedException as e:
             logger.exception(e)
+            self.metrics.inc(Counter.CHUNKS_DROPPED)
             return np.zeros(1, dtype=np.float32), 0, [0, 0, 0], ('VoiceChangerIsNotSelectedException', format_exc())
         except PipelineNotInitializedException as e:
             logger.exception(e)
+            self.metrics.inc(Counter.CHUNKS_DROPPED)
             return np.zeros(1, dtype=np.float32), 0, [0, 0, 0], ('PipelineNotInitializedException', format_exc())
         except Exception as e:
             logger.exception(e)
+            self.metrics.inc(Counter.CHUNKS_DROPPED)
             return np.zeros(1, dtype=np.float32), 0, [0, 0, 0], ('Exception', format_exc())
 
     def export2onnx(self):
         return self.voiceChanger.export2onnx()
 
+    def get_onnx_export_jobs(self):
+        return {"status": "OK", "jobs": OnnxExportQueue.get_instance(self.params.model_dir).get_jobs()}
+
     async def merge_models(self, request: str):
         # self.voiceChanger.merge_models(request)
         req = json.loads(request)
@@ -259,6 +410,10 @@ class VoiceChangerManager(ServerDeviceCallbacks):
     def setEmitTo(self, emitTo: Callable[[Any], None]):
         self.emitToFunc = emitTo
 
+    def refresh_audio_devices(self):
+        self.serverDevice.refresh_devices()
+        return self.get_info()
+
     def update_model_default(self):
         # self.voiceChanger.update_model_default()
         current_settings = self.voiceChangerModel.get_model_current()
@@ -1,4 +1,5 @@
 # from const import PitchExtractorType
+import json
 from typing import NamedTuple
 
 import logging
@@ -324,6 +325,8 @@ class VoiceChangerSettings:
     _indexRatio: float = 0
     _protect: float = 0.5
     _silenceFront: int = 1
+    # Slot index -> ratio of the models blended into the live model
+    _blendRatios: dict[int, float] = {}
 
     @property
     def dstId(self):
@@ -396,3 +399,13 @@ class VoiceChangerSettings:
     @silenceFront.setter
     def silenceFront(self, enable: str):
         self._silenceFront = int(enable)
+
+    @property
+    def blendRatios(self):
+        return self._blendRatios
+
+    @blendRatios.setter
+    def blendRatios(self, ratios: str | dict):
+        if isinstance(ratios, str):
+            ratios = json.loads(ratios) if ratios else {}
+        self._blendRatios = {int(slot): float(ratio) for slot, ratio in ratios.items()}
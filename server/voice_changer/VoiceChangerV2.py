@@ -4,12 +4,14 @@ from const import TMP_DIR
 from torch.functional import F
 import torch
 import os
+from time import perf_counter_ns
 import numpy as np
 import logging
 
 from voice_changer.IORecorder import IORecorder
 from voice_changer.VoiceChangerSettings import VoiceChangerSettings
-from voice_changer.utils.Timer import Timer2
+from voice_changer.utils.Metrics import Stage, StageMetrics
+from voice_changer.utils.Profiler import Profiler
 from voice_changer.utils.VoiceChangerIF import VoiceChangerIF
 from voice_changer.utils.VoiceChangerModel import AudioInOutFloat, VoiceChangerModel
 from Exceptions import (
@@ -36,6 +38,8 @@ class VoiceChangerV2(VoiceChangerIF):
         self.voiceChangerModel: VoiceChangerModel | None = None
         self.params = params
         self.device_manager = DeviceManager.get_instance()
+        self.metrics = StageMetrics.get_instance()
+        self.profiler = Profiler.get_instance()
         self.sola_buffer: torch.Tensor | None = None
         self.ioRecorder: IORecorder | None = None
 
@@ -135,6 +139,7 @@ class VoiceChangerV2(VoiceChangerIF):
             # In case there's an actual silence - send full block with zeros
             return np.zeros(block_size, dtype=np.float32), vol
 
+        t = perf_counter_ns()
         # SOLA algorithm from https://github.com/yxlllc/DDSP-SVC, https://github.com/liujing04/Retrieval-based-Voice-Conversion-WebUI
         conv_input = audio[
             None, None, : self.crossfade_frame + self.sola_search_frame
@@ -157,17 +162,33 @@ class VoiceChangerV2(VoiceChangerIF):
 
         self.sola_buffer[:] = audio[block_size : block_size + self.crossfade_frame]
 
-        return audio[: block_size].detach().cpu().numpy(), vol
+        result = audio[: block_size].detach().cpu().numpy()
+        self.metrics.lap(Stage.SOLA, t)
+        return result, vol
 
     @torch.no_grad()
     def on_request(self, audio_in: AudioInOutFloat) -> tuple[AudioInOutFloat, list[Union[int, float]]]:
         if self.voiceChangerModel is None:
             raise VoiceChangerIsNotSelectedException("Voice Changer is not selected.")
 
-        with Timer2("main-process", True) as t:
-            result, vol = self.process_audio(audio_in)
+        if self.profiler.active:
+            self.profiler.on_chunk_start()
 
-        mainprocess_time = t.secs
+        t = perf_counter_ns()
+        try:
+            result, vol = self.process_audio(audio_in)
+        except BaseException:
+            # Stages of the failed chunk must not be added to the next one
+            self.metrics.discard()
+            raise
+        finally:
+            # Failed chunks count as well, so that the capture always ends
+            if self.profiler.active:
+                self.profiler.on_chunk_end()
+        self.metrics.lap(Stage.MAIN, t)
+        self.metrics.commit()
+
+        mainprocess_time = self.metrics.last_secs(Stage.MAIN)
 
         # 後処理
         if self.settings.recordIO:
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import threading
+from xxhash import xxh128
+import logging
+logger = logging.getLogger(__name__)
+
+# Kept in every directory with recorded files, f.e. model slot directories
+MANIFEST_FILE = 'artifacts.json'
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+
+lock = threading.RLock()
+# directory -> file name -> {"hash", "size", "mtime_ns"}
+manifests: dict[str, dict[str, dict]] = {}
+
+
+def _load(dirname: str) -> dict[str, dict]:
+    manifest = manifests.get(dirname)
+    if manifest is None:
+        try:
+            with open(os.path.join(dirname, MANIFEST_FILE), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except Exception as e:
+            logger.warning(f'Failed to load {MANIFEST_FILE} of {dirname}: {e}')
+            manifest = {}
+        manifests[dirname] = manifest
+    return manifest
+
+
+def _save(dirname: str, manifest: dict[str, dict]):
+    path = os.path.join(dirname, MANIFEST_FILE)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _split(path: str) -> tuple[str, str]:
+    path = os.path.abspath(path)
+    return os.path.dirname(path), os.path.basename(path)
+
+
+def get_recorded_hash(path: str) -> str | None:
+    """xxh128 of the file if it was recorded and the file has not changed since."""
+    dirname, name = _split(path)
+    with lock:
+        entry = _load(dirname).get(name)
+    if entry is None:
+        return None
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if st.st_size != entry['size'] or st.st_mtime_ns != entry['mtime_ns']:
+        return None
+    return entry['hash']
+
+
+def record_file_hash(path: str, hash: str):
+    """Records the hash of a file that has just been written (f.e., hashed while it was received)."""
+    dirname, name = _split(path)
+    st = os.stat(path)
+    with lock:
+        manifest = _load(dirname)
+        manifest[name] = {'hash': hash, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        _save(dirname, manifest)
+
+
+def get_file_hash(path: str) -> str:
+    """xxh128 of the file. The file is only read if no valid hash is recorded."""
+    hash = get_recorded_hash(path)
+    if hash is None:
+        hasher = xxh128()
+        # Own buffer, files can be hashed from several threads at once
+        buf = memoryview(bytearray(HASH_BUFFER_SIZE))
+        with open(path, 'rb') as f:
+            while bytes_read := f.readinto(buf):
+                hasher.update(buf[:bytes_read])
+        hash = hasher.hexdigest()
+        record_file_hash(path, hash)
+    return hash
+
+
+def move_file(src: str, dst: str):
+    """Moves a file together with its recorded hash."""
+    hash = get_recorded_hash(src)
+    shutil.move(src, dst)
+    if hash is not None:
+        # Moving across file systems copies the file and may not keep its modification time
+        record_file_hash(dst, hash)
+        forget(src)
+
+
+def forget(path: str):
+    dirname, name = _split(path)
+    with lock:
+        manifest = _load(dirname)
+        if manifest.pop(name, None) is not None:
+            _save(dirname, manifest)
+
+
+def clear_directory(dirname: str, keep: set[str]):
+    """Removes everything in a directory tree except the files in keep (absolute paths) and their recorded hashes."""
+    dirname = os.path.abspath(dirname)
+    with lock:
+        for root, dirs, names in os.walk(dirname, topdown=False):
+            manifest = _load(root)
+            for name in names:
+                path = os.path.join(root, name)
+                if path not in keep and name != MANIFEST_FILE:
+                    os.remove(path)
+                    manifest.pop(name, None)
+            if manifest:
+                _save(root, manifest)
+            else:
+                manifests.pop(root, None)
+                if os.path.exists(os.path.join(root, MANIFEST_FILE)):
+                    os.remove(os.path.join(root, MANIFEST_FILE))
+            for name in dirs:
+                path = os.path.join(root, name)
+                if not os.listdir(path):
+                    os.rmdir(path)
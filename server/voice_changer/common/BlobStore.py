@@ -0,0 +1,150 @@
+import os
+import shutil
+import threading
+import time
+from typing import Callable
+from voice_changer.common.ArtifactManifest import get_file_hash, get_recorded_hash, record_file_hash
+import logging
+logger = logging.getLogger(__name__)
+
+BLOB_DIR_NAME = 'blobs'
+DERIVED_DIR_NAME = 'derived'
+# Smaller files (f.e., icons) are not worth sharing
+MIN_BLOB_SIZE = 1024 * 1024
+# Unreferenced artifacts younger than this are kept, they may be about to be linked
+GC_MIN_AGE = 10 * 60
+
+
+class BlobStore:
+    """
+    Content-addressed store of model files, shared between slots.
+
+    Files are stored once under BLOB_DIR_NAME by their xxh128 and slot
+    directories reference them through hardlinks, so identical models and
+    indexes of different slots use the same disk space and page cache. The
+    link count of a blob is its reference count: a blob that is only linked
+    from the store is no longer used by any slot and is removed by collect().
+
+    Derived artifacts (converted or exported models) are stored by the key
+    of their source and derivation, so every slot with the same source gets
+    the same artifact without building it again.
+
+    Linked files must never be written in place, only replaced.
+    Where hardlinks are not supported, files are copied instead.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls, model_dir: str):
+        if cls._instance is None:
+            cls._instance = cls(model_dir)
+        return cls._instance
+
+    def __init__(self, model_dir: str):
+        self.blob_dir = os.path.join(model_dir, BLOB_DIR_NAME)
+        self.derived_dir = os.path.join(self.blob_dir, DERIVED_DIR_NAME)
+        self.lock = threading.Lock()
+        self.links_supported = True
+
+    def blob_path(self, hash: str) -> str:
+        return os.path.join(self.blob_dir, hash[:2], hash)
+
+    def derived_path(self, key: str, kind: str) -> str:
+        return os.path.join(self.derived_dir, f'{key}.{kind}')
+
+    def add(self, path: str) -> bool:
+        """
+        Stores the file, or replaces it with a link to the identical stored
+        file. Returns True if path now refers to a different file, so that
+        its modification time changed.
+        """
+        st = os.stat(path)
+        # Linked files are already shared (f.e., derived artifacts)
+        if st.st_size < MIN_BLOB_SIZE or st.st_nlink > 1 or not self.links_supported:
+            return False
+        hash = get_file_hash(path)
+        blob = self.blob_path(hash)
+        with self.lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                try:
+                    os.link(path, blob)
+                except OSError as e:
+                    logger.info(f'Hardlinks are not supported, model files are not shared: {e}')
+                    self.links_supported = False
+                return False
+            try:
+                self._replace_with_link(blob, path)
+            except OSError as e:
+                # F.e., the file is open on Windows
+                logger.warning(f'Failed to share {path}: {e}')
+                return False
+        record_file_hash(path, hash)
+        logger.info(f'{path} is shared with other slots.')
+        return True
+
+    def install_derived(self, key: str, kind: str, dst: str, build: Callable[[str], None]):
+        """
+        Links the derived artifact to dst. It is built first with build(output_path)
+        if the store does not have it yet.
+        """
+        derived = self.derived_path(key, kind)
+        with self.lock:
+            if os.path.exists(derived):
+                self._install(derived, dst)
+                return
+        os.makedirs(self.derived_dir, exist_ok=True)
+        # Keeps the extension, some writers pick the format by it
+        tmp = os.path.join(self.derived_dir, f'{key}.tmp{threading.get_ident()}.{kind}')
+        try:
+            build(tmp)
+            with self.lock:
+                os.replace(tmp, derived)
+                self._install(derived, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def install(self, src: str, dst: str):
+        """Links a stored file (f.e., an artifact in derived_path) to dst."""
+        with self.lock:
+            self._install(src, dst)
+
+    def _install(self, src: str, dst: str):
+        hash = get_recorded_hash(src)
+        try:
+            self._replace_with_link(src, dst)
+        except OSError:
+            tmp = f'{dst}.tmp'
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        if hash is not None:
+            record_file_hash(dst, hash)
+
+    def _replace_with_link(self, src: str, dst: str):
+        # dst is replaced, never written, so that files linked to it are not modified
+        tmp = f'{dst}.tmp'
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.link(src, tmp)
+        os.replace(tmp, dst)
+
+    def collect(self) -> int:
+        """Removes stored files that are not linked from anywhere else. Returns the number of freed bytes."""
+        freed = 0
+        now = time.time()
+        with self.lock:
+            for root, _dirs, names in os.walk(self.blob_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                        if st.st_nlink > 1 or now - st.st_mtime < GC_MIN_AGE:
+                            continue
+                        os.remove(path)
+                        freed += st.st_size
+                    except OSError as e:
+                        logger.warning(f'Failed to remove {path}: {e}')
+        if freed:
+            logger.info(f'Removed unused model files, freed {freed / 1024 / 1024:.1f} MiB.')
+        return freed
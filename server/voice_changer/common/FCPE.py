@@ -5,6 +5,7 @@ from torchfcpe.tools import (
     get_device,
     DotDict
 )
+from voice_changer.common.PitchDecoder import LocalWeightedDecoder, cents_to_frequency
 
 
 class InferCFNaiveMelPE(torch.nn.Module):
@@ -21,6 +22,7 @@ class InferCFNaiveMelPE(torch.nn.Module):
         if args.is_half:
             self.model = self.model.half()
         self.model.eval()
+        self.local_decoder = LocalWeightedDecoder(self.model.cent_table)
 
     @torch.no_grad()
     def forward(self,
@@ -35,7 +37,12 @@ class InferCFNaiveMelPE(torch.nn.Module):
             threshold (float): Threshold to mask. Default: 0.006.
         return: f0 (torch.Tensor): f0 Hz, shape (B, (n_sample//hop_size + 1), 1).
         """
-        return self.model.infer(mel, decoder=decoder_mode, threshold=threshold)  # (B, T, 1)
+        if decoder_mode != 'local_argmax':
+            return self.model.infer(mel, decoder=decoder_mode, threshold=threshold)  # (B, T, 1)
+        latent = self.model(mel)  # (B, T, out_dims)
+        cents, confidence = self.local_decoder(latent)
+        f0 = cents_to_frequency(cents) * (confidence > threshold)
+        return f0.unsqueeze(-1)  # (B, T, 1)
 
 
 def spawn_infer_model_from_pt(pt_path: str, is_half: bool = False, device: torch.device = torch.device('cpu'), bundled_model: bool = False) -> InferCFNaiveMelPE:
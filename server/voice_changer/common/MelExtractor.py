@@ -1,10 +1,56 @@
 import torch
+import torch.nn.functional as F
 from .STFT import STFT
 from librosa.filters import mel
 from typing import Optional
 
+
+class MelFrontEnd(torch.nn.Module):
+    """
+    Shared log-mel front-end for pitch extractors: padding, windowed |STFT|,
+    mel projection and log compression in one module.
+    """
+
+    def __init__(
+            self,
+            is_half: bool,
+            mel_basis: torch.Tensor,
+            n_fft: int,
+            win_length: int,
+            hop_length: int,
+            clamp: float = 1e-5,
+    ):
+        super().__init__()
+        self.register_buffer("mel_basis", mel_basis, persistent=False)
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.win_length = win_length
+        self.clamp = clamp
+        self.is_half = is_half
+        self.stft = STFT(
+            filter_length=n_fft,
+            hop_length=hop_length,
+            win_length=win_length,
+            window="hann",
+        )
+
+    def pad(self, audio: torch.Tensor) -> torch.Tensor:
+        pad_amount = self.n_fft // 2
+        return F.pad(audio, (pad_amount, pad_amount), mode="reflect")
+
+    def log_mel(self, padded: torch.Tensor) -> torch.Tensor:
+        magnitude = self.stft.transform_padded(padded)
+        mel_output = torch.matmul(self.mel_basis, magnitude)
+        if self.is_half:
+            mel_output = mel_output.half()
+        return torch.log(torch.clamp(mel_output, min=self.clamp))
+
+    def forward(self, audio: torch.Tensor) -> torch.Tensor:
+        return self.log_mel(self.pad(audio.float()))
+
+
 # This module is used by RMVPE
-class MelSpectrogram(torch.nn.Module):
+class MelSpectrogram(MelFrontEnd):
     def __init__(
             self,
             is_half: bool,
@@ -17,7 +63,6 @@ class MelSpectrogram(torch.nn.Module):
             mel_fmax: Optional[int] = None,
             clamp: float = 1e-5,
     ):
-        super(MelSpectrogram, self).__init__()
         n_fft = win_length if n_fft is None else n_fft
         mel_basis = mel(
             sr=sampling_rate,
@@ -27,25 +72,13 @@ class MelSpectrogram(torch.nn.Module):
             fmax=mel_fmax,
             htk=True)
         mel_basis = torch.from_numpy(mel_basis).float()
-        self.register_buffer("mel_basis", mel_basis)
-        self.n_fft = win_length if n_fft is None else n_fft
-        self.hop_length = hop_length
-        self.win_length = win_length
+        super(MelSpectrogram, self).__init__(
+            is_half,
+            mel_basis,
+            n_fft,
+            win_length,
+            hop_length,
+            clamp,
+        )
         self.sampling_rate = sampling_rate
         self.n_mel_channels = n_mel_channels
-        self.clamp = clamp
-        self.stft = STFT(
-            filter_length=self.n_fft,
-            hop_length=self.hop_length,
-            win_length=self.win_length,
-            window="hann",
-        )
-        self.is_half = is_half
-
-    def forward(self, audio: torch.Tensor) -> torch.Tensor:
-        magnitude = self.stft.transform(audio)
-        mel_output = torch.matmul(self.mel_basis, magnitude)
-        if self.is_half:
-            mel_output = mel_output.half()
-        log_mel_spec = torch.log(torch.clamp(mel_output, min=self.clamp))
-        return log_mel_spec
@@ -1,5 +1,5 @@
 import torch
-from .STFT import STFT
+from .MelExtractor import MelFrontEnd
 from librosa.filters import mel
 
 import logging
@@ -7,9 +7,6 @@ logger = logging.getLogger(__name__)
 
 # This module is used by FCPE
 # Modules are copied from torchfcpe and modified
-def dynamic_range_compression_torch(x, C=1, clip_val=1e-5):
-    return torch.log(torch.clamp(x, min=clip_val) * C)
-
 class Wav2MelModule(torch.nn.Module):
     """
     Wav to mel converter
@@ -81,7 +78,7 @@ class Wav2MelModule(torch.nn.Module):
         return mel  # (B, T, n_mels)
 
 
-class MelModule(torch.nn.Module):
+class MelModule(MelFrontEnd):
     """Mel extractor
 
     Args:
@@ -108,47 +105,46 @@ class MelModule(torch.nn.Module):
         out_stft: bool = False,
         is_half: bool = False,
     ):
-        super().__init__()
         if fmin is None:
             fmin = 0
         if fmax is None:
             fmax = sr / 2
+        super().__init__(
+            is_half,
+            torch.tensor(mel(sr=sr, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)).float(),
+            n_fft,
+            win_size,
+            hop_length,
+            clip_val,
+        )
         self.target_sr = sr
         self.n_mels = n_mels
-        self.n_fft = n_fft
         self.win_size = win_size
-        self.hop_length = hop_length
         self.fmin = fmin
         self.fmax = fmax
         self.clip_val = clip_val
-        self.is_half = is_half
-        # self.mel_basis = {}
-        self.register_buffer(
-            'mel_basis',
-            torch.tensor(mel(sr=sr, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)).float(),
-            persistent=False
-        )
-        self.hann_window = torch.nn.ModuleDict()
         self.out_stft = out_stft
-        self.stft = STFT(
-            filter_length=self.n_fft,
-            hop_length=self.hop_length,
-            win_length=self.win_size,
-            window="hann",
-        )
+
+    def pad(self, y: torch.Tensor) -> torch.Tensor:
+        pad_left = (self.win_size - self.hop_length) // 2
+        pad_right = max((self.win_size - self.hop_length + 1) // 2, self.win_size - y.size(-1) - pad_left)
+        if pad_right < y.size(-1):
+            mode = 'reflect'
+        else:
+            mode = 'constant'
+        y = torch.nn.functional.pad(y.unsqueeze(1), (pad_left, pad_right), mode=mode)
+        y = y.squeeze(1)
+        # STFT centers frames on top of the padding above.
+        return super().pad(y)
 
     @torch.no_grad()
-    def __call__(self,
+    def forward(self,
         y: torch.Tensor,  # (B, T, 1)
     ) -> torch.Tensor:  # (B, T, n_mels)
         """Get mel spectrogram
 
         Args:
             y (torch.Tensor): Input waveform, shape=(B, T, 1).
-            key_shift (int, optional): Key shift. Defaults to 0.
-            speed (int, optional): Variable speed enhancement factor. Defaults to 1.
-            center (bool, optional): center for torch.stft. Defaults to False.
-            no_cache_window (bool, optional): If True will clear cache. Defaults to False.
         return:
             spec (torch.Tensor): Mel spectrogram, shape=(B, T, n_mels).
         """
@@ -160,20 +156,6 @@ class MelModule(torch.nn.Module):
         if torch.max(y) > 1.:
             logger.error(f'max value is {torch.max(y)}')
 
-        pad_left = (self.win_size - self.hop_length) // 2
-        pad_right = max((self.win_size - self.hop_length + 1) // 2, self.win_size - y.size(-1) - pad_left)
-        if pad_right < y.size(-1):
-            mode = 'reflect'
-        else:
-            mode = 'constant'
-        y = torch.nn.functional.pad(y.unsqueeze(1), (pad_left, pad_right), mode=mode)
-        y = y.squeeze(1)
-
-        spec = self.stft.transform(y)
-
-        spec = torch.matmul(self.mel_basis, spec)
-        if self.is_half:
-            spec = spec.half()
-        spec = dynamic_range_compression_torch(spec, clip_val=self.clip_val)
+        spec = super().forward(y)
         spec = spec.transpose(-1, -2)
         return spec  # (B, T, n_mels)
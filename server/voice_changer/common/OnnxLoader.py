@@ -1,7 +1,9 @@
 import onnx
 import os
-from xxhash import xxh128
-from utils.hasher import compute_hash
+from typing import Callable
+from voice_changer.common.ArtifactManifest import get_file_hash
+from voice_changer.common.BlobStore import BlobStore
+from settings import ServerSettings
 
 from onnx import ModelProto
 from onnxruntime.quantization import QuantType, quantize_dynamic, quant_pre_process
@@ -20,36 +22,11 @@ def load_onnx_model(fpath: str, is_half: bool, quantize: bool = False) -> ModelP
     return onnx.load(fpath)
 
 def load_cached_quantized_model(fpath: str) -> ModelProto:
-    hashfile = f'{fpath}.xxh128.txt'
-    try:
-        with open(hashfile, 'r', encoding='utf-8') as f:
-            original_hash = f.read()
-    except FileNotFoundError:
-        original_hash = None
-    fname, _ = os.path.splitext(os.path.basename(fpath))
-    q8_fpath = os.path.join(os.path.dirname(fpath), f'{fname}.q8.onnx')
-    if original_hash is None or not os.path.exists(q8_fpath):
+    def build(output: str):
         logger.info('Quantizing model...')
-        _quantize(fpath, q8_fpath)
-        with open(fpath, 'rb') as f:
-            computed_hash = compute_hash(f, xxh128())
-        with open(hashfile, 'w', encoding='utf-8') as f:
-            f.write(computed_hash)
-        model = onnx.load(q8_fpath)
+        _quantize(fpath, output)
         logger.info('Done!')
-    else:
-        with open(fpath, 'rb') as f:
-            computed_hash = compute_hash(f, xxh128())
-        if computed_hash != original_hash:
-            logger.info('Original model has changed. Regenerating quantized model...')
-            _quantize(fpath, q8_fpath)
-            with open(hashfile, 'w', encoding='utf-8') as f:
-                f.write(computed_hash)
-            model = onnx.load(q8_fpath)
-            logger.info('Done!')
-        else:
-            model = onnx.load(q8_fpath)
-    return model
+    return _load_derived_model(fpath, 'q8.onnx', build)
 
 def _quantize(fpath: str, q8_fpath: str):
     quant_pre_process(
@@ -67,36 +44,42 @@ def _quantize(fpath: str, q8_fpath: str):
     )
 
 def load_cached_fp16_model(fpath: str) -> ModelProto:
-    hashfile = f'{fpath}.xxh128.txt'
+    return onnx.load(prepare_fp16_model(fpath))
+
+def prepare_fp16_model(fpath: str, build: Callable[[str, str], None] | None = None) -> str:
+    """
+    Returns the path of the FP16 model, converting it first if needed.
+    build(fpath, output) can replace build_fp16_model, f.e. to run it in another process.
+    """
+    build = build or build_fp16_model
+    return _prepare_derived_model(fpath, 'fp16.onnx', lambda output: build(fpath, output))
+
+def build_fp16_model(fpath: str, output: str):
+    logger.info('Converting model to FP16...')
+    onnx.save(convert_fp16(onnx.load(fpath)), output)
+    logger.info('Done!')
+
+def _load_derived_model(fpath: str, kind: str, build: Callable[[str], None]) -> ModelProto:
+    return onnx.load(_prepare_derived_model(fpath, kind, build))
+
+def _prepare_derived_model(fpath: str, kind: str, build: Callable[[str], None]) -> str:
+    fname, _ = os.path.splitext(os.path.basename(fpath))
+    derived_fpath = os.path.join(os.path.dirname(fpath), f'{fname}.{kind}')
+    # Hash of the source the derived model was built from
+    hashfile = f'{derived_fpath}.xxh128.txt'
     try:
         with open(hashfile, 'r', encoding='utf-8') as f:
             original_hash = f.read()
     except FileNotFoundError:
         original_hash = None
-    fname, _ = os.path.splitext(os.path.basename(fpath))
-    fp16_fpath = os.path.join(os.path.dirname(fpath), f'{fname}.fp16.onnx')
-    if original_hash is None or not os.path.exists(fp16_fpath):
-        logger.info('Converting model to FP16...')
-        model = convert_fp16(onnx.load(fpath))
-        onnx.save(model, fp16_fpath)
-        with open(fpath, 'rb') as f:
-            computed_hash = compute_hash(f, xxh128())
+    # Recorded when the model was uploaded or first loaded, so the model is not read again
+    computed_hash = get_file_hash(fpath)
+    if computed_hash != original_hash or not os.path.exists(derived_fpath):
+        # Built once per source model and shared by every copy of it
+        BlobStore.get_instance(ServerSettings().model_dir).install_derived(computed_hash, kind, derived_fpath, build)
         with open(hashfile, 'w', encoding='utf-8') as f:
             f.write(computed_hash)
-        logger.info('Done!')
-    else:
-        with open(fpath, 'rb') as f:
-            computed_hash = compute_hash(f, xxh128())
-        if computed_hash != original_hash:
-            logger.info('Original model has changed. Regenerating FP16 model...')
-            model = convert_fp16(onnx.load(fpath))
-            onnx.save(model, fp16_fpath)
-            with open(hashfile, 'w', encoding='utf-8') as f:
-                f.write(computed_hash)
-            logger.info('Done!')
-        else:
-            model = onnx.load(fp16_fpath)
-    return model
+    return derived_fpath
 
 
 def convert_fp16(model: ModelProto) -> ModelProto:
@@ -0,0 +1,50 @@
+import onnxruntime
+from typing import Callable
+from voice_changer.utils.Profiler import Profiler
+
+
+class OnnxSession:
+    """
+    onnxruntime.InferenceSession that can be replaced at runtime by a copy
+    with profiling enabled. Attribute access is forwarded to the active session.
+
+    ORT can only enable profiling when a session is created, so the model is
+    loaded again from the path or the reload function when profiling is
+    requested. In-memory models without reload function are kept as bytes,
+    which is only meant for small generated graphs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: str | bytes,
+        providers: list[str],
+        provider_options: list[dict],
+        reload: Callable[[], bytes] | None = None,
+    ):
+        self.name = name
+        self.providers = providers
+        self.provider_options = provider_options
+        self._source = model if isinstance(model, str) or reload is None else reload
+        self.session = self._create(model)
+        Profiler.get_instance().register(self)
+
+    def _create(self, model: str | bytes, profile_prefix: str | None = None) -> onnxruntime.InferenceSession:
+        so = onnxruntime.SessionOptions()
+        if profile_prefix is not None:
+            so.enable_profiling = True
+            so.profile_file_prefix = profile_prefix
+        return onnxruntime.InferenceSession(model, sess_options=so, providers=self.providers, provider_options=self.provider_options)
+
+    def create_profiling_session(self, profile_prefix: str) -> onnxruntime.InferenceSession:
+        model = self._source if isinstance(self._source, (str, bytes)) else self._source()
+        return self._create(model, profile_prefix)
+
+    def swap(self, session: onnxruntime.InferenceSession) -> onnxruntime.InferenceSession:
+        """Makes session active and returns the previously active one."""
+        prev = self.session
+        self.session = session
+        return prev
+
+    def __getattr__(self, name: str):
+        return getattr(self.session, name)
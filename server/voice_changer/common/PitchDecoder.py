@@ -0,0 +1,51 @@
+import torch
+
+
+def cents_to_frequency(cents: torch.Tensor) -> torch.Tensor:
+    return 10 * 2 ** (cents / 1200)
+
+
+class LocalWeightedDecoder(torch.nn.Module):
+    """
+    Weighted average of the pitch table around the most probable bin.
+
+    Only the 2 * radius + 1 bins around the center are gathered per frame
+    instead of masking and summing the whole bin axis. Bins outside of the
+    table are ignored, negative (or -inf) activations get zero weight.
+    Used by RMVPE, FCPE and onnxcrepe, and traceable for ONNX export.
+    """
+
+    def __init__(self, cents_table: torch.Tensor, radius: int = 4):
+        super().__init__()
+        self.n_bins = cents_table.shape[-1]
+        self.register_buffer("cents_table", cents_table.detach().clone().float(), persistent=False)
+        self.register_buffer("offsets", torch.arange(-radius, radius + 1), persistent=False)
+
+    def forward(self, hidden: torch.Tensor, center: torch.Tensor | None = None) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Arguments:
+            hidden {tensor} -- Bin activations with shape (..., n_bins)
+            center {tensor} -- Optional window centers with shape (..., 1).
+                Defaults to the argmax of hidden.
+
+        Returns:
+            cents {tensor} -- Decoded pitch in cents with shape (...)
+            confidence {tensor} -- Maximum activation with shape (...)
+        """
+        confidence, argmax = torch.max(hidden, dim=-1, keepdim=True)
+        if center is None:
+            center = argmax
+        idx = center + self.offsets  # [..., 2 * radius + 1]
+        valid = (idx >= 0) & (idx < self.n_bins)
+        idx = torch.clamp(idx, 0, self.n_bins - 1)
+
+        weights = torch.clamp(torch.gather(hidden, -1, idx), min=0) * valid
+        product_sum = torch.sum(weights * self.cents_table[idx], dim=-1)
+        weight_sum = torch.sum(weights, dim=-1)
+        cents = product_sum / (weight_sum + (weight_sum == 0))  # avoid dividing by zero
+        return cents, confidence.squeeze(-1)
+
+
+def crepe_cents_table(n_bins: int = 360) -> torch.Tensor:
+    """Cents of each pitch bin used by CREPE and RMVPE."""
+    return torch.arange(n_bins) * 20 + 1997.3794084376191
@@ -70,6 +70,30 @@ class STFT(torch.nn.Module):
             (self.pad_amount, self.pad_amount),
             mode="reflect",
         )
+        return self.transform_padded(input_data, return_phase)
+
+    def transform_padded(self, input_data, return_phase=False):
+        """Same as ```transform``` but expects input that is already padded.
+        Every full window of filter_length samples becomes one frame.
+
+        Uses rFFT where the backend supports it and falls back to the dense
+        basis matmul otherwise (f.e., DirectML has no FFT kernels).
+        """
+        if self.use_fft(input_data.device):
+            spec = torch.stft(
+                input_data,
+                n_fft=self.filter_length,
+                hop_length=self.hop_length,
+                win_length=self.filter_length,
+                window=self.fft_window,
+                center=False,
+                return_complex=True,
+            )
+            magnitude = spec.abs()
+            if return_phase:
+                return magnitude, spec.angle()
+            return magnitude
+
         forward_transform = input_data.unfold(
             1, self.filter_length, self.hop_length
         ).permute(0, 2, 1)
@@ -84,6 +108,11 @@ class STFT(torch.nn.Module):
         else:
             return magnitude
 
+    @staticmethod
+    def use_fft(device: torch.device) -> bool:
+        # torch-directml does not implement aten::_fft_r2c.
+        return device.type != 'privateuseone'
+
     def inverse(self, magnitude, phase):
         """Call the inverse STFT (iSTFT), given magnitude and phase tensors produced
         by the ```transform``` function.
@@ -1,17 +1,37 @@
 import json
+import math
 import os
+import struct
 import torch
 import torch.nn
-from typing import Tuple, List, Any
+from typing import Iterable, Tuple, List, Any
 from safetensors.torch import _remove_duplicate_names, load_file, save_file
 
 
-def load_model(model: torch.nn.Module, f: dict[str, Any], strict=True) -> Tuple[List[str], List[str]]:
-    state_dict = { k: f.get_tensor(k) for k in f.keys() }
+def load_model(model: torch.nn.Module, f: Any, strict=True) -> Tuple[List[str], List[str]]:
+    """
+    Loads tensors of an open safetensors file into the parameters and buffers
+    of the model one by one, so that at most one source tensor is held in
+    memory next to the model. Tensors are cast to the dtype of the
+    destination, so the model can be converted (f.e., to half) before loading.
+    """
     model_state_dict = model.state_dict()
-    to_removes = _remove_duplicate_names(model_state_dict, preferred_names=state_dict.keys())
-    missing, unexpected = model.load_state_dict(state_dict, strict=False)
-    missing = set(missing)
+    keys = list(f.keys())
+    to_removes = _remove_duplicate_names(model_state_dict, preferred_names=keys)
+    missing = set(model_state_dict.keys()) - set(keys)
+    unexpected = []
+    with torch.no_grad():
+        for k in keys:
+            # state_dict() shares storage with the parameters, so copying into it loads the model
+            target = model_state_dict.get(k)
+            if target is None:
+                unexpected.append(k)
+                continue
+            tensor = f.get_tensor(k)
+            if tensor.shape != target.shape:
+                raise RuntimeError(f"Error(s) in loading state_dict for {model.__class__.__name__}:\n    size mismatch for {k}: copying a param with shape {tensor.shape}, the shape in current model is {target.shape}.")
+            target.copy_(tensor)
+            del tensor
     for to_remove_group in to_removes.values():
         for to_remove in to_remove_group:
             if to_remove not in missing:
@@ -43,13 +63,9 @@ def check_file_size(sf_filename: str, pt_filename: str):
         )
 
 
-def convert_file(
-    pt_filename: str,
-    sf_filename: str,
-    discard_names: list[str] = [],
-):
+def build_metadata(data: dict) -> dict[str, str]:
+    """safetensors metadata of the non-tensor entries of a torch checkpoint."""
     metadata = {"format": "pt"}
-    data: dict = torch.load(pt_filename, map_location="cpu")
     for k, v in data.items():
         if k in ['weight', 'state_dict']:
             continue
@@ -59,6 +75,68 @@ def convert_file(
             continue
         else:
             metadata[k] = str(v)
+    return metadata
+
+
+SAFETENSORS_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+TORCH_DTYPES = {v: k for k, v in SAFETENSORS_DTYPES.items()}
+
+
+def save_file_streaming(
+    filename: str,
+    layout: dict[str, Tuple[str, List[int]]],
+    tensors: Iterable[Tuple[str, torch.Tensor]],
+    metadata: dict[str, str],
+):
+    """
+    Writes a safetensors file from tensors produced one at a time, so that
+    only the tensor being written has to be in memory. layout maps names to
+    safetensors dtype and shape and must list the tensors in the order
+    they are produced.
+    """
+    header: dict[str, Any] = {"__metadata__": metadata}
+    offset = 0
+    for name, (dtype, shape) in layout.items():
+        size = TORCH_DTYPES[dtype].itemsize * math.prod(shape)
+        header[name] = {"dtype": dtype, "shape": shape, "data_offsets": [offset, offset + size]}
+        offset += size
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # Tensor data is aligned to 8 bytes, like the reference implementation does
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        names = iter(layout.items())
+        for name, tensor in tensors:
+            expected, (dtype, shape) = next(names)
+            if name != expected or list(tensor.shape) != list(shape) or SAFETENSORS_DTYPES[tensor.dtype] != dtype:
+                raise RuntimeError(f"Tensor {name} {tensor.dtype} {list(tensor.shape)} does not match the layout of {expected} {dtype} {shape}.")
+            f.write(memoryview(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy()))
+        if next(names, None) is not None:
+            raise RuntimeError("Not all tensors of the layout have been written.")
+    os.replace(tmp_filename, filename)
+
+
+def convert_file(
+    pt_filename: str,
+    sf_filename: str,
+    discard_names: list[str] = [],
+):
+    data: dict = torch.load(pt_filename, map_location="cpu")
+    metadata = build_metadata(data)
     if "state_dict" in data:
         tensors = data["state_dict"]
     elif "weight" in data:
@@ -3,10 +3,10 @@ import logging
 import torch.nn as nn
 import torch.nn.functional as F
 import torch
-import numpy as np
 from safetensors import safe_open
 from voice_changer.common.SafetensorsUtils import load_model
-from librosa.filters import mel
+from voice_changer.common.MelExtractor import MelSpectrogram
+from voice_changer.common.PitchDecoder import LocalWeightedDecoder, crepe_cents_table, cents_to_frequency
 
 logger = logging.getLogger(__file__)
 
@@ -260,86 +260,22 @@ class E2E(nn.Module):
         return x
 
 
-class MelSpectrogram(torch.nn.Module):
-    def __init__(
-        self,
-        is_half,
-        n_mel_channels,
-        sampling_rate,
-        win_length,
-        hop_length,
-        n_fft=None,
-        mel_fmin=0,
-        mel_fmax=None,
-        clamp=1e-5,
-    ):
-        super().__init__()
-        n_fft = win_length if n_fft is None else n_fft
-        self.hann_window = {}
-        mel_basis = mel(
-            sr=sampling_rate,
-            n_fft=n_fft,
-            n_mels=n_mel_channels,
-            fmin=mel_fmin,
-            fmax=mel_fmax,
-            htk=True,
-        )
-        mel_basis = torch.from_numpy(mel_basis).float()
-        self.register_buffer("mel_basis", mel_basis)
-        self.n_fft = win_length if n_fft is None else n_fft
-        self.hop_length = hop_length
-        self.win_length = win_length
-        self.sampling_rate = sampling_rate
-        self.n_mel_channels = n_mel_channels
-        self.clamp = clamp
-        self.is_half = is_half
-
-    def forward(self, audio, keyshift=0, speed=1, center=True):
-        factor = 2 ** (keyshift / 12)
-        n_fft_new = int(np.round(self.n_fft * factor))
-        win_length_new = int(np.round(self.win_length * factor))
-        hop_length_new = int(np.round(self.hop_length * speed))
-        keyshift_key = str(keyshift) + "_" + str(audio.device)
-        if keyshift_key not in self.hann_window:
-            self.hann_window[keyshift_key] = torch.hann_window(win_length_new).to(
-                audio.device
-            )
-        fft = torch.stft(
-            audio,
-            n_fft=n_fft_new,
-            hop_length=hop_length_new,
-            win_length=win_length_new,
-            window=self.hann_window[keyshift_key],
-            center=center,
-            return_complex=True,
-        )
-        magnitude = torch.sqrt(fft.real.pow(2) + fft.imag.pow(2))
-        if keyshift != 0:
-            size = self.n_fft // 2 + 1
-            resize = magnitude.size(1)
-            if resize < size:
-                magnitude = F.pad(magnitude, (0, 0, 0, size - resize))
-            magnitude = magnitude[:, :size, :] * self.win_length / win_length_new
-        mel_output = torch.matmul(self.mel_basis, magnitude)
-        if self.is_half:
-            mel_output = mel_output.half()
-        log_mel_spec = torch.log(torch.clamp(mel_output, min=self.clamp))
-        return log_mel_spec
-
-
 class RMVPE:
     def __init__(self, model_path: str, is_half: bool, use_jit_compile: bool, device: torch.device):
         model = E2E(4, 1, (2, 2))
         if model_path.endswith('.safetensors'):
+            # Tensors are cast while loading, so the model is converted before
+            model = model.to(device, torch.float16 if is_half else torch.float32)
             with safe_open(model_path, 'pt', device=str(device) if device.type == 'cuda' else 'cpu') as cpt:
                 load_model(model, cpt, strict=False)
+            model = model.eval()
         else:
             cpt = torch.load(model_path, map_location=device if device.type == 'cuda' else 'cpu')
             model.load_state_dict(cpt, strict=False)
-        model = model.eval().to(device)
+            model = model.eval().to(device)
 
-        if is_half:
-            model = model.half()
+            if is_half:
+                model = model.half()
 
         self.use_jit_eager = not use_jit_compile
         if use_jit_compile:
@@ -351,8 +287,7 @@ class RMVPE:
         self.mel_extractor = MelSpectrogram(
             is_half, 128, 16000, 1024, 160, None, 30, 8000
         ).to(device)
-        self.idx = torch.arange(360, device=device)[None, None, :]
-        self.idx_cents = self.idx * 20 + 1997.3794084376191
+        self.decoder = LocalWeightedDecoder(crepe_cents_table()).to(device)
 
     def mel2hidden(self, mel: torch.Tensor) -> torch.Tensor:
         n_frames = mel.shape[-1]
@@ -361,20 +296,13 @@ class RMVPE:
             return self.model(mel)[:, :n_frames]
 
     def decode(self, hidden: torch.Tensor, threshold: float):
-        center = torch.argmax(hidden, dim=2, keepdim=True)  # [B, T, 1]
-        start = torch.clip(center - 4, min=0)  # [B, T, 1]
-        end = torch.clip(center + 5, max=360)  # [B, T, 1]
-        idx_mask = (self.idx >= start) & (self.idx < end)  # [B, T, N]
-        weights = hidden * idx_mask  # [B, T, N]
-        product_sum = torch.sum(weights * self.idx_cents, dim=2)  # [B, T]
-        weight_sum = torch.sum(weights, dim=2)  # [B, T]
-        cents = product_sum / (weight_sum + (weight_sum == 0))  # avoid dividing by zero, [B, T]
-        f0 = 10 * 2 ** (cents / 1200)
-        uv = hidden.max(dim=2)[0] < threshold  # [B, T]
+        cents, confidence = self.decoder(hidden)  # [B, T]
+        f0 = cents_to_frequency(cents)
+        uv = confidence < threshold  # [B, T]
         return f0 * ~uv
 
     @torch.no_grad()
     def infer_from_audio_t(self, audio: torch.Tensor, threshold: float = 0.05) -> torch.Tensor:
-        mel: torch.Tensor = self.mel_extractor(audio.unsqueeze(0), center=True)
+        mel: torch.Tensor = self.mel_extractor(audio.unsqueeze(0))
         hidden = self.mel2hidden(mel)
         return self.decode(hidden, threshold)
@@ -0,0 +1,221 @@
+import os
+import sys
+from enum import IntEnum
+from time import perf_counter_ns
+
+
+class Stage(IntEnum):
+    TRANSPORT = 0
+    PRE_PROCESS = 1
+    PITCH = 2
+    EMBED = 3
+    INDEX = 4
+    INFER = 5
+    RESAMPLE = 6
+    SOLA = 7
+    MAIN = 8
+
+
+STAGE_NAMES = [stage.name.lower() for stage in Stage]
+
+
+class Counter(IntEnum):
+    CHUNKS_PROCESSED = 0
+    CHUNKS_SILENT = 1
+    CHUNKS_DROPPED = 2
+    EMBEDDER_CACHE_HIT = 3
+    EMBEDDER_CACHE_MISS = 4
+    PITCH_EXTRACTOR_CACHE_HIT = 5
+    PITCH_EXTRACTOR_CACHE_MISS = 6
+    SESSIONS_CONNECTED = 7
+    SESSIONS_DISCONNECTED = 8
+    SERVER_AUDIO_UNDERRUNS = 9
+    SERVER_AUDIO_OVERRUNS = 10
+
+# Log-linear buckets: every power of two is split into 2 ** SUB_BITS buckets,
+# so any recorded value is off by at most 1 / 2 ** SUB_BITS (6.25%).
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+# Values are clamped to ~137 seconds
+MAX_VALUE_BITS = 37
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BITS + 1) * SUB_COUNT
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_COUNT:
+        return value
+    exp = value.bit_length() - SUB_BITS - 1
+    return ((exp + 1) << SUB_BITS) + (value >> exp) - SUB_COUNT
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Largest value that falls into the bucket."""
+    if index < SUB_COUNT:
+        return index
+    exp = (index >> SUB_BITS) - 1
+    return (((index & (SUB_COUNT - 1)) + SUB_COUNT + 1) << exp) - 1
+
+
+class Histogram:
+    """
+    Fixed-size HDR-style histogram of non-negative integers (nanoseconds).
+    Recording is a couple of integer operations and never allocates.
+    """
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self.last = 0
+
+    def record(self, value: int):
+        if value > MAX_VALUE:
+            value = MAX_VALUE
+        elif value < 0:
+            value = 0
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self.last = 0
+
+    def percentile(self, q: float) -> int:
+        """Upper bound of the bucket containing the q-th percentile (0-100)."""
+        counts = list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return 0
+        rank = max(1, int(total * q / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds: list[int]) -> list[int]:
+        """Number of values in buckets entirely below each of the ascending bounds."""
+        res = []
+        seen = 0
+        index = 0
+        counts = list(self.counts)
+        for bound in bounds:
+            while index < BUCKET_COUNT and bucket_upper_bound(index) <= bound:
+                seen += counts[index]
+                index += 1
+            res.append(seen)
+        return res
+
+
+class StageMetrics:
+    """
+    Always-on timing of the realtime path.
+
+    Hot path code keeps a perf_counter_ns() timestamp and calls lap() at the
+    end of each stage, which adds the elapsed time to the stage total of the
+    current chunk and returns the new timestamp. commit() is called once per
+    chunk and moves the totals into the per-stage histograms, so stages that
+    run several times per chunk (f.e., input and output resampling) are
+    recorded as a single value. Transport runs around the conversion, so
+    its output half is committed together with the next chunk.
+
+    Note that GPU work is asynchronous, so the stage that waits for results
+    (f.e., the device-to-host copy) accumulates time of the kernels issued
+    before it. Updates are not locked: chunks are processed under the device
+    lock, other writers may rarely lose a sample, which is fine for metrics.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.histograms = [Histogram() for _ in Stage]
+        self.current = [0] * len(Stage)
+        self.counters = [0] * len(Counter)
+
+    def inc(self, counter: Counter):
+        self.counters[counter] += 1
+
+    def lap(self, stage: Stage, start: int) -> int:
+        now = perf_counter_ns()
+        self.current[stage] += now - start
+        return now
+
+    def commit(self):
+        current = self.current
+        for stage, elapsed in enumerate(current):
+            if elapsed:
+                self.histograms[stage].record(elapsed)
+                current[stage] = 0
+
+    def discard(self):
+        """Drops the stage totals of a chunk that failed before commit(), except transport."""
+        current = self.current
+        for stage in range(len(current)):
+            if stage != Stage.TRANSPORT:
+                current[stage] = 0
+
+    def reset(self):
+        for histogram in self.histograms:
+            histogram.reset()
+        self.current = [0] * len(Stage)
+
+    def last_secs(self, stage: Stage) -> float:
+        return self.histograms[stage].last / 1e9
+
+    def summary(self) -> dict:
+        return {
+            name: {
+                'count': histogram.count,
+                'p50_ms': histogram.percentile(50) / 1e6,
+                'p99_ms': histogram.percentile(99) / 1e6,
+                'max_ms': histogram.max / 1e6,
+                'last_ms': histogram.last / 1e6,
+            }
+            for name, histogram in zip(STAGE_NAMES, self.histograms)
+        }
+
+
+def process_rss_bytes() -> int | None:
+    """Current resident set size of the process, None if the platform is not supported."""
+    if sys.platform == 'linux':
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+    return None
@@ -0,0 +1,244 @@
+import gc
+import json
+import os
+import threading
+import time
+import weakref
+import torch
+from torch.profiler import ProfilerActivity, profile
+from typing import Literal, TypeAlias, TYPE_CHECKING
+from const import TMP_DIR
+
+if TYPE_CHECKING:
+    from voice_changer.common.OnnxSession import OnnxSession
+
+import logging
+logger = logging.getLogger(__name__)
+
+ProfilerState: TypeAlias = Literal['idle', 'preparing', 'armed', 'capturing', 'exporting']
+
+# Chrome trace process IDs of ONNX Runtime sessions, torch uses real process IDs
+ORT_PID_BASE = 1_000_000
+# Armed or running captures are cancelled if no chunk arrives for this long (f.e., audio was stopped)
+IDLE_TIMEOUT = 10
+
+
+class Profiler:
+    """
+    Captures torch and ONNX Runtime activity of the realtime path for a
+    number of chunks and merges it into a single Chrome trace in TMP_DIR.
+
+    arm() builds profiling copies of all live ONNX sessions in the background.
+    The audio thread then swaps them in and starts torch.profiler at the
+    beginning of the next chunk, and swaps the original sessions back once
+    the requested number of chunks has been processed. Exporting and merging
+    the traces also happens in the background. A capture can be cancelled,
+    and is cancelled by itself if no chunk arrives within IDLE_TIMEOUT.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.sessions: weakref.WeakSet[OnnxSession] = weakref.WeakSet()
+        self.state: ProfilerState = 'idle'
+        # Checked on the audio thread for every chunk, so kept as a plain flag.
+        self.active = False
+        self.lock = threading.Lock()
+        self.chunks = 0
+        self.remaining = 0
+        self.trace_file: str | None = None
+        self.error: str | None = None
+
+        self._prepared: list[tuple[OnnxSession, object]] = []
+        self._swapped: list[tuple[OnnxSession, object]] = []
+        self._torch_profiler: profile | None = None
+        self._start_ns = 0
+        self._last_chunk = 0.0
+
+    def register(self, session: 'OnnxSession'):
+        self.sessions.add(session)
+
+    def get_status(self) -> dict:
+        return {
+            'state': self.state,
+            'chunks': self.chunks,
+            'remaining': self.remaining,
+            'file': None if self.trace_file is None else f'/tmp/{os.path.basename(self.trace_file)}',
+            'error': self.error,
+        }
+
+    def arm(self, chunks: int) -> bool:
+        with self.lock:
+            if self.state != 'idle' or chunks <= 0:
+                return False
+            self.state = 'preparing'
+            self.chunks = chunks
+            self.remaining = chunks
+            self.error = None
+        threading.Thread(target=self._prepare, daemon=True).start()
+        return True
+
+    def _prepare(self):
+        try:
+            # Drop sessions of unloaded models so that they are not rebuilt
+            gc.collect()
+            os.makedirs(TMP_DIR, exist_ok=True)
+            self._prepared = [
+                (session, session.create_profiling_session(os.path.join(TMP_DIR, f'ort_{i}_{session.name}')))
+                for i, session in enumerate(list(self.sessions))
+            ]
+            logger.info(f'Profiler armed for {self.chunks} chunks with {len(self._prepared)} ONNX sessions.')
+            with self.lock:
+                self._last_chunk = time.monotonic()
+                self.state = 'armed'
+                self.active = True
+            threading.Thread(target=self._watch, daemon=True).start()
+        except Exception as e:
+            logger.exception(e)
+            self._fail(e)
+
+    def _watch(self):
+        while True:
+            time.sleep(1)
+            with self.lock:
+                if self.state not in ('armed', 'capturing'):
+                    return
+                if time.monotonic() - self._last_chunk > IDLE_TIMEOUT:
+                    logger.warning(f'No audio for {IDLE_TIMEOUT}s, profiling is cancelled.')
+                    self._cancel(f'No audio was processed for {IDLE_TIMEOUT}s.')
+                    return
+
+    def cancel(self) -> bool:
+        """Stops an armed or running capture without saving it."""
+        with self.lock:
+            if self.state not in ('armed', 'capturing'):
+                return False
+            self._cancel('Cancelled.')
+            return True
+
+    def _cancel(self, reason: str):
+        if self.state == 'capturing':
+            try:
+                self._torch_profiler.stop()
+            except Exception as e:
+                logger.exception(e)
+            self._torch_profiler = None
+            for _, session in self._restore_sessions():
+                try:
+                    os.remove(session.end_profiling())
+                except Exception as e:
+                    logger.exception(e)
+        self._fail(RuntimeError(reason))
+
+    def on_chunk_start(self):
+        with self.lock:
+            self._on_chunk_start()
+
+    def _on_chunk_start(self):
+        self._last_chunk = time.monotonic()
+        if self.state != 'armed':
+            return
+        try:
+            activities = [ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+            self._torch_profiler = profile(activities=activities)
+            self._swapped = [(session, session.swap(profiling)) for session, profiling in self._prepared]
+            self._prepared = []
+            self._start_ns = time.monotonic_ns()
+            self._torch_profiler.start()
+            self.state = 'capturing'
+        except Exception as e:
+            logger.exception(e)
+            self._restore_sessions()
+            self._fail(e)
+
+    def on_chunk_end(self):
+        with self.lock:
+            self._on_chunk_end()
+
+    def _on_chunk_end(self):
+        self._last_chunk = time.monotonic()
+        if self.state != 'capturing':
+            return
+        self.remaining -= 1
+        if self.remaining > 0:
+            return
+        self.active = False
+        self.state = 'exporting'
+        try:
+            self._torch_profiler.stop()
+        except Exception as e:
+            logger.exception(e)
+        profiled = self._restore_sessions()
+        threading.Thread(target=self._export, args=(self._torch_profiler, profiled, self._start_ns), daemon=True).start()
+        self._torch_profiler = None
+
+    def _restore_sessions(self) -> list[tuple[str, object]]:
+        profiled = [(session.name, session.swap(plain)) for session, plain in self._swapped]
+        self._swapped = []
+        return profiled
+
+    def _export(self, torch_profiler: profile, profiled: list[tuple[str, object]], start_ns: int):
+        try:
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            torch_file = os.path.join(TMP_DIR, f'torch_{stamp}.json')
+            torch_profiler.export_chrome_trace(torch_file)
+            with open(torch_file, encoding='utf-8') as f:
+                torch_trace = json.load(f)
+            os.remove(torch_file)
+            events = _shift_torch_events(torch_trace.get('traceEvents', []))
+
+            for i, (name, session) in enumerate(profiled):
+                ort_file = session.end_profiling()
+                with open(ort_file, encoding='utf-8') as f:
+                    ort_events = json.load(f)
+                os.remove(ort_file)
+                # ORT timestamps are relative to the profiling start of the session
+                offset_us = (session.get_profiling_start_time_ns() - start_ns) / 1000
+                events.extend(_remap_ort_events(ort_events, ORT_PID_BASE + i, f'onnxruntime: {name}', offset_us))
+
+            self.trace_file = os.path.join(TMP_DIR, f'profile_{stamp}.json')
+            with open(self.trace_file, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+            logger.info(f'Profile saved to {self.trace_file}')
+            self.state = 'idle'
+        except Exception as e:
+            logger.exception(e)
+            self._fail(e)
+
+    def _fail(self, e: Exception):
+        self.error = str(e)
+        self._prepared = []
+        self.active = False
+        self.state = 'idle'
+
+
+def _shift_torch_events(events: list[dict]) -> list[dict]:
+    # Start of the trace is the start of the capture
+    timestamps = [e['ts'] for e in events if 'ts' in e and e.get('ph') != 'M']
+    if not timestamps:
+        return events
+    base = min(timestamps)
+    for e in events:
+        if 'ts' in e:
+            e['ts'] = e['ts'] - base
+    return events
+
+
+def _remap_ort_events(events: list[dict], pid: int, process_name: str, offset_us: float) -> list[dict]:
+    res = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': process_name}}]
+    for e in events:
+        ts = e.get('ts', 0) + offset_us
+        # Skip session initialization and runs before the capture
+        if ts < 0:
+            continue
+        e['ts'] = ts
+        e['pid'] = pid
+        res.append(e)
+    return res
@@ -0,0 +1,77 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SettingsStore:
+    """
+    Debounced persistence of settings to a JSON file.
+
+    mark_dirty() only records that settings changed. A background thread
+    writes the latest snapshot once no changes have been made for `delay`
+    seconds, or at the latest `max_delay` seconds after the first unsaved
+    change, so bursts of updates (f.e., slider drags) result in a single
+    write. Files are written to a temporary file and renamed over the
+    target, and pending changes are flushed on interpreter exit.
+    """
+
+    def __init__(self, path: str, snapshot: Callable[[], dict], delay: float = 1, max_delay: float = 5):
+        self.path = path
+        self.snapshot = snapshot
+        self.delay = delay
+        self.max_delay = max_delay
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.dirty_since: float | None = None
+        self.last_change = 0.0
+        threading.Thread(target=self._run, daemon=True).start()
+        atexit.register(self.flush)
+
+    def mark_dirty(self):
+        with self.cond:
+            now = time.monotonic()
+            self.last_change = now
+            if self.dirty_since is None:
+                self.dirty_since = now
+                self.cond.notify()
+
+    def flush(self):
+        """Writes pending changes immediately."""
+        with self.cond:
+            if self.dirty_since is None:
+                return
+            self.dirty_since = None
+        self._write()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.dirty_since is None:
+                    self.cond.wait()
+                now = time.monotonic()
+                deadline = min(self.last_change + self.delay, self.dirty_since + self.max_delay)
+                if now < deadline:
+                    self.cond.wait(deadline - now)
+                    continue
+                self.dirty_since = None
+            self._write()
+
+    def _write(self):
+        # Snapshot and write under one lock so that an older snapshot never overwrites a newer one
+        with self.write_lock:
+            try:
+                data = self.snapshot()
+                tmp_path = f'{self.path}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.exception(e)
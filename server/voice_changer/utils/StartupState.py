@@ -0,0 +1,89 @@
+import threading
+import time
+from typing import Callable, Literal, TypeAlias
+import logging
+logger = logging.getLogger(__name__)
+
+StartupStage: TypeAlias = Literal[
+    'starting',
+    'downloading_weights',
+    'downloading_samples',
+    'loading_model',
+    'warming_up',
+    'ready',
+    'failed',
+]
+
+
+class StartupState:
+    """
+    Progress of the background startup (weight downloads, model loading and
+    warmup). The server accepts connections while it runs, audio is only
+    converted once the stage is 'ready'.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.stage: StartupStage = 'starting'
+        self.done = 0
+        self.total = 0
+        self.error: str | None = None
+        self.started_at = time.monotonic()
+        self.finished_at: float | None = None
+        self.listeners: list[Callable[[dict], None]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.stage == 'ready'
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """listener is called with the status on every update, possibly from a worker thread."""
+        self.listeners.append(listener)
+
+    def get_status(self) -> dict:
+        with self.lock:
+            end = self.finished_at if self.finished_at is not None else time.monotonic()
+            return {
+                'stage': self.stage,
+                'ready': self.stage == 'ready',
+                'done': self.done,
+                'total': self.total,
+                'error': self.error,
+                'elapsed': round(end - self.started_at, 3),
+            }
+
+    def set_stage(self, stage: StartupStage):
+        with self.lock:
+            self.stage = stage
+            self.done = 0
+            self.total = 0
+            if stage in ('ready', 'failed'):
+                self.finished_at = time.monotonic()
+        logger.info(f"Startup stage: {stage}")
+        self._notify()
+
+    def set_progress(self, done: int, total: int):
+        with self.lock:
+            self.done = done
+            self.total = total
+        self._notify()
+
+    def fail(self, error: str):
+        with self.lock:
+            self.error = error
+        self.set_stage('failed')
+
+    def _notify(self):
+        status = self.get_status()
+        for listener in self.listeners:
+            try:
+                listener(status)
+            except Exception as e:
+                logger.exception(e)